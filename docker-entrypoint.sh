@@ -36,4 +36,10 @@ echo "Waiting till postgres database engine be available."
 wait_for ${DB_HOST} ${DB_PORT} ${MAX_WAIT_TIMEOUT}
 
 alembic upgrade head
+
+# workers write metrics to files there, so /metrics on any of them reports the whole server
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf ${PROMETHEUS_MULTIPROC_DIR}
+mkdir -p ${PROMETHEUS_MULTIPROC_DIR}
+
 uvicorn web:server --host 0.0.0.0 --port ${BIND_PORT:-8000} --reload --factory
\ No newline at end of file
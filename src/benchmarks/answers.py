@@ -0,0 +1,65 @@
+"""
+Throughput of answer generation with and without micro-batching, against a local fake backend whose calls
+cost a fixed latency plus a little per prompt and which serves a limited number of calls at once, like
+a model server does.
+
+Usage: ``python -m benchmarks.answers [--requests 2000] [--concurrency 64] [--batch-size 16]``
+"""
+import argparse
+import asyncio
+import itertools
+from typing import Sequence
+
+from services.answers import (
+    AnswerPrompt,
+    BatchingBackend,
+    BatchStats,
+    GenerationBackend,
+)
+
+from benchmarks.utils import run_load
+
+
+class FakeBackend(GenerationBackend):
+    def __init__(self, call_latency: float, prompt_latency: float, max_calls: int):
+        self.call_latency = call_latency
+        self.prompt_latency = prompt_latency
+        self._calls = asyncio.Semaphore(max_calls)
+
+    async def generate_many(self, prompts: Sequence[AnswerPrompt]) -> list[str]:
+        async with self._calls:
+            await asyncio.sleep(self.call_latency + self.prompt_latency * len(prompts))
+        return [prompt.comment for prompt in prompts]
+
+
+async def main(requests: int, concurrency: int, batch_size: int) -> None:
+    fake = FakeBackend(call_latency=0.05, prompt_latency=0.002, max_calls=4)
+    batches: list[BatchStats] = []
+    backends = {
+        "unbatched": fake,
+        f"batches of {batch_size}": BatchingBackend(
+            fake,
+            max_batch_size=batch_size,
+            max_wait=0.01,
+            max_concurrent_batches=4,
+            max_pending=concurrency * 4,
+            on_batch=batches.append,
+        ),
+    }
+    counter = itertools.count()
+    for name, backend in backends.items():
+        async def call(backend: GenerationBackend = backend) -> None:
+            await backend.generate(AnswerPrompt(post_title="Benchmark", comment=f"Comment {next(counter)}"))
+
+        print(await run_load(name, call, requests=requests, concurrency=concurrency))
+    print(f"{len(batches)} batches, {sum(stats.size for stats in batches) / len(batches):.1f} prompts on average")
+    await backends[f"batches of {batch_size}"].close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.batch_size))
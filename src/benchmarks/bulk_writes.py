@@ -0,0 +1,74 @@
+"""
+Rows per second written through single-row post endpoints versus the bulk endpoints.
+
+Every created post is deleted again at the end of the run.
+
+Usage: ``python -m benchmarks.bulk_writes [--rows 5000] [--concurrency 8]``
+"""
+import argparse
+import asyncio
+import time
+
+from core.config import create_settings
+from schemas.bulk import BULK_MAX_ITEMS
+from web import server
+from web.api.posts import (
+    bulk_create_posts_url_name,
+    bulk_delete_posts_url_name,
+    bulk_update_posts_url_name,
+    create_post_url_name,
+    update_post_url_name,
+)
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(rows: int, concurrency: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        ids: list[int] = []
+
+        async def create_one() -> None:
+            response = await client.post(app.url_path_for(create_post_url_name), json={"title": "T", "content": "C"})
+            response.raise_for_status()
+            ids.append(response.json()["id"])
+
+        print(await run_load("single-row create", create_one, requests=rows, concurrency=concurrency))
+
+        updates = iter(list(ids))
+
+        async def update_one() -> None:
+            url = app.url_path_for(update_post_url_name, post_id=next(updates))
+            (await client.patch(url, json={"title": "Updated"})).raise_for_status()
+
+        print(await run_load("single-row update", update_one, requests=rows, concurrency=concurrency))
+
+        for name, url_name in (("bulk create", bulk_create_posts_url_name), ("bulk update", bulk_update_posts_url_name)):
+            started = time.perf_counter()
+            for start in range(0, rows, BULK_MAX_ITEMS):
+                if url_name == bulk_create_posts_url_name:
+                    items = [{"title": "T", "content": "C"} for _ in range(min(BULK_MAX_ITEMS, rows - start))]
+                    response = await client.post(app.url_path_for(url_name), json={"items": items})
+                    ids.extend(result["id"] for result in response.json()["results"])
+                else:
+                    items = [{"id": obj_id, "title": "Updated"} for obj_id in ids[-rows:][start:start + BULK_MAX_ITEMS]]
+                    response = await client.patch(app.url_path_for(url_name), json={"items": items})
+                response.raise_for_status()
+            elapsed = time.perf_counter() - started
+            print(f"{name:<32} {rows / elapsed:>9.1f} rows/s, {BULK_MAX_ITEMS} per request")
+
+        for start in range(0, len(ids), BULK_MAX_ITEMS):
+            response = await client.post(
+                app.url_path_for(bulk_delete_posts_url_name), json={"ids": ids[start:start + BULK_MAX_ITEMS]}
+            )
+            response.raise_for_status()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.concurrency))
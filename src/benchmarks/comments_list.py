@@ -0,0 +1,93 @@
+"""
+Latency of ``GET /api/v1/comments/{post_id}`` on a busy post.
+
+Seeds one post with ``--comments`` comments and spreads as many again over other posts, then
+times the first page, a cursor page from the middle of the busy post and a post without comments.
+
+Usage: ``python -m benchmarks.comments_list [--comments 100000] [--runs 50]``
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.config import create_settings
+from db import Database
+from db.models import CommentModel, PostModel
+from services.pagination import encode_cursor
+from sqlalchemy import func, select, text
+from web import server
+from web.api.comments import comment_list_url_name
+
+from benchmarks.utils import create_client, ensure_posts
+
+SEED_SQL = """
+INSERT INTO comments (content, post_id, author_id, created_at)
+SELECT
+    'comment ' || n,
+    CASE WHEN :busy_post_id > 0 THEN :busy_post_id ELSE 1 + floor(random() * :posts)::int END,
+    :author_id,
+    now() - make_interval(secs => :comments - n)
+FROM generate_series(1, CAST(:comments AS integer)) AS n
+"""
+
+
+async def seed(db: Database, comments: int, author_id: int) -> tuple[int, int, str]:
+    """Return the busy post id, an empty post id and a cursor halfway through the busy post."""
+    async with db.get_async_session() as session:
+        min_id, max_id = (await session.execute(select(func.min(PostModel.id), func.max(PostModel.id)))).one()
+        busy_post_id, empty_post_id = max_id, max_id - 1
+        existing = (await session.execute(
+            select(func.count()).select_from(CommentModel).where(CommentModel.post_id == busy_post_id)
+        )).scalar_one()
+        if existing < comments:
+            params = {"author_id": author_id, "comments": comments, "posts": max_id - min_id - 2}
+            await session.execute(text(SEED_SQL), {**params, "busy_post_id": busy_post_id})
+            await session.execute(text(SEED_SQL), {**params, "busy_post_id": 0})
+            await session.execute(text("ANALYZE comments"))
+            await session.commit()
+        middle = (await session.execute(
+            select(CommentModel.created_at, CommentModel.id)
+            .where(CommentModel.post_id == busy_post_id)
+            .order_by(CommentModel.created_at, CommentModel.id)
+            .offset(comments // 2)
+            .limit(1)
+        )).one()
+    return busy_post_id, empty_post_id, encode_cursor("created_at", middle.created_at, middle.id)
+
+
+async def main(comments: int, runs: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+    db = Database(settings.db)
+    busy_post_id, empty_post_id, cursor = await seed(db, comments, user_id)
+    await db.disconnect()
+
+    app = server()
+    cases = {
+        "busy post, first page": (busy_post_id, {"limit": 20}),
+        "busy post, middle cursor": (busy_post_id, {"limit": 20, "cursor": cursor}),
+        "post without comments": (empty_post_id, {"limit": 20}),
+    }
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        for name, (post_id, params) in cases.items():
+            url = app.url_path_for(comment_list_url_name, post_id=post_id)
+            latencies = []
+            for _ in range(runs):
+                started = time.perf_counter()
+                response = await client.get(url, params=params)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+            print(
+                f"{name:<26} {len(response.json()):>3} rows   "
+                f"p50 {statistics.median(latencies) * 1000:>7.2f} ms   "
+                f"p99 {statistics.quantiles(latencies, n=100)[98] * 1000:>7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.comments, args.runs))
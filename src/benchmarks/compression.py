@@ -0,0 +1,66 @@
+"""
+Bytes on the wire and throughput of large cached ``GET /api/v1/posts`` pages, plain, compressed on every
+request and served from pre-compressed cache entries.
+
+Usage: ``python -m benchmarks.compression [--requests 2000] [--concurrency 32] [--limit 100]``
+"""
+import argparse
+import asyncio
+import random
+
+from core.config import create_settings
+from services.cache import InProcessCacheBackend, ObjectCache
+from web import server
+from web.api.posts import list_posts_url_name
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+class CompressEveryHit(ObjectCache):
+    """Forgets compressed bodies, so every hit pays for compression like a middleware-only setup would."""
+
+    async def get_or_load(self, key, struct, loader):
+        value = await super().get_or_load(key, struct, loader)
+        value.encoded.clear()
+        return value
+
+    async def set(self, key, value):
+        pass
+
+
+async def main(requests: int, concurrency: int, limit: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, limit * 10)
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        url = app.url_path_for(list_posts_url_name)
+        scenarios = (
+            ("plain", "identity", ObjectCache),
+            ("gzip every hit", "gzip", CompressEveryHit),
+            ("gzip pre-compressed", "gzip", ObjectCache),
+        )
+        for name, accept_encoding, cache_class in scenarios:
+            backend = InProcessCacheBackend(settings.cache.PAGE_CACHE_MAX_SIZE, settings.cache.PAGE_CACHE_TTL)
+            app.state.page_cache = cache_class(backend)
+            downloaded = 0
+
+            async def call() -> None:
+                nonlocal downloaded
+                params = {"limit": limit, "offset": limit * random.randrange(10)}
+                response = await client.get(url, params=params, headers={"Accept-Encoding": accept_encoding})
+                response.raise_for_status()
+                downloaded += response.num_bytes_downloaded
+
+            await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+            downloaded = 0
+            print(await run_load(name, call, requests=requests, concurrency=concurrency))
+            print(f"bytes per response: {downloaded / requests:,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=100, help="Posts per page")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.limit))
@@ -0,0 +1,85 @@
+"""
+``GET /api/v1/posts`` latency while a storm of logins runs on the same worker.
+
+Compares bcrypt on the event loop (the previous behaviour) with the bounded
+``PasswordHasher`` pool.
+
+Usage: ``python -m benchmarks.login_storm [--requests 500] [--logins 16]``
+"""
+import argparse
+import asyncio
+
+from core.config import create_settings
+from db import Database
+from db.models import UserModel
+from services.passwords import PasswordHasher
+from sqlalchemy import select
+from web import server
+from web.api.oauth import login_url_name
+from web.api.posts import list_posts_url_name
+from web.dependencies import inject_password_hasher
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+USERNAME, PASSWORD = "bench-login", "bench-password"
+
+
+class InlinePasswordHasher(PasswordHasher):
+    """Hashes on the calling thread, like the code before the executor existed."""
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._pwd_context.verify(plain_password, hashed_password)
+
+
+async def ensure_login_user(settings) -> None:
+    db = Database(settings.db)
+    async with db.get_async_session() as session:
+        user = (await session.execute(select(UserModel).where(UserModel.username == USERNAME))).scalar_one_or_none()
+        if user is None:
+            session.add(UserModel(
+                username=USERNAME,
+                email="bench-login@mail.com",
+                password=PasswordHasher._pwd_context.hash(PASSWORD),
+            ))
+            await session.commit()
+    await db.disconnect()
+
+
+async def main(requests: int, logins: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+    await ensure_login_user(settings)
+
+    inline_app = server()
+    inline_hasher = InlinePasswordHasher(max_workers=1, max_pending=1)
+    inline_app.dependency_overrides[inject_password_hasher] = lambda: inline_hasher
+    scenarios = (("no logins", server(), 0), ("bcrypt inline (before)", inline_app, logins),
+                 ("bcrypt executor (after)", server(), logins))
+
+    for name, app, storm_size in scenarios:
+        async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+            posts_url = app.url_path_for(list_posts_url_name)
+            login_url = app.url_path_for(login_url_name)
+            stop = asyncio.Event()
+
+            async def login_forever(client=client, login_url=login_url, stop=stop) -> None:
+                while not stop.is_set():
+                    await client.post(login_url, json={"username": USERNAME, "password": PASSWORD})
+
+            async def call(client=client, posts_url=posts_url) -> None:
+                response = await client.get(posts_url, params={"limit": 20})
+                response.raise_for_status()
+
+            storm = [asyncio.create_task(login_forever()) for _ in range(storm_size)]
+            await asyncio.sleep(0.5)
+            print(await run_load(name, call, requests=requests, concurrency=4))
+            stop.set()
+            await asyncio.gather(*storm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--logins", type=int, default=16)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.logins))
@@ -0,0 +1,41 @@
+"""
+Overhead of request metrics on cheap requests: throughput of ``GET /api/v1/healthcheck`` and cached
+``GET /api/v1/posts`` pages with ``METRICS_ENABLED`` off and on.
+
+Usage: ``python -m benchmarks.metrics [--requests 5000] [--concurrency 32]``
+"""
+import argparse
+import asyncio
+import os
+
+from core.config import create_settings
+from web import server
+from web.api.posts import list_posts_url_name
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(requests: int, concurrency: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+    for enabled in ("false", "true"):
+        os.environ["METRICS_ENABLED"] = enabled
+        app = server()
+        async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+            for name in ("health_check", list_posts_url_name):
+                url = app.url_path_for(name)
+
+                async def call() -> None:
+                    response = await client.get(url, params={"limit": 20})
+                    response.raise_for_status()
+
+                await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+                print(await run_load(f"{name}, metrics {enabled}", call, requests=requests, concurrency=concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
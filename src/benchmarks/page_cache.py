@@ -0,0 +1,61 @@
+"""
+Throughput of popular ``GET /api/v1/posts`` pages with and without the page cache, while posts are being written.
+
+Usage: ``python -m benchmarks.page_cache [--requests 3000] [--concurrency 32] [--write-every 100]``
+"""
+import argparse
+import asyncio
+import itertools
+import random
+
+from core.config import create_settings
+from services.cache import InProcessCacheBackend, ObjectCache
+from web import server
+from web.api.posts import create_post_url_name, list_posts_url_name
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+class Uncached(ObjectCache):
+    """Renders every request, without the single-flight coalescing a zero sized cache would still do."""
+
+    async def get_or_load(self, key, struct, loader):
+        self.misses += 1
+        return await loader()
+
+
+async def main(requests: int, concurrency: int, write_every: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 1000)
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        counter = itertools.count()
+        queries = [
+            {"limit": 20},
+            {"limit": 20, "offset": 20},
+            {"limit": 50, "order_by": "-id"},
+            {"limit": 20, "author_id": user_id},
+        ]
+
+        async def call() -> None:
+            if next(counter) % write_every == 0:
+                response = await client.post(app.url_path_for(create_post_url_name), json={"title": "T", "content": "C"})
+            else:
+                response = await client.get(app.url_path_for(list_posts_url_name), params=random.choice(queries))
+            response.raise_for_status()
+
+        backend = InProcessCacheBackend(settings.cache.PAGE_CACHE_MAX_SIZE, settings.cache.PAGE_CACHE_TTL)
+        for name, cache in (("no page cache", Uncached(backend)), ("page cache", ObjectCache(backend))):
+            app.state.page_cache = cache
+            await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+            print(await run_load(name, call, requests=requests, concurrency=concurrency))
+            print(f"hit ratio: {app.state.page_cache.stats.hit_ratio:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--write-every", type=int, default=100, help="Create a post every N requests")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.write_every))
@@ -0,0 +1,53 @@
+"""
+Pool checkouts and throughput of ``GET /api/v1/posts`` when every request misses the auth cache.
+
+Runs against a deliberately small pool so that checkouts per request show up in latency.
+
+Usage: ``python -m benchmarks.pool_checkouts [--requests 2000] [--concurrency 32] [--pool-size 4]``
+"""
+import argparse
+import asyncio
+import os
+
+from core.config import create_settings
+from sqlalchemy import event
+from web import server
+from web.api.posts import list_posts_url_name
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(requests: int, concurrency: int, pool_size: int) -> None:
+    # the lifespan builds its own settings, so size the pool through the environment
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        url = app.url_path_for(list_posts_url_name)
+        checkouts = 0
+
+        def on_checkout(*args) -> None:
+            nonlocal checkouts
+            checkouts += 1
+
+        async def call() -> None:
+            app.state.auth_cache.invalidate(user_id)
+            response = await client.get(url, params={"limit": 20})
+            response.raise_for_status()
+
+        await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+        event.listen(app.state.db.async_engine.sync_engine.pool, "checkout", on_checkout)
+        print(await run_load(f"pool_size={pool_size}", call, requests=requests, concurrency=concurrency))
+        print(f"pool checkouts per request: {checkouts / requests:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.pool_size))
@@ -0,0 +1,54 @@
+"""
+Throughput of ``GET /api/v1/posts/{id}`` over a skewed set of hot posts, with and without the object cache.
+
+Usage: ``python -m benchmarks.post_detail [--requests 5000] [--concurrency 32] [--posts 1000]``
+"""
+import argparse
+import asyncio
+import random
+
+from core.config import create_settings
+from db.models import PostModel
+from services.cache import InProcessCacheBackend, ObjectCache
+from sqlalchemy import event, select
+from web import server
+from web.api.posts import get_post_url_name
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(requests: int, concurrency: int, posts: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, posts)
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        async with app.state.db.get_async_session() as session:
+            ids = (await session.execute(select(PostModel.id).limit(posts))).scalars().all()
+        statements = 0
+
+        def on_execute(*args) -> None:
+            nonlocal statements
+            statements += 1
+
+        async def call() -> None:
+            # a few posts take most of the reads
+            post_id = ids[int(len(ids) * random.random() ** 3)]
+            response = await client.get(app.url_path_for(get_post_url_name, post_id=post_id))
+            response.raise_for_status()
+
+        event.listen(app.state.db.async_engine.sync_engine, "before_cursor_execute", on_execute)
+        for name, max_size in (("no cache", 0), ("object cache", settings.cache.OBJECT_CACHE_MAX_SIZE)):
+            app.state.object_cache = ObjectCache(InProcessCacheBackend(max_size, settings.cache.OBJECT_CACHE_TTL))
+            await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+            statements = 0
+            print(await run_load(name, call, requests=requests, concurrency=concurrency))
+            print(f"queries per request: {statements / requests:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--posts", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.posts))
@@ -0,0 +1,57 @@
+"""
+Throughput and bytes per response of uncached ``GET /api/v1/posts`` feed pages, full versus ``view=summary``.
+
+Pages are reached through keyset cursors, the way a scrolling feed fetches them.
+
+Usage: ``python -m benchmarks.post_views [--requests 2000] [--concurrency 32] [--limit 100] [--pages 50]``
+"""
+import argparse
+import asyncio
+import random
+
+from core.config import create_settings
+from services.cache import InProcessCacheBackend
+from web import server
+from web.api.posts import list_posts_url_name
+from web.dependencies.filters import NEXT_CURSOR_HEADER
+
+from benchmarks.page_cache import Uncached
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(requests: int, concurrency: int, limit: int, pages: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, limit * pages)
+    app = server()
+    async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+        app.state.page_cache = Uncached(InProcessCacheBackend(0, 0))
+        url = app.url_path_for(list_posts_url_name)
+        cursors = [None]
+        for _ in range(pages - 1):
+            response = await client.get(url, params={"limit": limit, "cursor": cursors[-1]})
+            cursors.append(response.headers[NEXT_CURSOR_HEADER])
+
+        for view in ("full", "summary"):
+            downloaded = 0
+
+            async def call() -> None:
+                nonlocal downloaded
+                params = {"view": view, "limit": limit, "cursor": random.choice(cursors)}
+                response = await client.get(url, params=params, headers={"Accept-Encoding": "identity"})
+                response.raise_for_status()
+                downloaded += response.num_bytes_downloaded
+
+            await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+            downloaded = 0
+            print(await run_load(f"view={view}", call, requests=requests, concurrency=concurrency))
+            print(f"bytes per response: {downloaded / requests:,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--limit", type=int, default=100, help="Posts per page")
+    parser.add_argument("--pages", type=int, default=50, help="How deep into the feed requests go")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.limit, args.pages))
@@ -0,0 +1,51 @@
+"""
+Throughput of ``GET /api/v1/posts`` with a per-request engine versus the shared lifespan pool.
+
+Usage: ``python -m benchmarks.posts_list [--requests 2000] [--concurrency 32]``
+"""
+import argparse
+import asyncio
+from typing import AsyncGenerator
+
+from core.config import create_settings
+from db import Database
+from web import server
+from web.api.posts import list_posts_url_name
+from web.dependencies import inject_database
+
+from benchmarks.utils import create_client, ensure_posts, run_load
+
+
+async def main(requests: int, concurrency: int) -> None:
+    settings = create_settings()
+    user_id = await ensure_posts(settings, 100)
+
+    async def database_per_request() -> AsyncGenerator[Database, None]:
+        # The previous behaviour never disposed these engines and ran out of server
+        # connections under load, so dispose at request end to keep the run comparable.
+        db = Database(settings.db)
+        yield db
+        await db.disconnect()
+
+    per_request_app = server()
+    per_request_app.dependency_overrides[inject_database] = database_per_request
+    shared_app = server()
+
+    for name, app in (("engine per request (before)", per_request_app), ("lifespan pool (after)", shared_app)):
+        async with app.router.lifespan_context(app), create_client(app, settings, user_id) as client:
+            url = app.url_path_for(list_posts_url_name)
+
+            async def call(client=client, url=url) -> None:
+                response = await client.get(url, params={"limit": 20})
+                response.raise_for_status()
+
+            await run_load("warmup", call, requests=concurrency * 2, concurrency=concurrency)
+            print(await run_load(name, call, requests=requests, concurrency=concurrency))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,86 @@
+"""
+Latency of full-text post search on a seeded table.
+
+Seeds ``--posts`` rows straight in SQL (``generate_series`` over a fixed vocabulary with a
+skewed word distribution, so some terms are rare and some are common), then times
+``PostRepository.get_posts_with_author`` with a ``search`` filter.
+
+Usage: ``python -m benchmarks.posts_search [--posts 1000000] [--runs 50]``
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from core.config import create_settings
+from db import Database
+from db.models import PostModel, UserModel
+from services.filters import Pagination, PostFilter
+from services.repositories.posts import PostRepository
+from sqlalchemy import func, select, text
+
+SEED_SQL = """
+INSERT INTO posts (title, content, author_id)
+SELECT
+    'post ' || n || ' about ' || (ARRAY['python', 'postgres', 'search', 'asyncio', 'kernel'])[1 + n % 5],
+    (
+        SELECT string_agg('word' || floor(power(random(), 3) * 5000)::int, ' ')
+        FROM generate_series(1, 80) WHERE n >= 0
+    ),
+    :author_id
+FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS n
+"""
+
+QUERIES = {
+    "rare term": "word4999",
+    "title term": "kernel word4000",
+    "phrase": '"post 4242"',
+    "common term, first page": "word1",
+}
+
+
+async def seed(db: Database, posts: int) -> None:
+    async with db.get_async_session() as session:
+        existing = (await session.execute(select(func.count()).select_from(PostModel))).scalar_one()
+        if existing >= posts:
+            return
+        user = (await session.execute(select(UserModel).limit(1))).scalar_one_or_none()
+        if user is None:
+            user = UserModel(username="bench", email="bench@mail.com", password="-")
+            session.add(user)
+            await session.flush()
+        for start in range(existing, posts, 100_000):
+            stop = min(start + 100_000, posts) - 1
+            await session.execute(text(SEED_SQL), {"author_id": user.id, "start": start, "stop": stop})
+            await session.commit()
+            print(f"seeded {stop + 1} posts")
+        await session.execute(text("ANALYZE posts"))
+        await session.commit()
+
+
+async def main(posts: int, runs: int) -> None:
+    db = Database(create_settings().db)
+    await seed(db, posts)
+    repository = PostRepository()
+    for name, query in QUERIES.items():
+        filters = PostFilter(title=None, author_id=None, search=query)
+        latencies = []
+        async with db.get_async_session() as session:
+            for _ in range(runs):
+                started = time.perf_counter()
+                page = await repository.get_posts_with_author(session, filters, [], Pagination(limit=20))
+                latencies.append(time.perf_counter() - started)
+        print(
+            f"{name:<26} {len(page.items):>3} rows   "
+            f"p50 {statistics.median(latencies) * 1000:>7.2f} ms   "
+            f"p99 {statistics.quantiles(latencies, n=100)[98] * 1000:>7.2f} ms"
+        )
+    await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.posts, args.runs))
@@ -0,0 +1,56 @@
+"""
+Cost of serializing a 100-row post page: the pydantic path versus msgspec structs.
+
+The pydantic path mirrors what the list endpoint used to do: ``model_validate`` per row,
+FastAPI validating and dumping the list against the response model, then
+``MsgSpecJSONResponse`` encoding the result.
+
+Usage: ``python -m benchmarks.serialization [--rows 100] [--number 500]``
+"""
+import argparse
+import timeit
+from datetime import datetime
+
+from db.models import PostModel, UserModel
+from pydantic import TypeAdapter
+from schemas.posts import PostListItemSchema
+from schemas.structs import PostListItemStruct
+from web.responses import MsgSpecJSONResponse, StructResponse
+
+
+def make_page(rows: int) -> list[PostModel]:
+    now = datetime.now()
+    author = UserModel(id=1, username="author", email="author@mail.com", password="-")
+    return [
+        PostModel(
+            id=i, title=f"Post {i}", content="lorem ipsum dolor sit amet " * 40,
+            created_at=now, updated_at=now, author_id=author.id, author=author,
+        )
+        for i in range(rows)
+    ]
+
+
+def main(rows: int, number: int) -> None:
+    page = make_page(rows)
+    response_adapter = TypeAdapter(list[PostListItemSchema])
+
+    def pydantic_path() -> bytes:
+        items = [PostListItemSchema.model_validate(post, from_attributes=True) for post in page]
+        content = response_adapter.dump_python(response_adapter.validate_python(items), mode="json")
+        return MsgSpecJSONResponse(content).body
+
+    def struct_path() -> bytes:
+        return StructResponse(page, list[PostListItemStruct]).body
+
+    assert len(pydantic_path()) == len(struct_path())
+    for name, func in (("pydantic + response model", pydantic_path), ("msgspec structs", struct_path)):
+        seconds = timeit.timeit(func, number=number) / number
+        print(f"{name:<28} {seconds * 1000:>7.3f} ms per {rows}-row page")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--number", type=int, default=500)
+    args = parser.parse_args()
+    main(args.rows, args.number)
@@ -0,0 +1,89 @@
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import httpx
+from core.config import MainSettings
+from db import Database
+from db.models import PostModel, UserModel
+from fastapi import FastAPI
+from httpx import ASGITransport
+from services.oauth import JwtAuthService
+from sqlalchemy import func, select
+
+
+@dataclass(frozen=True, slots=True)
+class BenchmarkResult:
+    name: str
+    requests: int
+    seconds: float
+    latencies: list[float]
+
+    @property
+    def rps(self) -> float:
+        return self.requests / self.seconds
+
+    @property
+    def p50(self) -> float:
+        return statistics.median(self.latencies) * 1000
+
+    @property
+    def p99(self) -> float:
+        return statistics.quantiles(self.latencies, n=100)[98] * 1000
+
+    def __str__(self) -> str:
+        return f"{self.name:<32} {self.rps:>9.1f} req/s   p50 {self.p50:>7.2f} ms   p99 {self.p99:>7.2f} ms"
+
+
+async def run_load(
+        name: str,
+        call: Callable[[], Awaitable[None]],
+        requests: int,
+        concurrency: int,
+) -> BenchmarkResult:
+    latencies: list[float] = []
+    queue: asyncio.Queue[None] = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker() -> None:
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return BenchmarkResult(name, requests, time.perf_counter() - started, latencies)
+
+
+def create_client(app: FastAPI, settings: MainSettings, user_id: int) -> httpx.AsyncClient:
+    tokens = JwtAuthService(settings.security).generate_jwt_tokens(user_id)
+    return httpx.AsyncClient(
+        transport=ASGITransport(app=app),
+        base_url="http://bench",
+        headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+
+
+async def ensure_posts(settings: MainSettings, count: int) -> int:
+    """Make sure the benchmark database has at least ``count`` posts and return an author id."""
+    db = Database(settings.db)
+    async with db.get_async_session() as session:
+        user = (await session.execute(select(UserModel).limit(1))).scalar_one_or_none()
+        if user is None:
+            user = UserModel(username="bench", email="bench@mail.com", password="-")
+            session.add(user)
+            await session.flush()
+        existing = (await session.execute(select(func.count()).select_from(PostModel))).scalar_one()
+        session.add_all(
+            PostModel(title=f"Bench post {i}", content="lorem ipsum " * 50, author_id=user.id)
+            for i in range(existing, count)
+        )
+        await session.commit()
+        user_id = user.id
+    await db.disconnect()
+    return user_id
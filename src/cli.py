@@ -3,7 +3,9 @@ from typing import cast
 
 import click
 from click.core import Command
-from commands.user import create_admin
+from commands.export import export_posts
+from commands.seed import seed
+from commands.user import create_admin, set_role
 
 
 @click.group()
@@ -13,5 +15,8 @@ def cli():
 
 if __name__ == "__main__":
     cli.add_command(cast(Command, create_admin))
+    cli.add_command(cast(Command, export_posts))
+    cli.add_command(cast(Command, seed))
+    cli.add_command(cast(Command, set_role))
     loop = asyncio.get_event_loop()
     loop.run_until_complete(cli())
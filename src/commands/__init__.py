@@ -1,5 +1,10 @@
-from .user import create_admin
+from .export import export_posts
+from .seed import seed
+from .user import create_admin, set_role
 
 __all__ = [
     "create_admin",
+    "export_posts",
+    "seed",
+    "set_role",
 ]
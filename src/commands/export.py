@@ -0,0 +1,43 @@
+import asyncio
+from typing import BinaryIO
+
+import click
+from core.config import MainSettings, create_settings
+from db import Database
+from services.export import export_posts_ndjson, gzip_stream
+from services.filters import PostFilter
+
+
+async def export_posts_command(
+        output: BinaryIO,
+        filters: PostFilter,
+        gzip: bool,
+        settings: MainSettings
+):
+    db = Database(settings.db)
+    async with db.get_async_session() as session:
+        chunks = export_posts_ndjson(session, filters)
+        if gzip:
+            chunks = gzip_stream(chunks)
+        async for chunk in chunks:
+            output.write(chunk)
+    output.flush()
+    await db.disconnect()
+
+
+@click.command()
+@click.option("--output", "-o", type=click.Path(dir_okay=False, allow_dash=True), default="-", help="Output file, stdout by default")
+@click.option("--title", type=str, default=None)
+@click.option("--author-id", type=int, default=None)
+@click.option("--search", "-q", type=str, default=None, help="Full-text search over title and content")
+@click.option("--gzip", is_flag=True, help="Compress the output with gzip")
+def export_posts(output: str, title: str | None, author_id: int | None, search: str | None, gzip: bool):
+    with click.open_file(output, "wb") as file:
+        asyncio.run(export_posts_command(
+            output=file,
+            filters=PostFilter(title=title, author_id=author_id, search=search),
+            gzip=gzip,
+            settings=create_settings()
+        ))
+    if output != "-":
+        click.echo(f"Posts have been exported to {output}", err=True)
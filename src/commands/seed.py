@@ -0,0 +1,285 @@
+import asyncio
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable, Iterator, NamedTuple
+
+import asyncpg
+import click
+from core.config import MainSettings, create_settings
+from core.config.constansts import UserRole
+from db.models import CommentModel, PostModel, UserModel, UserSettingsModel
+from services.passwords import PasswordHasher
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "zu", "pe", "dra", "gon", "tel", "mar", "qui", "bex")
+TEXT_POOL_SIZE = 5_000
+TABLES = (
+    UserModel.__tablename__, UserSettingsModel.__tablename__, PostModel.__tablename__, CommentModel.__tablename__
+)
+
+
+class SeedBatch(NamedTuple):
+    table: str
+    columns: tuple[str, ...]
+    start: int
+    count: int
+
+
+class SeedPlan(NamedTuple):
+    users: int
+    posts: int
+    comments: int
+    author_skew: float
+    post_skew: float
+    days: int
+
+
+def skewed(size: int, skew: float, rnd: Callable[[], float] = random.random) -> int:
+    """Pick an index in ``range(size)``; ``skew`` 1 is uniform, higher values favour low indexes."""
+    return int(size * rnd() ** skew)
+
+
+def _vocabulary(size: int = 4_000) -> list[str]:
+    words = ("".join(parts) for length in (2, 3, 4) for parts in itertools.product(SYLLABLES, repeat=length))
+    return list(itertools.islice(words, size))
+
+
+def _text_pool(words: list[str], min_words: int, max_words: int) -> list[str]:
+    # a few thousand distinct texts picked at random per row is realistic enough and costs nothing per row
+    return [
+        " ".join(random.choices(words, k=random.randint(min_words, max_words)))
+        for _ in range(TEXT_POOL_SIZE)
+    ]
+
+
+class RecordFactory:
+    """Builds COPY records for one table batch from precomputed text pools and skewed references."""
+
+    def __init__(self, plan: SeedPlan, first_ids: dict[str, int], password_hash: str):
+        words = _vocabulary()
+        self.plan = plan
+        self.first_ids = first_ids
+        self.password_hash = password_hash
+        self.titles = _text_pool(words, 3, 10)
+        self.post_texts = _text_pool(words, 20, 120)
+        self.comment_texts = _text_pool(words, 5, 60)
+        self.now = datetime.utcnow().replace(microsecond=0)
+        self.span = timedelta(days=plan.days).total_seconds()
+
+    def records(self, batch: SeedBatch) -> Iterator[tuple]:
+        return getattr(self, f"_{batch.table}")(batch)
+
+    def _users(self, batch: SeedBatch) -> Iterator[tuple]:
+        first_id = self.first_ids[UserModel.__tablename__]
+        for offset in range(batch.start, batch.start + batch.count):
+            user_id = first_id + offset
+            joined_at = self._created_at(offset, self.plan.users)
+            yield (
+                user_id, f"seed{user_id}", f"seed{user_id}@example.com", self.password_hash,
+                UserRole.USER.name, joined_at, joined_at,
+            )
+
+    def _user_settings(self, batch: SeedBatch) -> Iterator[tuple]:
+        first_id = self.first_ids[UserModel.__tablename__]
+        delay = (datetime.min + timedelta(minutes=5)).time()
+        for offset in range(batch.start, batch.start + batch.count):
+            yield first_id + offset, False, delay
+
+    def _posts(self, batch: SeedBatch) -> Iterator[tuple]:
+        first_id, first_user_id = self.first_ids[PostModel.__tablename__], self.first_ids[UserModel.__tablename__]
+        users, skew = self.plan.users, self.plan.author_skew
+        choice, rnd = random.choice, random.random
+        for offset in range(batch.start, batch.start + batch.count):
+            created_at = self._created_at(offset, self.plan.posts)
+            yield (
+                first_id + offset, choice(self.titles), choice(self.post_texts),
+                first_user_id + skewed(users, skew, rnd), created_at, created_at,
+            )
+
+    def _comments(self, batch: SeedBatch) -> Iterator[tuple]:
+        last_post_id = self.first_ids[PostModel.__tablename__] + self.plan.posts - 1
+        first_user_id = self.first_ids[UserModel.__tablename__]
+        users, posts = self.plan.users, self.plan.posts
+        author_skew, post_skew = self.plan.author_skew, self.plan.post_skew
+        choice, rnd = random.choice, random.random
+        now, span = self.now, self.span
+        for _ in range(batch.count):
+            created_at = now - timedelta(seconds=rnd() * span)
+            yield (
+                choice(self.comment_texts),
+                # the hottest posts are the newest ones
+                last_post_id - skewed(posts, post_skew, rnd),
+                first_user_id + skewed(users, author_skew, rnd),
+                created_at,
+                created_at,
+            )
+
+    def _created_at(self, offset: int, total: int) -> datetime:
+        # ids and timestamps grow together, like rows written by the application
+        return self.now - timedelta(seconds=self.span * (1 - offset / max(total, 1)))
+
+
+def plan_batches(plan: SeedPlan, batch_size: int) -> list[list[SeedBatch]]:
+    """Split the load into stages that must run in order, each a list of batches that may run in parallel."""
+    tables = (
+        (UserModel, ("id", "username", "email", "password", "role", "joined_at", "updated_at"), plan.users),
+        (UserSettingsModel, ("user_id", "auto_comment_answer", "auto_answer_delay"), plan.users),
+        (PostModel, ("id", "title", "content", "author_id", "created_at", "updated_at"), plan.posts),
+        (CommentModel, ("content", "post_id", "author_id", "created_at", "updated_at"), plan.comments),
+    )
+    stages = []
+    for model, columns, total in tables:
+        stages.append([
+            SeedBatch(model.__tablename__, columns, start, min(batch_size, total - start))
+            for start in range(0, total, batch_size)
+        ])
+    return [stages[0], stages[1] + stages[2], stages[3]]
+
+
+@asynccontextmanager
+async def detached_indexes(connection: asyncpg.Connection, tables: tuple[str, ...]) -> AsyncIterator[None]:
+    """
+    Drop secondary indexes and foreign keys of ``tables`` for the duration of the block.
+
+    Building an index once and validating a foreign key with one join is far cheaper than
+    maintaining them row by row during COPY. They are restored even if the load fails.
+    """
+    foreign_keys = await connection.fetch(
+        "SELECT conrelid::regclass::text AS table, conname AS name, pg_get_constraintdef(oid) AS definition "
+        "FROM pg_constraint WHERE contype = 'f' AND conrelid = ANY($1::regclass[])",
+        tables,
+    )
+    indexes = await connection.fetch(
+        "SELECT indexrelid::regclass::text AS name, pg_get_indexdef(indexrelid) AS definition FROM pg_index "
+        "WHERE indrelid = ANY($1::regclass[]) AND NOT EXISTS "
+        "(SELECT FROM pg_constraint WHERE conindid = indexrelid)",
+        tables,
+    )
+    for fk in foreign_keys:
+        await connection.execute(f'ALTER TABLE {fk["table"]} DROP CONSTRAINT "{fk["name"]}"')
+    for index in indexes:
+        await connection.execute(f'DROP INDEX {index["name"]}')
+    try:
+        yield
+    finally:
+        for index in indexes:
+            await connection.execute(index["definition"])
+        for fk in foreign_keys:
+            await connection.execute(f'ALTER TABLE {fk["table"]} ADD CONSTRAINT "{fk["name"]}" {fk["definition"]}')
+
+
+async def _copy_worker(
+        connection: asyncpg.Connection,
+        queue: asyncio.Queue[SeedBatch],
+        factory: RecordFactory,
+        progress: Callable[[SeedBatch], None],
+) -> None:
+    while not queue.empty():
+        batch = queue.get_nowait()
+        records = list(factory.records(batch))
+        await connection.copy_records_to_table(batch.table, records=records, columns=batch.columns)
+        progress(batch)
+
+
+async def seed_command(
+        plan: SeedPlan,
+        batch_size: int,
+        workers: int,
+        password: str,
+        keep_indexes: bool,
+        settings: MainSettings,
+):
+    # every seeded user shares one hash, bcrypt would otherwise dominate the run
+    password_hasher = PasswordHasher(
+        max_workers=settings.security.PASSWORD_HASH_WORKERS,
+        max_pending=settings.security.PASSWORD_HASH_MAX_PENDING,
+    )
+    try:
+        password_hash = await password_hasher.hash(password)
+    finally:
+        password_hasher.shutdown()
+
+    dsn = settings.db.DB_CONNECTION_URL.replace("+asyncpg", "", 1)
+    connections = await asyncio.gather(*(asyncpg.connect(dsn) for _ in range(workers)))
+    try:
+        first_ids = {
+            table: await connections[0].fetchval(f"SELECT coalesce(max(id), 0) + 1 FROM {table}")
+            for table in (UserModel.__tablename__, PostModel.__tablename__)
+        }
+        factory = RecordFactory(plan, first_ids, password_hash)
+        started, written = time.perf_counter(), dict.fromkeys(TABLES, 0)
+
+        def progress(batch: SeedBatch) -> None:
+            written[batch.table] += batch.count
+            elapsed = time.perf_counter() - started
+            click.echo(f"{batch.table:<14} {written[batch.table]:>12,} rows  {elapsed:>7.1f}s", err=True)
+
+        detached = () if keep_indexes else (PostModel.__tablename__, CommentModel.__tablename__)
+        async with detached_indexes(connections[0], detached):
+            for stage in plan_batches(plan, batch_size):
+                queue: asyncio.Queue[SeedBatch] = asyncio.Queue()
+                for batch in stage:
+                    queue.put_nowait(batch)
+                await asyncio.gather(*(
+                    _copy_worker(connection, queue, factory, progress) for connection in connections
+                ))
+            if detached:
+                click.echo("Rebuilding indexes and foreign keys", err=True)
+
+        # rows were copied with explicit ids, move the sequences past them
+        for table in (UserModel.__tablename__, PostModel.__tablename__):
+            await connections[0].execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+            )
+        await connections[0].execute(f"ANALYZE {', '.join(TABLES)}")
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+    click.echo(
+        f"Seeded {plan.users} users, {plan.posts} posts and {plan.comments} comments "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+@click.command()
+@click.option("--users", type=click.IntRange(min=1), default=100_000, show_default=True)
+@click.option("--posts", type=click.IntRange(min=1), default=500_000, show_default=True)
+@click.option("--comments", type=click.IntRange(min=0), default=10_000_000, show_default=True)
+@click.option(
+    "--author-skew", type=click.FloatRange(min=1), default=2.0, show_default=True,
+    help="1 spreads posts and comments evenly over users, higher values create hot authors",
+)
+@click.option(
+    "--post-skew", type=click.FloatRange(min=1), default=3.0, show_default=True,
+    help="1 spreads comments evenly over posts, higher values create hot posts",
+)
+@click.option("--days", type=click.IntRange(min=1), default=365, show_default=True, help="Age of the oldest rows")
+@click.option("--batch-size", type=click.IntRange(min=1), default=50_000, show_default=True)
+@click.option("--workers", type=click.IntRange(min=1), default=4, show_default=True, help="Parallel COPY connections")
+@click.option("--password", type=str, default="password", show_default=True, help="Password of every seeded user")
+@click.option("--keep-indexes", is_flag=True, help="Maintain indexes and foreign keys row by row instead of rebuilding them")
+@click.option("--random-seed", type=int, default=None, help="Make the generated dataset reproducible")
+def seed(
+        users: int,
+        posts: int,
+        comments: int,
+        author_skew: float,
+        post_skew: float,
+        days: int,
+        batch_size: int,
+        workers: int,
+        password: str,
+        keep_indexes: bool,
+        random_seed: int | None,
+):
+    random.seed(random_seed)
+    asyncio.run(seed_command(
+        plan=SeedPlan(users, posts, comments, author_skew, post_skew, days),
+        batch_size=batch_size,
+        workers=workers,
+        password=password,
+        keep_indexes=keep_indexes,
+        settings=create_settings()
+    ))
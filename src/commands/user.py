@@ -5,7 +5,9 @@ from core.config import MainSettings, create_settings
 from core.config.constansts import UserRole
 from db import Database
 from db.models import UserModel
-from services.oauth import JwtAuthService
+from services.oauth import AuthUserCache
+from services.passwords import PasswordHasher
+from services.repositories.users import UserRepository
 
 
 async def create_admin_command(
@@ -15,8 +17,14 @@ async def create_admin_command(
         settings: MainSettings
 ):
     db = Database(settings.db)
-    jwt_service = JwtAuthService(security_settings=settings.security)
-    password = jwt_service.hash_password(password)
+    password_hasher = PasswordHasher(
+        max_workers=settings.security.PASSWORD_HASH_WORKERS,
+        max_pending=settings.security.PASSWORD_HASH_MAX_PENDING,
+    )
+    try:
+        password = await password_hasher.hash(password)
+    finally:
+        password_hasher.shutdown()
     async with db.get_async_session() as session:
         new_admin = UserModel(
             username=username,
@@ -26,10 +34,26 @@ async def create_admin_command(
         )
         session.add(new_admin)
         await session.commit()
+    await db.disconnect()
 
     click.echo(f"User {new_admin.username} has been created")
 
 
+async def set_role_command(username: str, role: UserRole, settings: MainSettings):
+    db = Database(settings.db)
+    repository = UserRepository()
+    try:
+        async with db.unit_of_work() as session:
+            user = await repository.get_by_username(session, username)
+            await repository.set_role(session, user.id, role)
+            # the running processes drop the user's cached principal, and with it the old tokens
+            await AuthUserCache.broadcast(session, user.id)
+    finally:
+        await db.disconnect()
+
+    click.echo(f"User {username} now has the {role.value} role, and has to log in again")
+
+
 @click.command()
 @click.argument("username", type=str)
 @click.argument("email", type=str)
@@ -41,3 +65,14 @@ def create_admin(username: str, email: str, password: str):
         password=password,
         settings=create_settings()
     ))
+
+
+@click.command()
+@click.argument("username", type=str)
+@click.argument("role", type=click.Choice([role.value for role in UserRole]))
+def set_role(username: str, role: str):
+    asyncio.run(set_role_command(
+        username=username,
+        role=UserRole(role),
+        settings=create_settings()
+    ))
@@ -1,6 +1,11 @@
 from .settings import (
+    AnswerSettings,
+    CacheSettings,
+    CommentFeedSettings,
+    CompressionSettings,
     CORSSettings,
     MainSettings,
+    MetricsSettings,
     PostgresDBSettings,
     SecuritySettings,
     create_settings,
@@ -12,7 +17,12 @@ __all__ = [
     "PostgresDBSettings",
     "SecuritySettings",
     "create_settings",
+    "CacheSettings",
+    "CompressionSettings",
     "CORSSettings",
+    "MetricsSettings",
+    "AnswerSettings",
+    "CommentFeedSettings",
     "create_test_settings",
     "create_settings",
 ]
@@ -3,4 +3,9 @@ import enum
 
 class UserRole(enum.Enum):
     ADMIN = "admin"
-    USER = "user"
\ No newline at end of file
+    USER = "user"
+
+
+class PostView(enum.Enum):
+    FULL = "full"
+    SUMMARY = "summary"
@@ -1,5 +1,5 @@
 from functools import lru_cache
-from typing import List
+from typing import List, Literal
 
 from pydantic import Field, PostgresDsn, field_validator
 from pydantic_core.core_schema import ValidationInfo
@@ -31,6 +31,17 @@ class PostgresDBSettings(BaseEnvSettings):
     MAX_OVERFLOW: int = Field(default=20, validation_alias="DB_MAX_OVERFLOW")
     POOL_TIMEOUT: int = Field(default=30, validation_alias="DB_POOL_TIMEOUT")
     POOL_RECYCLE: int = Field(default=900, validation_alias="DB_POOL_RECYCLE")
+    POOL_PRE_WARM: int = Field(default=5, validation_alias="DB_POOL_PRE_WARM")
+    # what to do when a request runs more statements than its route's query_budget
+    QUERY_BUDGET_MODE: Literal["off", "warn", "raise"] = Field(default="warn", validation_alias="DB_QUERY_BUDGET_MODE")
+    # statements slower than this are logged, 0 logs every statement
+    SLOW_QUERY_MS: float = Field(default=200, validation_alias="DB_SLOW_QUERY_MS")
+    # also capture EXPLAIN (ANALYZE, BUFFERS) of slow SELECTs, which runs them a second time
+    SLOW_QUERY_EXPLAIN: bool = Field(default=False, validation_alias="DB_SLOW_QUERY_EXPLAIN")
+    # distinct normalized statements whose totals are kept for the admin top list
+    QUERY_STATS_SIZE: int = Field(default=500, validation_alias="DB_QUERY_STATS_SIZE")
+    # how long the connection listening for notifications may stay silent before it is checked
+    LISTEN_KEEPALIVE: float = Field(default=30, validation_alias="DB_LISTEN_KEEPALIVE_SECONDS")
 
     @field_validator("DB_CONNECTION_URL", mode="after")
     @classmethod
@@ -68,6 +79,75 @@ class SecuritySettings(BaseEnvSettings):
     ALGORITHM: str = Field(validation_alias="ALGORITHM", default="HS256")
     ACCESS_TOKEN_EXPIRES_MINUTES: int = Field(validation_alias="ACCESS_TOKEN_EXPIRES_MINUTES", default=60 * 24 * 7)
     REFRESH_TOKEN_EXPIRES_MINUTES: int = Field(validation_alias="REFRESH_TOKEN_EXPIRES_MINUTES", default=60 * 24 * 7)
+    PASSWORD_HASH_WORKERS: int = Field(validation_alias="PASSWORD_HASH_WORKERS", default=2)
+    PASSWORD_HASH_MAX_PENDING: int = Field(validation_alias="PASSWORD_HASH_MAX_PENDING", default=32)
+
+
+class CacheSettings(BaseEnvSettings):
+    # the auth cache is per process too, and role or settings changes reach the others the same way
+    AUTH_CACHE_TTL: float = Field(validation_alias="AUTH_CACHE_TTL", default=60)
+    AUTH_CACHE_MAX_SIZE: int = Field(validation_alias="AUTH_CACHE_MAX_SIZE", default=10_000)
+    # object and page caches are per process, writes reach the others over NOTIFY as they commit,
+    # and a process clears them whenever it (re)connects to listen, having possibly missed some
+    OBJECT_CACHE_TTL: float = Field(validation_alias="OBJECT_CACHE_TTL", default=30)
+    OBJECT_CACHE_MAX_SIZE: int = Field(validation_alias="OBJECT_CACHE_MAX_SIZE", default=10_000)
+    PAGE_CACHE_TTL: float = Field(validation_alias="PAGE_CACHE_TTL", default=60)
+    PAGE_CACHE_MAX_SIZE: int = Field(validation_alias="PAGE_CACHE_MAX_SIZE", default=1_000)
+
+
+class CompressionSettings(BaseEnvSettings):
+    MIN_SIZE: int = Field(validation_alias="COMPRESSION_MIN_SIZE", default=1024)
+    MEDIA_TYPES: List[str] = Field(
+        validation_alias="COMPRESSION_MEDIA_TYPES",
+        default=["application/json", "application/x-ndjson", "text/"],
+    )
+    GZIP_LEVEL: int = Field(validation_alias="COMPRESSION_GZIP_LEVEL", default=6)
+    ZSTD_LEVEL: int = Field(validation_alias="COMPRESSION_ZSTD_LEVEL", default=3)
+    BROTLI_QUALITY: int = Field(validation_alias="COMPRESSION_BROTLI_QUALITY", default=4)
+
+
+class MetricsSettings(BaseEnvSettings):
+    ENABLED: bool = Field(validation_alias="METRICS_ENABLED", default=True)
+    # how often in-process stats (pool, caches, password hasher) are copied into the shared collector
+    SAMPLE_INTERVAL: float = Field(validation_alias="METRICS_SAMPLE_INTERVAL", default=5)
+
+
+class AnswerSettings(BaseEnvSettings):
+    # run the workers in this process, jobs are still enqueued when disabled
+    ENABLED: bool = Field(validation_alias="ANSWER_WORKERS_ENABLED", default=True)
+    BACKEND: Literal["stub"] = Field(validation_alias="ANSWER_BACKEND", default="stub")
+    # jobs answered at once, workers wait on the backend without holding a connection
+    CONCURRENCY: int = Field(validation_alias="ANSWER_CONCURRENCY", default=32)
+    # prompts per backend call, 1 calls the backend once per prompt
+    BATCH_SIZE: int = Field(validation_alias="ANSWER_BATCH_SIZE", default=16)
+    # longest a prompt waits for its batch to fill up
+    BATCH_WAIT: float = Field(validation_alias="ANSWER_BATCH_WAIT_SECONDS", default=0.05)
+    MAX_BATCHES: int = Field(validation_alias="ANSWER_MAX_CONCURRENT_BATCHES", default=2)
+    # prompts queued or being generated before callers wait for room
+    MAX_PENDING: int = Field(validation_alias="ANSWER_MAX_PENDING", default=256)
+    # how long a claimed job belongs to its worker before others may claim it again
+    LEASE: float = Field(validation_alias="ANSWER_LEASE_SECONDS", default=300)
+    # longest sleep between looks at the queue, when nothing is due sooner
+    MAX_IDLE: float = Field(validation_alias="ANSWER_MAX_IDLE_SECONDS", default=30)
+    MAX_ATTEMPTS: int = Field(validation_alias="ANSWER_MAX_ATTEMPTS", default=5)
+    # doubled after every failed attempt
+    RETRY_DELAY: float = Field(validation_alias="ANSWER_RETRY_DELAY_SECONDS", default=30)
+    # generated answers reused for near-identical comments on the same post, 0 disables the cache
+    CACHE_TTL: float = Field(validation_alias="ANSWER_CACHE_TTL", default=86_400)
+    CACHE_MAX_SIZE: int = Field(validation_alias="ANSWER_CACHE_MAX_SIZE", default=100_000)
+    # how often each process deletes expired and evicted answers
+    CACHE_PRUNE_INTERVAL: float = Field(validation_alias="ANSWER_CACHE_PRUNE_INTERVAL_SECONDS", default=300)
+    # events a reader of the answer stream may fall behind by before it is cut off
+    STREAM_BUFFER: int = Field(validation_alias="ANSWER_STREAM_BUFFER", default=256)
+    # keeps idle streams from being closed by proxies
+    STREAM_HEARTBEAT: float = Field(validation_alias="ANSWER_STREAM_HEARTBEAT_SECONDS", default=15)
+
+
+class CommentFeedSettings(BaseEnvSettings):
+    # listen for comment changes in this process, writers notify either way
+    ENABLED: bool = Field(validation_alias="COMMENT_FEED_ENABLED", default=True)
+    # changes a watcher may fall behind by before it is told to resync
+    BUFFER: int = Field(validation_alias="COMMENT_FEED_BUFFER", default=64)
 
 
 class MainSettings(BaseEnvSettings):
@@ -76,6 +156,11 @@ class MainSettings(BaseEnvSettings):
     cors: CORSSettings
     env: EnvironmentSettings
     security: SecuritySettings
+    cache: CacheSettings
+    compression: CompressionSettings
+    metrics: MetricsSettings
+    answers: AnswerSettings
+    comment_feed: CommentFeedSettings
 
 
 @lru_cache(maxsize=1)
@@ -86,6 +171,11 @@ def create_settings() -> MainSettings:
         cors=CORSSettings(),
         env=EnvironmentSettings(),
         security=SecuritySettings(),
+        cache=CacheSettings(),
+        compression=CompressionSettings(),
+        metrics=MetricsSettings(),
+        answers=AnswerSettings(),
+        comment_feed=CommentFeedSettings(),
     )
 
 
@@ -93,6 +183,8 @@ def create_settings() -> MainSettings:
 def create_test_settings() -> MainSettings:
     postgres_db = PostgresDBSettings(
         DB_NAME="test_db",
+        DB_QUERY_BUDGET_MODE="raise",
+        DB_SLOW_QUERY_EXPLAIN=True,
     )
     return MainSettings(
         db=postgres_db,
@@ -111,4 +203,10 @@ def create_test_settings() -> MainSettings:
         security=SecuritySettings(
             SECRET_KEY="test_secret"
         ),
+        cache=CacheSettings(),
+        compression=CompressionSettings(),
+        metrics=MetricsSettings(),
+        # tests run the queue by hand
+        answers=AnswerSettings(ANSWER_WORKERS_ENABLED=False),
+        comment_feed=CommentFeedSettings(),
     )
@@ -1,5 +1,15 @@
-from .base import Database
+from .base import Database, PoolStats, StatementCounter, after_commit, count_statements
+from .notifications import NotificationListener, notify, notify_many
+from .query_log import QueryLog
 
 __all__ = [
     "Database",
+    "NotificationListener",
+    "PoolStats",
+    "QueryLog",
+    "StatementCounter",
+    "after_commit",
+    "count_statements",
+    "notify",
+    "notify_many",
 ]
@@ -1,12 +1,94 @@
-from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncGenerator, Awaitable, Callable, Iterator
 
 from core.config import PostgresDBSettings
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import AsyncAdaptedQueuePool, NullPool, event, text
+from sqlalchemy.engine import ExecutionContext
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from db.query_log import QueryLog
+
+AFTER_COMMIT = "after_commit"
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """Run ``callback`` once the unit of work owning ``session`` has committed."""
+    session.info.setdefault(AFTER_COMMIT, []).append(callback)
+
+
+class StatementCounter:
+    """Statements executed inside a ``count_statements`` block, including the tasks it spawns, and their time."""
+
+    def __init__(self, origin: str | Callable[[], str] | None = None):
+        # what ran the statements, such as a request, for the slow query log
+        self._origin = origin
+        self.count = 0
+        self.seconds = 0.0
+
+    @property
+    def origin(self) -> str | None:
+        # a callable names what is only known once statements run, such as the route a request matched
+        return self._origin() if callable(self._origin) else self._origin
+
+
+_statement_counter: ContextVar[StatementCounter | None] = ContextVar("statement_counter", default=None)
+
+
+@contextmanager
+def count_statements(origin: str | Callable[[], str] | None = None) -> Iterator[StatementCounter]:
+    counter = StatementCounter(origin)
+    token = _statement_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _statement_counter.reset(token)
+
+
+def _on_before_cursor_execute(conn, cursor, statement, parameters, context: ExecutionContext, executemany) -> None:
+    context.query_started = time.perf_counter()
+    counter = _statement_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+
+@dataclass(frozen=True, slots=False)
+class PoolStats:
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    wait_seconds: float
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """The default asyncpg pool, also adding up how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.checkouts += 1
+            self.wait_seconds += time.perf_counter() - started
 
 
 class Database:
     def __init__(self, db_settings: PostgresDBSettings):
+        self._db_settings = db_settings
         self.async_engine = create_async_engine(
             db_settings.DB_CONNECTION_URL,
             echo=db_settings.ECHO_SQL,
@@ -14,6 +96,7 @@ class Database:
             max_overflow=db_settings.MAX_OVERFLOW,
             pool_timeout=db_settings.POOL_TIMEOUT,
             pool_recycle=db_settings.POOL_RECYCLE,
+            poolclass=TimedQueuePool,
         )
         self.async_session_factory = async_sessionmaker(
             bind=self.async_engine,
@@ -21,6 +104,63 @@ class Database:
             autocommit=False,
             expire_on_commit=False,
         )
+        self.query_log = QueryLog(
+            threshold=db_settings.SLOW_QUERY_MS / 1000,
+            max_statements=db_settings.QUERY_STATS_SIZE,
+            # a connection of its own, so capturing a plan never waits for the pool it is diagnosing
+            explain_engine=create_async_engine(
+                db_settings.DB_CONNECTION_URL, poolclass=NullPool,
+            ) if db_settings.SLOW_QUERY_EXPLAIN else None,
+        )
+        event.listen(self.async_engine.sync_engine, "before_cursor_execute", _on_before_cursor_execute)
+        event.listen(self.async_engine.sync_engine, "after_cursor_execute", self._on_after_cursor_execute)
+
+    def _on_after_cursor_execute(
+            self, conn, cursor, statement, parameters, context: ExecutionContext, executemany,
+    ) -> None:
+        seconds = time.perf_counter() - context.query_started
+        counter = _statement_counter.get()
+        if counter is not None:
+            counter.seconds += seconds
+        self.query_log.record(statement, parameters, executemany, seconds, counter and counter.origin)
+
+    async def connect(self) -> None:
+        """
+        Pre-warm the connection pool.
+
+        Opens up to ``POOL_PRE_WARM`` connections concurrently and returns them to the pool,
+        so the first requests after startup do not pay the connect and auth handshake.
+        """
+        size = min(self._db_settings.POOL_PRE_WARM, self._db_settings.POOL_SIZE)
+        if size <= 0:
+            return
+        connections: list[AsyncConnection] = await asyncio.gather(
+            *(self.async_engine.connect().start() for _ in range(size))
+        )
+        try:
+            await asyncio.gather(*(connection.execute(text("SELECT 1")) for connection in connections))
+        finally:
+            await asyncio.gather(*(connection.close() for connection in connections))
+
+    @property
+    def url(self) -> str:
+        return self._db_settings.DB_CONNECTION_URL
+
+    def pool_stats(self) -> PoolStats:
+        pool: TimedQueuePool = self.async_engine.sync_engine.pool
+        return PoolStats(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            # negative while the pool still has room below pool_size
+            overflow=max(pool.overflow(), 0),
+            checkouts=pool.checkouts,
+            wait_seconds=pool.wait_seconds,
+        )
+
+    async def disconnect(self) -> None:
+        """Close every pooled connection."""
+        await self.query_log.close()
+        await self.async_engine.dispose()
 
     @asynccontextmanager
     async def get_async_session(self) -> AsyncGenerator[AsyncSession, None]:
@@ -32,3 +172,18 @@ class Database:
             raise e
         finally:
             await session.close()
+
+    @asynccontextmanager
+    async def unit_of_work(self) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Open a session that commits once on success and rolls back on error.
+
+        The session checks a connection out of the pool lazily, on its first statement,
+        so a unit of work that never touches the database never holds a connection.
+        Callbacks registered with ``after_commit`` run after a successful commit.
+        """
+        async with self.get_async_session() as session:
+            yield session
+            await session.commit()
+            for callback in session.info.pop(AFTER_COMMIT, ()):
+                await callback()
@@ -1,5 +1,7 @@
+from .answers import AnswerJobModel, GeneratedAnswerModel
 from .base import PgBaseModel
 from .posts import CommentModel, PostModel
 from .users import UserModel, UserSettingsModel
 
-__all__ = ["UserModel", "PgBaseModel", "PostModel", "CommentModel", "UserSettingsModel"]
+__all__ = ["UserModel", "PgBaseModel", "PostModel", "CommentModel", "UserSettingsModel", "AnswerJobModel",
+           "GeneratedAnswerModel"]
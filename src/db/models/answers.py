@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import sqlalchemy
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import AbstractModel
+
+
+class AnswerJobModel(AbstractModel):
+    """
+    A comment waiting for the post author's automatic answer.
+
+    ``due_at`` is when the answer is due and, once a worker claims the job, when its lease
+    expires, so a job whose worker died is claimed again. ``attempts`` fences writes: a worker
+    only completes the job if no one has claimed it since.
+    """
+    __tablename__ = "answer_jobs"
+    __table_args__ = (
+        # workers only ever look for pending jobs by due time
+        sqlalchemy.Index("ix_answer_jobs_due_at", "due_at", postgresql_where=sqlalchemy.text("failed_at IS NULL")),
+    )
+
+    comment_id: Mapped[int] = mapped_column(
+        sqlalchemy.ForeignKey("comments.id", ondelete="CASCADE"),
+        unique=True,
+        nullable=False,
+    )
+    due_at: Mapped[datetime] = mapped_column(sqlalchemy.DateTime, nullable=False)
+    attempts: Mapped[int] = mapped_column(sqlalchemy.Integer, nullable=False, default=0, server_default="0")
+    last_error: Mapped[str | None] = mapped_column(sqlalchemy.Text, nullable=True)
+    # set once attempts run out, the job is kept for inspection
+    failed_at: Mapped[datetime | None] = mapped_column(sqlalchemy.DateTime, nullable=True)
+
+
+class GeneratedAnswerModel(AbstractModel):
+    """
+    A generated answer, reused for comments that normalize to the same text on the same post.
+
+    ``key`` hashes the post, the normalized comment and the generation params. ``used_at`` orders
+    eviction once the table holds too many answers, ``created_at`` their expiry.
+    """
+    __tablename__ = "generated_answers"
+    __table_args__ = (
+        sqlalchemy.Index("ix_generated_answers_used_at", "used_at"),
+    )
+
+    key: Mapped[bytes] = mapped_column(sqlalchemy.LargeBinary, unique=True, nullable=False)
+    content: Mapped[str] = mapped_column(sqlalchemy.Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        sqlalchemy.DateTime,
+        nullable=False,
+        server_default=sqlalchemy.func.now(),
+    )
+    used_at: Mapped[datetime] = mapped_column(
+        sqlalchemy.DateTime,
+        nullable=False,
+        server_default=sqlalchemy.func.now(),
+    )
+    hits: Mapped[int] = mapped_column(sqlalchemy.Integer, nullable=False, default=0, server_default="0")
@@ -4,16 +4,23 @@ import typing
 from datetime import datetime
 
 import sqlalchemy
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column, query_expression, relationship
 
 from .base import AbstractModel
 
 if typing.TYPE_CHECKING:
     from .users import UserModel
 
+SEARCH_CONFIG = "english"
+
 
 class PostModel(AbstractModel):
     __tablename__ = "posts"
+    __table_args__ = (
+        sqlalchemy.Index("ix_posts_created_at_id", "created_at", "id"),
+        sqlalchemy.Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     title: Mapped[str] = mapped_column(sqlalchemy.String(128), nullable=False)
     content: Mapped[str] = mapped_column(sqlalchemy.Text, nullable=False)
@@ -28,13 +35,30 @@ class PostModel(AbstractModel):
         server_default=sqlalchemy.func.now(),
         server_onupdate=sqlalchemy.func.now()
     )
-    author_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("users.id"), nullable=False)
-    author: Mapped[UserModel] = relationship(back_populates="user_posts", lazy="selectin")
-    post_comments: Mapped[set[CommentModel]] = relationship(back_populates="post")
+    author_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("users.id"), nullable=False, index=True)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        sqlalchemy.Computed(
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+    # every query states what it loads, an unplanned lazy load raises instead of querying
+    author: Mapped[UserModel] = relationship(back_populates="user_posts", lazy="raise")
+    post_comments: Mapped[set[CommentModel]] = relationship(back_populates="post", lazy="raise")
+
+    # populated only by full-text search queries
+    rank: Mapped[float | None] = query_expression()
+    headline: Mapped[str | None] = query_expression()
 
 
 class CommentModel(AbstractModel):
     __tablename__ = "comments"
+    __table_args__ = (
+        sqlalchemy.Index("ix_comments_post_id_created_at_id", "post_id", "created_at", "id"),
+    )
 
     content: Mapped[str] = mapped_column(sqlalchemy.Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
@@ -49,6 +73,6 @@ class CommentModel(AbstractModel):
         server_onupdate=sqlalchemy.func.now()
     )
     post_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("posts.id"), nullable=False)
-    post: Mapped[PostModel] = relationship(back_populates="post_comments", lazy="selectin")
-    author_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("users.id"), nullable=False)
-    author: Mapped[UserModel] = relationship(back_populates="user_comments", lazy="selectin")
+    post: Mapped[PostModel] = relationship(back_populates="post_comments", lazy="raise")
+    author_id: Mapped[int] = mapped_column(sqlalchemy.ForeignKey("users.id"), nullable=False, index=True)
+    author: Mapped[UserModel] = relationship(back_populates="user_comments", lazy="raise")
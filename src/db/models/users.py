@@ -24,6 +24,12 @@ class UserModel(AbstractModel):
         nullable=False,
         default=UserRole.USER
     )
+    token_version: Mapped[int] = mapped_column(
+        sqlalchemy.Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+    )
     joined_at: Mapped[datetime] = mapped_column(
         sqlalchemy.DateTime,
         nullable=False,
@@ -35,9 +41,10 @@ class UserModel(AbstractModel):
         server_default=sqlalchemy.func.now(),
         server_onupdate=sqlalchemy.func.now()
     )
-    user_posts: Mapped[set[PostModel]] = relationship(back_populates="author")
-    user_comments: Mapped[set[CommentModel]] = relationship(back_populates="author")
-    settings: Mapped[UserSettingsModel] = relationship(back_populates="user", lazy="selectin")
+    # every query states what it loads, an unplanned lazy load raises instead of querying
+    user_posts: Mapped[set[PostModel]] = relationship(back_populates="author", lazy="raise")
+    user_comments: Mapped[set[CommentModel]] = relationship(back_populates="author", lazy="raise")
+    settings: Mapped[UserSettingsModel] = relationship(back_populates="user", lazy="raise")
 
 
 class UserSettingsModel(AbstractModel):
@@ -48,7 +55,7 @@ class UserSettingsModel(AbstractModel):
         unique=True,
         nullable=False,
     )
-    user: Mapped[UserModel] = relationship(back_populates="settings")
+    user: Mapped[UserModel] = relationship(back_populates="settings", lazy="raise")
     auto_comment_answer: Mapped[bool] = mapped_column(
         sqlalchemy.Boolean,
         nullable=False,
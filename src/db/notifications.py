@@ -0,0 +1,96 @@
+import asyncio
+import logging
+from typing import Callable, Sequence
+
+import asyncpg
+from sqlalchemy import Text, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = 30
+
+
+async def notify(session: AsyncSession, channel: str, payload: str) -> None:
+    """``NOTIFY`` listeners of ``channel`` once, and only if, the session's transaction commits."""
+    await session.execute(select(func.pg_notify(channel, payload)))
+
+
+async def notify_many(session: AsyncSession, channel: str, payloads: Sequence[str]) -> None:
+    """``notify`` every payload, in one statement whatever their number."""
+    if payloads:
+        payload = func.unnest(literal(list(payloads), ARRAY(Text))).table_valued("payload").render_derived()
+        await session.execute(select(func.pg_notify(channel, payload.c.payload)))
+
+
+class NotificationListener:
+    """
+    A connection of its own, outside the pool, ``LISTEN``ing for the life of the process.
+
+    Every component ``listen``s to its channel before ``run``, so a process holds one such
+    connection whatever it hears. ``callback`` gets the payload of every notification on its
+    channel. Notifications sent while the connection is down are lost, so every ``on_connect``
+    runs each time listening (re)starts. The connection is checked after ``keepalive`` seconds
+    without notifications, a dead one is replaced with growing delays.
+    """
+
+    def __init__(self, url: str, keepalive: float):
+        # asyncpg takes the URL without SQLAlchemy's driver suffix
+        self.dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.keepalive = keepalive
+        self.callbacks: dict[str, Callable[[str], None]] = {}
+        self.on_connect: list[Callable[[], None]] = []
+        self.connected = False
+        self.connects = 0
+
+    def listen(self, channel: str, callback: Callable[[str], None], on_connect: Callable[[], None]) -> None:
+        self.callbacks[channel] = callback
+        self.on_connect.append(on_connect)
+
+    async def run(self) -> None:
+        if not self.callbacks:
+            return
+        channels = ", ".join(self.callbacks)
+        failures = 0
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError):
+                failures += 1
+                delay = min(2 ** failures, MAX_RETRY_DELAY)
+                logger.warning("Could not connect to listen on %s, retry in %s s", channels, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            try:
+                await self._listen(connection)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, TimeoutError):
+                logger.warning("Lost the connection listening on %s", channels, exc_info=True)
+            finally:
+                self.connected = False
+                connection.terminate()
+
+    async def _listen(self, connection: asyncpg.Connection) -> None:
+        lost = asyncio.Event()
+        connection.add_termination_listener(lambda _: lost.set())
+        for channel, callback in self.callbacks.items():
+            await connection.add_listener(channel, _deliver_to(callback))
+        self.connected = True
+        self.connects += 1
+        for on_connect in self.on_connect:
+            on_connect()
+        while True:
+            try:
+                await asyncio.wait_for(lost.wait(), self.keepalive)
+            except TimeoutError:
+                # nothing heard for a while, make sure the server is still there
+                await connection.fetchval("SELECT 1", timeout=self.keepalive)
+                continue
+            logger.warning("The listening connection was closed")
+            return
+
+
+def _deliver_to(callback: Callable[[str], None]) -> Callable[[asyncpg.Connection, int, str, str], None]:
+    return lambda _connection, _pid, _channel, payload: callback(payload)
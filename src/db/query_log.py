@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import re
+import time
+from operator import attrgetter
+from typing import Any, Mapping, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# one plan per statement shows what the planner does with it, there is no need to re-run it on every slow call
+EXPLAIN_INTERVAL = 300
+EXPLAIN_TIMEOUT = "10s"
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_PLACEHOLDER = re.compile(r"\$\d+")
+_NUMBER = re.compile(r"(?<![\w$.])\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \(\?(?:::\w+)?(?:, \?(?:::\w+)?)*\)")
+_REPEATED_ROWS = re.compile(r"(\([^()]*\))(?:, \1)+")
+# writes hidden in a CTE and row locks fail in a read-only transaction, EXPLAIN ANALYZE would also run them
+_WRITES = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE|FOR (?:NO KEY )?UPDATE|FOR (?:KEY )?SHARE)\b")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Reduce ``statement`` to its shape, so executions that only differ in values aggregate together.
+
+    Literals and placeholders become ``?``, ``IN`` lists and multi-row ``VALUES`` collapse to one item.
+    """
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _SPACE.sub(" ", statement).strip()
+    statement = _IN_LIST.sub("IN (...)", statement)
+    return _REPEATED_ROWS.sub(r"\1, ...", statement)
+
+
+def is_plain_read(statement: str) -> bool:
+    """Whether normalized ``statement`` only reads, so running it again under EXPLAIN ANALYZE is harmless."""
+    return statement.startswith(("SELECT", "WITH")) and not _WRITES.search(statement)
+
+
+def parameter_shape(parameters: Sequence | Mapping | None, executemany: bool) -> str:
+    """Describe bound parameters by type only, values may be personal data."""
+    if executemany:
+        rows = list(parameters or ())
+        return f"{len(rows)} x {parameter_shape(rows[0], False)}" if rows else "[]"
+    values = (parameters.values() if isinstance(parameters, Mapping) else parameters) or ()
+    runs = []
+    for name, group in itertools.groupby(type(value).__name__ for value in values):
+        count = sum(1 for _ in group)
+        runs.append(f"{name} x {count}" if count > 1 else name)
+    return f"({', '.join(runs)})"
+
+
+class StatementStats:
+    """Totals of one normalized statement."""
+
+    def __init__(self, statement: str):
+        self.statement = statement
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.slow_calls = 0
+        self.last_slow_origin: str | None = None
+        self.plan: str | None = None
+        self.explained_at = -math.inf
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+class QueryLog:
+    """
+    Per-process timings of the statements an engine runs, aggregated by normalized SQL.
+
+    Statements slower than ``threshold`` seconds are logged with the shapes of their parameters and the
+    request that ran them. Given an ``explain_engine``, the plan of a slow ``SELECT`` is captured in the
+    background with ``EXPLAIN (ANALYZE, BUFFERS)``, in a read-only transaction that is rolled back.
+    At most ``max_statements`` statements are tracked, the cheapest one so far makes room for a new one.
+    """
+
+    def __init__(self, threshold: float, max_statements: int, explain_engine: AsyncEngine | None = None):
+        self.threshold = threshold
+        self.max_statements = max_statements
+        self.explain_engine = explain_engine
+        self._stats: dict[str, StatementStats] = {}
+        # SQLAlchemy caches compiled statements, so the same strings come back over and over
+        self._normalized: dict[str, str] = {}
+        self._explaining: asyncio.Task | None = None
+
+    def record(
+            self,
+            statement: str,
+            parameters: Any,
+            executemany: bool,
+            seconds: float,
+            origin: str | None,
+    ) -> None:
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            if len(self._normalized) >= self.max_statements * 4:
+                self._normalized.clear()
+            normalized = self._normalized[statement] = normalize_sql(statement)
+
+        stats = self._stats.get(normalized)
+        if stats is None:
+            if len(self._stats) >= self.max_statements:
+                del self._stats[min(self._stats, key=lambda key: self._stats[key].total_seconds)]
+            stats = self._stats[normalized] = StatementStats(normalized)
+        stats.calls += 1
+        stats.total_seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        if seconds < self.threshold:
+            return
+
+        stats.slow_calls += 1
+        stats.last_slow_origin = origin
+        logger.warning(
+            "Slow query, %.1f ms in %s: %s parameters %s",
+            seconds * 1000, origin or "no request", normalized, parameter_shape(parameters, executemany),
+        )
+        if self._should_explain(stats, executemany):
+            stats.explained_at = time.monotonic()
+            self._explaining = asyncio.get_running_loop().create_task(self._explain(stats, statement, parameters))
+
+    def _should_explain(self, stats: StatementStats, executemany: bool) -> bool:
+        if self.explain_engine is None or executemany or not is_plain_read(stats.statement):
+            return False
+        # one capture at a time, a slow database does not need a second copy of its slowest queries
+        if self._explaining is not None and not self._explaining.done():
+            return False
+        return time.monotonic() - stats.explained_at >= EXPLAIN_INTERVAL
+
+    async def _explain(self, stats: StatementStats, statement: str, parameters: Any) -> None:
+        try:
+            async with self.explain_engine.connect() as connection:
+                await connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+                await connection.exec_driver_sql(f"SET LOCAL statement_timeout = '{EXPLAIN_TIMEOUT}'")
+                result = await connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                stats.plan = "\n".join(row[0] for row in result)
+        except Exception:
+            logger.exception("Could not explain %s", stats.statement)
+            return
+        logger.warning("Plan of %s\n%s", stats.statement, stats.plan)
+
+    async def wait_for_explain(self) -> None:
+        if self._explaining is not None:
+            await asyncio.wait([self._explaining])
+
+    def top(self, limit: int) -> list[StatementStats]:
+        """The ``limit`` statements that took most time in total."""
+        return heapq.nlargest(limit, self._stats.values(), key=attrgetter("total_seconds"))
+
+    async def close(self) -> None:
+        if self._explaining is not None:
+            self._explaining.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._explaining
+        if self.explain_engine is not None:
+            await self.explain_engine.dispose()
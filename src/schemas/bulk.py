@@ -0,0 +1,31 @@
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+BULK_MAX_ITEMS = 1000
+
+T = TypeVar("T")
+
+
+def check_unique_ids(items: list[Any]) -> list[Any]:
+    """Reject items that name the same row twice, one statement cannot write a row twice."""
+    ids = [item.id for item in items if item.id is not None]
+    if len(ids) != len(set(ids)):
+        raise ValueError("Items must not repeat an id")
+    return items
+
+
+class BulkDeleteSchema(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class BulkItemResultSchema(BaseModel, Generic[T]):
+    index: int = Field(description="Position of the item in the request")
+    id: int | None = None
+    status: int = Field(description="HTTP status the item would have had as a single request")
+    detail: str | None = None
+    item: T | None = None
+
+
+class BulkResultSchema(BaseModel, Generic[T]):
+    results: list[BulkItemResultSchema[T]]
@@ -1,7 +1,8 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 
+from schemas.bulk import BULK_MAX_ITEMS, check_unique_ids
 from schemas.users import OutputUserSchema
 
 
@@ -16,3 +17,38 @@ class OutputCommentSchema(BaseModel):
     author_id: int
     author: OutputUserSchema
     created_at: datetime
+
+
+class BaseCommentSchema(BaseModel):
+    id: int
+    content: str
+    post_id: int
+    author_id: int
+    created_at: datetime
+
+
+class BulkCommentItemSchema(InputCommentSchema):
+    post_id: int
+    id: int | None = Field(default=None, description="Existing comment to overwrite, only when upserting")
+
+
+class BulkCreateCommentsSchema(BaseModel):
+    items: list[BulkCommentItemSchema] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+    @field_validator("items")
+    @classmethod
+    def unique_ids(cls, items: list[BulkCommentItemSchema]) -> list[BulkCommentItemSchema]:
+        return check_unique_ids(items)
+
+
+class BulkUpdateCommentItemSchema(InputCommentSchema):
+    id: int
+
+
+class BulkUpdateCommentsSchema(BaseModel):
+    items: list[BulkUpdateCommentItemSchema] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+    @field_validator("items")
+    @classmethod
+    def unique_ids(cls, items: list[BulkUpdateCommentItemSchema]) -> list[BulkUpdateCommentItemSchema]:
+        return check_unique_ids(items)
@@ -1,7 +1,8 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator
 
+from schemas.bulk import BULK_MAX_ITEMS, check_unique_ids
 from schemas.users import OutputUserSchema
 
 
@@ -26,3 +27,46 @@ class BasePostSchema(BaseModel):
 
 class PostWithAuthorSchema(BasePostSchema):
     author: OutputUserSchema
+
+
+class PostListItemSchema(PostWithAuthorSchema):
+    rank: float | None = Field(default=None, description="Search rank, set only when searching")
+    headline: str | None = Field(default=None, description="Highlighted content snippet, set only when searching")
+
+
+class PostSummarySchema(BaseModel):
+    id: int
+    title: str
+    excerpt: str = Field(description="First characters of the content")
+    created_at: datetime
+    updated_at: datetime
+    author_id: int
+    author: OutputUserSchema
+    rank: float | None = Field(default=None, description="Search rank, set only when searching")
+    headline: str | None = Field(default=None, description="Highlighted content snippet, set only when searching")
+
+
+class BulkPostItemSchema(InputPostSchema):
+    id: int | None = Field(default=None, description="Existing post to overwrite, only when upserting")
+
+
+class BulkCreatePostsSchema(BaseModel):
+    items: list[BulkPostItemSchema] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+    @field_validator("items")
+    @classmethod
+    def unique_ids(cls, items: list[BulkPostItemSchema]) -> list[BulkPostItemSchema]:
+        return check_unique_ids(items)
+
+
+class BulkUpdatePostItemSchema(UpdatePostSchema):
+    id: int
+
+
+class BulkUpdatePostsSchema(BaseModel):
+    items: list[BulkUpdatePostItemSchema] = Field(min_length=1, max_length=BULK_MAX_ITEMS)
+
+    @field_validator("items")
+    @classmethod
+    def unique_ids(cls, items: list[BulkUpdatePostItemSchema]) -> list[BulkUpdatePostItemSchema]:
+        return check_unique_ids(items)
@@ -0,0 +1,12 @@
+from pydantic import BaseModel, Field
+
+
+class QueryStatsSchema(BaseModel):
+    statement: str = Field(..., description="Normalized SQL, literals and placeholders replaced by ?")
+    calls: int = Field(..., description="Executions since the worker started")
+    total_seconds: float = Field(..., description="Time of all executions")
+    mean_seconds: float = Field(..., description="Mean time of an execution")
+    max_seconds: float = Field(..., description="Slowest execution")
+    slow_calls: int = Field(..., description="Executions over the slow query threshold")
+    last_slow_origin: str | None = Field(..., description="Request that ran the last slow execution")
+    plan: str | None = Field(..., description="EXPLAIN (ANALYZE, BUFFERS) of a slow execution, when captured")
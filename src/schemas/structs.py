@@ -0,0 +1,51 @@
+"""
+msgspec mirrors of the pydantic output schemas, used to encode trusted ORM rows in one pass.
+
+The pydantic schemas stay the source of truth for OpenAPI, so field names and order here
+must match them exactly.
+"""
+from datetime import datetime
+
+import msgspec
+
+
+class UserStruct(msgspec.Struct):
+    username: str
+    email: str
+    id: int
+
+
+class PostWithAuthorStruct(msgspec.Struct):
+    id: int
+    title: str
+    content: str
+    created_at: datetime
+    updated_at: datetime
+    author_id: int
+    author: UserStruct
+
+
+class PostListItemStruct(PostWithAuthorStruct):
+    rank: float | None = None
+    headline: str | None = None
+
+
+class PostSummaryStruct(msgspec.Struct):
+    id: int
+    title: str
+    excerpt: str
+    created_at: datetime
+    updated_at: datetime
+    author_id: int
+    author: UserStruct
+    rank: float | None = None
+    headline: str | None = None
+
+
+class CommentStruct(msgspec.Struct):
+    id: int
+    content: str
+    post_id: int
+    author_id: int
+    author: UserStruct
+    created_at: datetime
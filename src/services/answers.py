@@ -0,0 +1,522 @@
+import abc
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import random
+import re
+import secrets
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Collection, Mapping, Sequence
+
+from core.config import AnswerSettings
+from db import Database, NotificationListener, after_commit, count_statements, notify
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.cache import CacheStats
+from services.comment_feed import CommentFeed
+from services.hub import Hub, Subscription
+from services.repositories.answer_jobs import AnswerJobRepository
+from services.repositories.generated_answers import GeneratedAnswerRepository
+
+logger = logging.getLogger(__name__)
+
+# an overdue job nobody could claim is leased by another process, give it a moment to commit
+MIN_IDLE = 0.1
+
+CHANNEL = "answers"
+# payloads are "<origin>:<op><post id>:<comment id>:<answer id>", the answer id is empty once failed
+OPERATIONS = {"d": "done", "f": "failed"}
+_OPERATION_CODES = {event: code for code, event in OPERATIONS.items()}
+
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_comment(comment: str) -> str:
+    """Reduce ``comment`` to what it says, case, punctuation, spacing and compatibility forms aside."""
+    normalized = " ".join(_PUNCTUATION.sub(" ", unicodedata.normalize("NFKC", comment).casefold()).split())
+    # a comment of emoji or punctuation only is its own text
+    return normalized or comment.strip()
+
+
+@dataclass(frozen=True, slots=False)
+class AnswerPrompt:
+    post_title: str
+    comment: str
+
+
+@dataclass(frozen=True, slots=False)
+class AnswerEvent:
+    # "chunk" while the answer is streamed, then "done" once it is posted or "failed"
+    event: str
+    # the comment being answered
+    comment_id: int
+    # the next chunk, or the whole answer once done, empty when done in another process
+    text: str = ""
+    answer_id: int | None = None
+
+
+@dataclass(frozen=True, slots=False)
+class BatchStats:
+    size: int
+    # how long the oldest prompt of the batch was queued
+    wait_seconds: float
+    seconds: float
+    failed: bool
+
+
+class GenerationBackend(abc.ABC):
+    """
+    Writes the text of automatic answers, one answer per prompt and in the same order.
+
+    An answer is reused for every comment that normalizes alike on a post with the same title, so it
+    must not quote the comment word for word: it would quote another user's wording.
+    """
+
+    @abc.abstractmethod
+    async def generate_many(self, prompts: Sequence[AnswerPrompt]) -> list[str]:
+        raise NotImplementedError
+
+    async def generate(self, prompt: AnswerPrompt) -> str:
+        [answer] = await self.generate_many([prompt])
+        return answer
+
+    async def stream(self, prompt: AnswerPrompt) -> AsyncIterator[str]:
+        """The answer in chunks as they are generated, for backends that can, or in one chunk."""
+        yield await self.generate(prompt)
+
+    @property
+    def params(self) -> Mapping[str, Any]:
+        """What answers depend on besides the prompt, answers generated with other params are not reused."""
+        return {"backend": type(self).__name__}
+
+    async def close(self) -> None:
+        pass
+
+
+class StubGenerationBackend(GenerationBackend):
+    """Answers derived from the prompt alone, for development and tests."""
+
+    async def generate_many(self, prompts: Sequence[AnswerPrompt]) -> list[str]:
+        return [self._answer(prompt) for prompt in prompts]
+
+    async def stream(self, prompt: AnswerPrompt) -> AsyncIterator[str]:
+        for word in re.findall(r"\S+\s*", self._answer(prompt)):
+            await asyncio.sleep(0)
+            yield word
+
+    @staticmethod
+    def _answer(prompt: AnswerPrompt) -> str:
+        words = len(normalize_comment(prompt.comment).split())
+        return f'Thank you for your {words}-word comment on "{prompt.post_title}"'
+
+
+class BatchingBackend(GenerationBackend):
+    """
+    Groups the prompts of concurrent ``generate`` calls into ``generate_many`` calls of ``backend``.
+
+    A batch goes out once ``max_batch_size`` prompts are queued or its oldest prompt has waited
+    ``max_wait`` seconds. At most ``max_concurrent_batches`` run at once, prompts queue up behind
+    them and make the next batches fuller. A prompt already queued or being generated is not sent
+    again, its callers share the answer. Past ``max_pending`` distinct prompts, callers wait for
+    room. ``on_batch`` receives the stats of every batch.
+    """
+
+    def __init__(
+            self,
+            backend: GenerationBackend,
+            max_batch_size: int,
+            max_wait: float,
+            max_concurrent_batches: int,
+            max_pending: int,
+            on_batch: Callable[[BatchStats], None] | None = None,
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.on_batch = on_batch
+        self.coalesced = 0
+        self._room = asyncio.Semaphore(max_pending)
+        self._batch_slots = asyncio.Semaphore(max_concurrent_batches)
+        # every prompt queued or in a batch, by prompt
+        self._answers: dict[AnswerPrompt, asyncio.Future[str]] = {}
+        self._queue: dict[AnswerPrompt, float] = {}
+        self._queued = asyncio.Event()
+        self._dispatcher: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._answers)
+
+    def stream(self, prompt: AnswerPrompt) -> AsyncIterator[str]:
+        # a reader waits for every chunk, a streamed prompt does not wait for a batch
+        return self.backend.stream(prompt)
+
+    @property
+    def params(self) -> Mapping[str, Any]:
+        return self.backend.params
+
+    async def generate_many(self, prompts: Sequence[AnswerPrompt]) -> list[str]:
+        return list(await asyncio.gather(*(self.generate(prompt) for prompt in prompts)))
+
+    async def generate(self, prompt: AnswerPrompt) -> str:
+        if prompt in self._answers:
+            self.coalesced += 1
+            return await asyncio.shield(self._answers[prompt])
+        async with self._room:
+            answer = self._answers.get(prompt)
+            if answer is None:
+                answer = self._answers[prompt] = asyncio.get_running_loop().create_future()
+                self._queue[prompt] = time.perf_counter()
+                self._queued.set()
+                if self._dispatcher is None:
+                    self._dispatcher = asyncio.create_task(self._dispatch())
+            else:
+                self.coalesced += 1
+            # a cancelled caller must not cancel the answer other callers share
+            return await asyncio.shield(answer)
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._queue:
+                self._queued.clear()
+                await self._queued.wait()
+            deadline = next(iter(self._queue.values())) + self.max_wait
+            while len(self._queue) < self.max_batch_size and (remaining := deadline - time.perf_counter()) > 0:
+                self._queued.clear()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._queued.wait(), remaining)
+            await self._batch_slots.acquire()
+            prompts = list(itertools.islice(self._queue, self.max_batch_size))
+            wait_seconds = time.perf_counter() - self._queue[prompts[0]]
+            for prompt in prompts:
+                del self._queue[prompt]
+            batch = asyncio.create_task(self._generate_batch(prompts, wait_seconds))
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+
+    async def _generate_batch(self, prompts: list[AnswerPrompt], wait_seconds: float) -> None:
+        started = time.perf_counter()
+        failed = False
+        try:
+            answers = await self.backend.generate_many(prompts)
+            if len(answers) != len(prompts):
+                raise ValueError(f"{len(answers)} answers to {len(prompts)} prompts")
+        except Exception as e:
+            logger.exception("Generation of a batch of %s prompts failed", len(prompts))
+            failed = True
+            for prompt in prompts:
+                self._answers.pop(prompt).set_exception(e)
+        else:
+            for prompt, answer in zip(prompts, answers):
+                self._answers.pop(prompt).set_result(answer)
+        finally:
+            self._batch_slots.release()
+        if self.on_batch is not None:
+            self.on_batch(BatchStats(
+                size=len(prompts), wait_seconds=wait_seconds, seconds=time.perf_counter() - started, failed=failed,
+            ))
+
+    async def close(self) -> None:
+        for task in (self._dispatcher, *self._batches):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(task for task in (self._dispatcher, *self._batches) if task), return_exceptions=True)
+        for answer in self._answers.values():
+            answer.cancel()
+        await self.backend.close()
+
+
+BACKENDS: dict[str, type[GenerationBackend]] = {
+    "stub": StubGenerationBackend,
+}
+
+
+def create_backend(
+        settings: AnswerSettings,
+        on_batch: Callable[[BatchStats], None] | None = None,
+) -> GenerationBackend:
+    backend = BACKENDS[settings.BACKEND]()
+    if settings.BATCH_SIZE <= 1:
+        return backend
+    return BatchingBackend(
+        backend,
+        max_batch_size=settings.BATCH_SIZE,
+        max_wait=settings.BATCH_WAIT,
+        max_concurrent_batches=settings.MAX_BATCHES,
+        max_pending=settings.MAX_PENDING,
+        on_batch=on_batch,
+    )
+
+
+class AnswerCache:
+    """
+    Generated answers shared by all processes through the ``generated_answers`` table.
+
+    Answers are keyed by a hash of the post, its title, the normalized comment and the backend params,
+    so "Great post!" and "great post" on the same post are generated once, and again once the post is
+    renamed. An answer expires ``ttl``
+    seconds after it was generated, the least recently used ones go once there are more than
+    ``max_size``. ``hits`` and ``misses`` count this process' lookups, ``size`` is the table size
+    when this process last pruned it.
+    """
+
+    def __init__(self, params: Mapping[str, Any], ttl: float, max_size: int):
+        self.params = params
+        self.ttl = ttl
+        self.max_size = max_size
+        self.repository = GeneratedAnswerRepository()
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=self.size)
+
+    def key(self, post_id: int, prompt: AnswerPrompt) -> bytes:
+        # everything the answer may depend on
+        material = json.dumps(
+            [post_id, prompt.post_title, normalize_comment(prompt.comment), self.params], sort_keys=True,
+        )
+        return hashlib.sha256(material.encode()).digest()
+
+    async def lookup(self, session: AsyncSession, keys: Collection[bytes]) -> dict[bytes, str]:
+        if not self.enabled or not keys:
+            return {}
+        return await self.repository.lookup(session, set(keys), self.ttl)
+
+    async def store(self, session: AsyncSession, key: bytes, content: str) -> None:
+        if self.enabled:
+            await self.repository.store(session, key, content)
+
+    async def prune(self, session: AsyncSession) -> None:
+        if self.enabled:
+            self.size = await self.repository.prune(session, self.ttl, self.max_size)
+
+
+class AnswerPipeline:
+    """
+    Posts the automatic answers post authors opted in to, ``auto_answer_delay`` after each comment.
+
+    Jobs are rows of ``answer_jobs``, queued in the transaction creating the comment, so they
+    survive restarts. A single loop per process claims due jobs for up to ``CONCURRENCY`` workers,
+    then sleeps until the next job is due, at most ``MAX_IDLE``, or until a comment created in
+    this process or a finished worker wakes it. Thousands of pending jobs cost one indexed
+    query per wake-up, not a query per worker per tick. Answers are generated outside any
+    transaction, a worker holds no connection while the backend runs. Answers are looked up in
+    ``cache`` with the claim, and jobs that share a key wait for a single generation.
+
+    Answers to the comments of a post are published to ``hub`` under the post id as
+    ``AnswerEvent``. When the post has subscribers in this process, its answers are streamed and
+    every chunk is published, the answer is still written once, when it is complete. Other
+    processes are notified on ``CHANNEL`` once the answer is committed, or the attempt failed,
+    and publish ``done`` without the text, or ``failed``, to their own subscribers through
+    ``listener``: their readers fetch the answer instead of waiting for chunks that never come.
+    """
+
+    def __init__(
+            self,
+            db: Database,
+            backend: GenerationBackend,
+            settings: AnswerSettings,
+            listener: NotificationListener | None = None,
+    ):
+        self.db = db
+        self.backend = backend
+        self.settings = settings
+        self.repository = AnswerJobRepository()
+        self.cache = AnswerCache(backend.params, settings.CACHE_TTL, settings.CACHE_MAX_SIZE)
+        self.completed = 0
+        self.failed = 0
+        self._running: set[asyncio.Task] = set()
+        self._generating: dict[bytes, asyncio.Future[str]] = {}
+        self.hub: Hub[int, AnswerEvent] = Hub()
+        # chunks streamed so far, by post and comment answered, for readers who subscribe midway
+        self._streamed: dict[int, dict[int, list[str]]] = {}
+        self._wakeup = asyncio.Event()
+        self._next_prune = 0.0
+        # tells the notifications of this process from those of others
+        self.origin = secrets.token_hex(4)
+        if listener is not None:
+            listener.listen(CHANNEL, self._relayed, on_connect=self.hub.cut_off)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def subscribe(self, post_id: int) -> Subscription[AnswerEvent]:
+        """Follow the answers to the comments of the post, starting with those being streamed so far."""
+        subscription = self.hub.subscribe(post_id, self.settings.STREAM_BUFFER)
+        for comment_id, chunks in self._streamed.get(post_id, {}).items():
+            subscription.deliver(AnswerEvent("chunk", comment_id, "".join(chunks)))
+        return subscription
+
+    async def enqueue(self, session: AsyncSession, comment_ids: Collection[int]) -> None:
+        """Queue answers to the new comments that need one, with the session's unit of work."""
+        if comment_ids and await self.repository.enqueue(session, comment_ids):
+            after_commit(session, self.wake)
+
+    async def wake(self) -> None:
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        # names the pipeline in the slow query log
+        with count_statements("answer pipeline"):
+            while True:
+                self._wakeup.clear()
+                if self.cache.enabled and time.monotonic() >= self._next_prune:
+                    await self.prune_cache()
+                try:
+                    claimed = await self.run_once()
+                    if claimed and self.in_flight < self.settings.CONCURRENCY:
+                        continue
+                    timeout = None if self.in_flight >= self.settings.CONCURRENCY else await self._idle_timeout()
+                except Exception:
+                    logger.exception("Could not read the answer queue")
+                    timeout = self.settings.MAX_IDLE
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+
+    async def run_once(self) -> int:
+        """Claim due jobs for the free workers and start answering them, return how many were claimed."""
+        free = self.settings.CONCURRENCY - self.in_flight
+        if free <= 0:
+            return 0
+        async with self.db.unit_of_work() as session:
+            jobs = await self.repository.claim(session, free, self.settings.LEASE)
+            keys = [
+                self.cache.key(job.post_id, AnswerPrompt(post_title=job.title, comment=job.content)) for job in jobs
+            ]
+            cached = await self.cache.lookup(session, keys)
+        for job, key in zip(jobs, keys):
+            task = asyncio.create_task(self._answer(job, key, cached.get(key)))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+        return len(jobs)
+
+    async def drain(self) -> None:
+        """Wait for the answers being written."""
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def close(self) -> None:
+        # interrupted jobs are claimed again once their lease expires
+        for task in self._running:
+            task.cancel()
+        await self.drain()
+        for generating in self._generating.values():
+            generating.cancel()
+        await asyncio.gather(*self._generating.values(), return_exceptions=True)
+        await self.backend.close()
+
+    async def prune_cache(self) -> None:
+        self._next_prune = time.monotonic() + self.settings.CACHE_PRUNE_INTERVAL
+        try:
+            async with self.db.unit_of_work() as session:
+                await self.cache.prune(session)
+        except Exception:
+            logger.exception("Could not prune the answer cache")
+
+    async def _notify(self, session: AsyncSession, event: str, job: Row, answer_id: int | None = None) -> None:
+        payload = f"{self.origin}:{_OPERATION_CODES[event]}{job.post_id}:{job.comment_id}:{answer_id or ''}"
+        await notify(session, CHANNEL, payload)
+
+    def _relayed(self, payload: str) -> None:
+        origin, _, notice = payload.partition(":")
+        if origin == self.origin:
+            # published here already, with the text
+            return
+        try:
+            post_id, comment_id, answer_id = notice[1:].split(":")
+            event = AnswerEvent(OPERATIONS[notice[0]], int(comment_id), answer_id=int(answer_id) if answer_id else None)
+            post_id = int(post_id)
+        except (KeyError, IndexError, ValueError):
+            logger.warning("Ignoring malformed answer notification %r", payload)
+            return
+        if self.hub.subscribers(post_id):
+            self.hub.publish(post_id, event)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        self._wakeup.set()
+
+    async def _idle_timeout(self) -> float:
+        async with self.db.unit_of_work() as session:
+            due_in = await self.repository.seconds_until_due(session)
+        if due_in is None or due_in > self.settings.MAX_IDLE:
+            # processes started together drift apart instead of polling in lockstep
+            return self.settings.MAX_IDLE * random.uniform(0.9, 1.0)
+        return max(due_in, MIN_IDLE)
+
+    async def _produce(self, job: Row, prompt: AnswerPrompt) -> str:
+        if not self.hub.subscribers(job.post_id):
+            return await self.backend.generate(prompt)
+        chunks = self._streamed.setdefault(job.post_id, {}).setdefault(job.comment_id, [])
+        try:
+            async for chunk in self.backend.stream(prompt):
+                chunks.append(chunk)
+                self.hub.publish(job.post_id, AnswerEvent("chunk", job.comment_id, chunk))
+        finally:
+            streamed = self._streamed[job.post_id]
+            del streamed[job.comment_id]
+            if not streamed:
+                del self._streamed[job.post_id]
+        return "".join(chunks)
+
+    async def _generate(self, job: Row, key: bytes) -> tuple[str, bool]:
+        """Generate the answer, or wait for the one being generated under ``key``, and say whether it is new."""
+        prompt = AnswerPrompt(post_title=job.title, comment=job.content)
+        if not self.cache.enabled:
+            return await self._produce(job, prompt), False
+        generating = self._generating.get(key)
+        if generating is not None:
+            self.cache.hits += 1
+            return await asyncio.shield(generating), False
+        self.cache.misses += 1
+        generating = self._generating[key] = asyncio.ensure_future(self._produce(job, prompt))
+        generating.add_done_callback(lambda _: self._generating.pop(key))
+        return await asyncio.shield(generating), True
+
+    async def _answer(self, job: Row, key: bytes, cached: str | None) -> None:
+        try:
+            if cached is None:
+                content, generated = await self._generate(job, key)
+            else:
+                self.cache.hits += 1
+                content, generated = cached, False
+            async with self.db.unit_of_work() as session:
+                answer = {"content": content, "post_id": job.post_id, "author_id": job.author_id}
+                answer_id = await self.repository.complete(session, job.id, job.attempts, answer)
+                if answer_id is None:
+                    logger.warning("Answer job %s was claimed again before it completed", job.id)
+                    return
+                if generated:
+                    await self.cache.store(session, key, content)
+                await self._notify(session, "done", job, answer_id)
+                # the answer is a comment like any other to those watching the post
+                await CommentFeed.notify(session, "created", job.post_id, answer_id)
+            self.completed += 1
+            self.hub.publish(job.post_id, AnswerEvent("done", job.comment_id, content, answer_id))
+        except Exception as e:
+            self.failed += 1
+            self.hub.publish(job.post_id, AnswerEvent("failed", job.comment_id))
+            retry_in = None
+            if job.attempts < self.settings.MAX_ATTEMPTS:
+                retry_in = self.settings.RETRY_DELAY * 2 ** (job.attempts - 1)
+            logger.exception("Answer job %s failed, attempt %s, retry in %s s", job.id, job.attempts, retry_in)
+            try:
+                async with self.db.unit_of_work() as session:
+                    await self.repository.fail(session, job.id, job.attempts, repr(e), retry_in)
+                    await self._notify(session, "failed", job)
+            except Exception:
+                logger.exception("Could not record the failure of answer job %s, its lease will expire", job.id)
@@ -0,0 +1,112 @@
+from typing import Any, List, NamedTuple, Sequence
+
+from sqlalchemy import ColumnElement, true
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.errors import (
+    AbstractError,
+    InvalidItemError,
+    PermissionDeniedError,
+    ResourceNotFoundError,
+)
+from services.repositories.base import PgRepositoryMixin
+
+
+class BulkItemResult(NamedTuple):
+    index: int
+    id: int | None
+    status: int
+    detail: str | None = None
+    item: Any = None
+
+    @classmethod
+    def failed(cls, index: int, obj_id: int | None, error: AbstractError) -> "BulkItemResult":
+        return cls(index=index, id=obj_id, status=error.status_code, detail=error.detail)
+
+
+def _missing_or_denied(
+        repository: PgRepositoryMixin,
+        obj_id: int,
+        writable: dict[int, bool],
+) -> AbstractError | None:
+    if obj_id not in writable:
+        return ResourceNotFoundError(detail=f"{repository.model.__name__} with id {obj_id} not found")
+    if not writable[obj_id]:
+        return PermissionDeniedError()
+    return None
+
+
+async def bulk_create(
+        session: AsyncSession,
+        repository: PgRepositoryMixin,
+        rows: List[dict[str, Any]],
+        upsert_columns: Sequence[str] = (),
+        where: ColumnElement[bool] = true(),
+) -> List[BulkItemResult]:
+    """
+    Create ``rows`` in one multi-row insert and report a result per row.
+
+    Rows carrying an ``id`` are upserts, accepted only with ``upsert_columns`` and only for
+    existing rows ``where`` allows writing. Rows that fail those checks or reference a missing
+    parent are reported and left out, everything else is written in the same transaction.
+    """
+    errors: dict[int, AbstractError] = {}
+    upserts = {index: row["id"] for index, row in enumerate(rows) if row.get("id") is not None}
+    if upserts and not upsert_columns:
+        errors.update({index: InvalidItemError(detail="id is accepted only when upserting") for index in upserts})
+    elif upserts:
+        writable = await repository.lock_writable(session, set(upserts.values()), where)
+        for index, obj_id in upserts.items():
+            if error := _missing_or_denied(repository, obj_id, writable):
+                errors[index] = error
+    errors.update(await repository.check_references(session, rows))
+
+    indexes = [index for index in range(len(rows)) if index not in errors]
+    created = await repository.create_bulk(session, [rows[index] for index in indexes], upsert_columns)
+    results = [BulkItemResult.failed(index, rows[index].get("id"), error) for index, error in errors.items()]
+    results.extend(
+        BulkItemResult(index=index, id=item.id, status=200 if index in upserts else 201, item=item)
+        for index, item in zip(indexes, created)
+    )
+    return sorted(results, key=lambda result: result.index)
+
+
+async def bulk_update(
+        session: AsyncSession,
+        repository: PgRepositoryMixin,
+        rows: List[dict[str, Any]],
+        columns: Sequence[str],
+        where: ColumnElement[bool],
+) -> List[BulkItemResult]:
+    """Update ``rows`` by primary key in one executemany, skipping and reporting rows ``where`` rejects."""
+    writable = await repository.lock_writable(session, {row["id"] for row in rows}, where)
+    results, allowed = [], []
+    for index, row in enumerate(rows):
+        if error := _missing_or_denied(repository, row["id"], writable):
+            results.append(BulkItemResult.failed(index, row["id"], error))
+        else:
+            allowed.append(row)
+            results.append(BulkItemResult(index=index, id=row["id"], status=200))
+    await repository.update_bulk(session, allowed, columns)
+    return results
+
+
+async def bulk_delete(
+        session: AsyncSession,
+        repository: PgRepositoryMixin,
+        obj_ids: List[int],
+        where: ColumnElement[bool],
+) -> List[BulkItemResult]:
+    """Delete ``obj_ids`` in one statement, reporting ids that are missing, ``where`` rejects or still referenced."""
+    kept = await repository.delete_bulk(session, obj_ids, where)
+    results = []
+    for index, obj_id in enumerate(obj_ids):
+        if obj_id not in kept:
+            error = ResourceNotFoundError(detail=f"{repository.model.__name__} with id {obj_id} not found")
+        else:
+            error = kept[obj_id]
+        if error is None:
+            results.append(BulkItemResult(index=index, id=obj_id, status=204))
+        else:
+            results.append(BulkItemResult.failed(index, obj_id, error))
+    return results
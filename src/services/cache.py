@@ -0,0 +1,287 @@
+import abc
+import asyncio
+import itertools
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Collection,
+    Coroutine,
+    Generic,
+    Hashable,
+    Type,
+    TypeVar,
+)
+
+import msgspec
+from db import NotificationListener, notify_many
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+S = TypeVar("S", bound=msgspec.Struct)
+
+CHANNEL = "cache"
+# payloads are "<origin>:<generation>:<key>,<key>...", keys of a large write go in several
+KEYS_PER_NOTIFICATION = 200
+
+
+@dataclass(frozen=True, slots=False)
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class TTLCache(Generic[K, V]):
+    """
+    In-process LRU cache with a per-entry time to live.
+
+    Meant to be used from a single event loop thread, so it does no locking.
+    Expired entries are dropped lazily on access, and the least recently used
+    entry is evicted once ``max_size`` is reached.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        if self.max_size <= 0:
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def delete(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=len(self._data))
+
+
+class ObjectCacheBackend(abc.ABC):
+    """
+    Storage behind ``ObjectCache``.
+
+    Values are already encoded, so an external store such as Redis or memcached only has
+    to move bytes and apply its own expiry. Generations are counters that must survive
+    eviction, an external store would keep them with ``INCR``.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete(self, keys: Collection[str]) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def generation(self, name: str) -> int:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def bump(self, name: str) -> int:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        """Drop every entry and bump every generation, once invalidations may have been missed. Shared stores missed none."""
+
+    def __len__(self) -> int:
+        # stores that cannot count their entries cheaply report none
+        return 0
+
+
+class InProcessCacheBackend(ObjectCacheBackend):
+    """Per-process ``ObjectCacheBackend`` on top of ``TTLCache``, a ``max_size`` of 0 disables it."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache: TTLCache[str, bytes] = TTLCache(max_size=max_size, ttl=ttl)
+        self._generations: dict[str, int] = {}
+        # added to every generation, so entries derived from what was cleared are orphaned too
+        self._clears = 0
+
+    async def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    async def set(self, key: str, value: bytes) -> None:
+        self._cache.set(key, value)
+
+    async def delete(self, keys: Collection[str]) -> None:
+        for key in keys:
+            self._cache.delete(key)
+
+    async def generation(self, name: str) -> int:
+        return self._clears + self._generations.get(name, 0)
+
+    async def bump(self, name: str) -> int:
+        self._generations[name] = self._generations.get(name, 0) + 1
+        return await self.generation(name)
+
+    async def clear(self) -> None:
+        self._cache.clear()
+        self._clears += 1
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class ObjectCache:
+    """
+    Read-through cache of immutable object snapshots, encoded with msgpack.
+
+    Concurrent misses on one key share a single load. A key invalidated while it is being
+    loaded is not stored, so the load cannot put back the value the write replaced.
+    Derived entries, such as list pages, put a ``generation`` in their key instead, and
+    are orphaned all at once when it is bumped.
+
+    Writers also ``broadcast`` their invalidations on ``CHANNEL`` in their transaction, and
+    caches that ``listen`` apply those of other processes as they commit. While the listening
+    connection is down they are missed, so the backend is cleared every time listening starts.
+    """
+
+    def __init__(self, backend: ObjectCacheBackend):
+        self.backend = backend
+        self._encoder = msgspec.msgpack.Encoder()
+        self._loading: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        # tells the invalidations of this process from those of others
+        self.origin = secrets.token_hex(4)
+        self._relaying: set[asyncio.Task] = set()
+
+    async def get_or_load(self, key: str, struct: Type[S], loader: Callable[[], Awaitable[S]]) -> S:
+        while True:
+            cached = await self.backend.get(key)
+            if cached is not None:
+                self.hits += 1
+                return msgspec.msgpack.decode(cached, type=struct)
+            future = self._loading.get(key)
+            if future is None:
+                break
+            try:
+                value = await asyncio.shield(future)
+                self.hits += 1
+                return value
+            except asyncio.CancelledError:
+                # only retry when the loading request was cancelled, not this one
+                if not future.cancelled():
+                    raise
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+            if self._loading.get(key) is future:
+                await self.backend.set(key, self._encoder.encode(value))
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # waiters re-raise it, nobody else has to retrieve it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    async def set(self, key: str, value: msgspec.Struct) -> None:
+        """Replace the value stored under ``key``, such as one extended after it was loaded."""
+        await self.backend.set(key, self._encoder.encode(value))
+
+    async def invalidate(self, keys: Collection[str], generation: str | None = None) -> None:
+        """Drop ``keys`` and bump ``generation`` when given."""
+        for key in keys:
+            self._loading.pop(key, None)
+        if keys:
+            await self.backend.delete(keys)
+        if generation is not None:
+            await self.backend.bump(generation)
+
+    async def generation(self, name: str) -> int:
+        return await self.backend.generation(name)
+
+    async def broadcast(self, session: AsyncSession, keys: Collection[str], generation: str | None = None) -> None:
+        """Have the caches of other processes ``invalidate`` too, once the session's transaction commits."""
+        keys = list(keys)
+        chunks = [keys[start:start + KEYS_PER_NOTIFICATION] for start in range(0, len(keys), KEYS_PER_NOTIFICATION)]
+        # the generation is bumped once, with the first chunk
+        generations = itertools.chain([generation or ""], itertools.repeat(""))
+        await notify_many(session, CHANNEL, [
+            f"{self.origin}:{name}:{','.join(chunk)}" for name, chunk in zip(generations, chunks or [[]])
+        ])
+
+    def listen(self, listener: NotificationListener) -> None:
+        listener.listen(CHANNEL, self._relayed, on_connect=lambda: self._relay(self._clear()))
+
+    async def _clear(self) -> None:
+        self._loading.clear()
+        await self.backend.clear()
+
+    def _relayed(self, payload: str) -> None:
+        origin, _, rest = payload.partition(":")
+        if origin == self.origin:
+            # invalidated here already
+            return
+        generation, _, keys = rest.partition(":")
+        self._relay(self.invalidate(keys.split(",") if keys else [], generation or None))
+
+    def _relay(self, invalidation: Coroutine) -> None:
+        task = asyncio.create_task(invalidation)
+        self._relaying.add(task)
+        task.add_done_callback(self._relayed_done)
+
+    def _relayed_done(self, task: asyncio.Task) -> None:
+        self._relaying.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Could not apply a cache invalidation", exc_info=task.exception())
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(hits=self.hits, misses=self.misses, size=len(self.backend))
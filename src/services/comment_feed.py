@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable
+
+import msgspec
+from core.config import CommentFeedSettings
+from db import Database, NotificationListener, count_statements, notify, notify_many
+from schemas.structs import CommentStruct
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.hub import Hub, Subscription
+from services.repositories.comments import CommentRepository
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "comments"
+# payloads are "<op><post id>:<comment id>", a few bytes whatever the comment
+OPERATIONS = {"c": "created", "u": "updated", "d": "deleted"}
+_OPERATION_CODES = {event: code for code, event in OPERATIONS.items()}
+
+
+@dataclass(frozen=True, slots=False)
+class CommentFeedEvent:
+    # "created", "updated" or "deleted"
+    event: str
+    post_id: int
+    comment_id: int
+    # as listed by GET /comments/{post_id}, none once deleted
+    comment: CommentStruct | None = None
+
+
+class CommentFeed:
+    """
+    Comment changes made by any process, fanned out to the watchers of each post in this one.
+
+    Writers ``notify`` in their transaction, so only committed changes are heard. A single
+    ``LISTEN`` connection per process hears them all: changes to posts nobody here watches are
+    dropped on arrival, the others are loaded in one query per burst and published to ``hub``
+    under the post id. Watchers that fall ``BUFFER`` changes behind are cut off, and so is
+    everyone when the connection is lost, since changes were missed meanwhile. ``listener`` is
+    shared with the other listeners of the process and run on its own.
+    """
+
+    def __init__(self, db: Database, settings: CommentFeedSettings, listener: NotificationListener):
+        self.db = db
+        self.settings = settings
+        self.repository = CommentRepository()
+        self.hub: Hub[int, CommentFeedEvent] = Hub()
+        self.listener = listener
+        if settings.ENABLED:
+            listener.listen(CHANNEL, self._received, on_connect=self.hub.cut_off)
+        self.received = 0
+        self._pending: list[tuple[str, int, int]] = []
+        self._ready = asyncio.Event()
+
+    @staticmethod
+    async def notify(session: AsyncSession, event: str, post_id: int, comment_id: int) -> None:
+        await notify(session, CHANNEL, f"{_OPERATION_CODES[event]}{post_id}:{comment_id}")
+
+    @staticmethod
+    async def notify_many(session: AsyncSession, changes: Iterable[tuple[str, int, int]]) -> None:
+        """``notify`` the ``(event, post id, comment id)`` changes of a bulk write, in one statement."""
+        await notify_many(
+            session, CHANNEL, [f"{_OPERATION_CODES[event]}{post_id}:{comment_id}" for event, post_id, comment_id in changes],
+        )
+
+    def subscribe(self, post_id: int) -> Subscription[CommentFeedEvent]:
+        return self.hub.subscribe(post_id, self.settings.BUFFER)
+
+    def _received(self, payload: str) -> None:
+        self.received += 1
+        try:
+            post_id, _, comment_id = payload[1:].partition(":")
+            change = (OPERATIONS[payload[0]], int(post_id), int(comment_id))
+        except (KeyError, IndexError, ValueError):
+            logger.warning("Ignoring malformed comment notification %r", payload)
+            return
+        if self.hub.subscribers(change[1]):
+            self._pending.append(change)
+            self._ready.set()
+
+    async def run(self) -> None:
+        # names the feed in the slow query log
+        with count_statements("comment feed"):
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                changes, self._pending = self._pending, []
+                try:
+                    await self._publish(changes)
+                except Exception:
+                    logger.exception("Could not load %s changed comments", len(changes))
+                    for post_id in {post_id for _, post_id, _ in changes}:
+                        self.hub.cut_off(post_id)
+
+    async def _publish(self, changes: list[tuple[str, int, int]]) -> None:
+        loaded = {comment_id for event, _, comment_id in changes if event != "deleted"}
+        comments = {}
+        if loaded:
+            async with self.db.get_async_session() as session:
+                found = await self.repository.get_many_with_author(session, loaded)
+            comments = {comment.id: comment for comment in found}
+        for event, post_id, comment_id in changes:
+            comment = None if event == "deleted" else comments.get(comment_id)
+            if event != "deleted" and comment is None:
+                # deleted since, its own notification follows
+                continue
+            struct = None if comment is None else msgspec.convert(comment, CommentStruct, from_attributes=True)
+            self.hub.publish(post_id, CommentFeedEvent(event, post_id, comment_id, struct))
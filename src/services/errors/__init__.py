@@ -1,7 +1,12 @@
 from .base import (
     AbstractError,
     DuplicateResourceError,
+    InvalidCursorError,
+    InvalidItemError,
+    InvalidOrderingError,
+    ResourceInUseError,
     ResourceNotFoundError,
+    ServiceUnavailableError,
     global_exception_handler,
 )
 from .oauth import InvalidCredentialsError, PermissionDeniedError
@@ -12,5 +17,10 @@ __all__ = [
     "ResourceNotFoundError",
     "InvalidCredentialsError",
     "PermissionDeniedError",
-    "DuplicateResourceError"
+    "DuplicateResourceError",
+    "InvalidCursorError",
+    "ServiceUnavailableError",
+    "InvalidItemError",
+    "InvalidOrderingError",
+    "ResourceInUseError",
 ]
@@ -46,6 +46,46 @@ class DuplicateResourceError(AbstractError):
         super().__init__(detail=detail)
 
 
+class ServiceUnavailableError(AbstractError):
+    error = "Service Unavailable"
+    status_code = 503
+
+    def __init__(self, *, detail: str | None = None, headers: dict[str, str] | None = None) -> None:
+        super().__init__(detail=detail, headers=headers)
+
+
+class InvalidCursorError(AbstractError):
+    error = "Invalid Cursor"
+    status_code = 400
+
+    def __init__(self, *, detail: str | None = None) -> None:
+        super().__init__(detail=detail)
+
+
+class InvalidOrderingError(AbstractError):
+    error = "Invalid Ordering"
+    status_code = 400
+
+    def __init__(self, *, detail: str | None = None) -> None:
+        super().__init__(detail=detail)
+
+
+class InvalidItemError(AbstractError):
+    error = "Invalid Item"
+    status_code = 422
+
+    def __init__(self, *, detail: str | None = None) -> None:
+        super().__init__(detail=detail)
+
+
+class ResourceInUseError(AbstractError):
+    error = "Resource In Use"
+    status_code = 409
+
+    def __init__(self, *, detail: str | None = None) -> None:
+        super().__init__(detail=detail)
+
+
 async def global_exception_handler(request: Request, exc: AbstractError) -> JSONResponse:
     return JSONResponse(
         status_code=exc.status_code,
@@ -54,4 +94,5 @@ async def global_exception_handler(request: Request, exc: AbstractError) -> JSON
             detail=exc.detail,
             status_code=exc.status_code,
         ).model_dump(),
+        headers=exc.headers,
     )
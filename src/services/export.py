@@ -0,0 +1,40 @@
+import asyncio
+import zlib
+from typing import AsyncIterable, AsyncIterator
+
+import msgspec
+from schemas.structs import PostWithAuthorStruct
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.filters import PostFilter
+from services.repositories.posts import PostRepository
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EXPORT_BATCH_SIZE = 1000
+
+
+async def export_posts_ndjson(
+        session: AsyncSession,
+        filters: PostFilter,
+        batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """Yield posts with their authors as NDJSON, one chunk of ``batch_size`` lines at a time."""
+    encoder = msgspec.json.Encoder()
+    async for posts in PostRepository().stream_posts_with_author(session, filters, batch_size):
+        yield encoder.encode_lines(msgspec.convert(posts, list[PostWithAuthorStruct], from_attributes=True))
+
+
+async def gzip_stream(chunks: AsyncIterable[bytes], level: int = 1) -> AsyncIterator[bytes]:
+    """
+    Compress ``chunks`` into a single gzip member without buffering the whole payload.
+
+    Level 1 is the default, exports are large and it is several times faster than level 6
+    for a slightly bigger file.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        # zlib releases the GIL, so a thread keeps large chunks off the event loop
+        compressed = await asyncio.to_thread(compressor.compress, chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
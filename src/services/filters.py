@@ -1,10 +1,15 @@
 from dataclasses import dataclass
 from typing import NamedTuple
 
-Pagination = NamedTuple("Pagination", [("limit", int), ("offset", int)])
+
+class Pagination(NamedTuple):
+    limit: int
+    offset: int = 0
+    cursor: str | None = None
 
 
 @dataclass(frozen=True, slots=False)
 class PostFilter:
     title: str | None
     author_id: int | None
+    search: str | None = None
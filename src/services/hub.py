@@ -0,0 +1,103 @@
+import asyncio
+from collections import deque
+from typing import Generic, Hashable, Self, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+M = TypeVar("M")
+
+
+class Subscription(Generic[M]):
+    """
+    The messages of one topic for one consumer, in the order they were published.
+
+    Iteration ends once the subscription is closed and what it buffered is consumed. A consumer
+    that lets ``max_buffer`` messages pile up is cut off instead of holding the publisher back or
+    growing without bound: ``missed`` is set and it has to resynchronize from the database.
+    """
+
+    def __init__(self, hub: "Hub", topic: Hashable, max_buffer: int):
+        self.hub = hub
+        self.topic = topic
+        self.max_buffer = max_buffer
+        self.closed = False
+        self.missed = False
+        self._buffer: deque[M] = deque()
+        self._ready = asyncio.Event()
+
+    def deliver(self, message: M) -> bool:
+        if self.closed:
+            return False
+        if len(self._buffer) >= self.max_buffer:
+            self.hub.overflows += 1
+            self.close(missed=True)
+            return False
+        self._buffer.append(message)
+        self._ready.set()
+        return True
+
+    def close(self, missed: bool = False) -> None:
+        self.missed = self.missed or missed
+        self.closed = True
+        self.hub._unsubscribe(self)
+        self._ready.set()
+
+    def __aiter__(self) -> Self:
+        return self
+
+    async def __anext__(self) -> M:
+        while not self._buffer:
+            if self.closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+        return self._buffer.popleft()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Hub(Generic[K, M]):
+    """
+    In-process publish/subscribe by topic, meant to be used from a single event loop.
+
+    Publishing never waits: every subscriber gets its own bounded buffer, so one slow consumer
+    costs nobody else anything. ``published`` and ``overflows`` count messages and cut off subscribers.
+    """
+
+    def __init__(self):
+        self._topics: dict[K, set[Subscription[M]]] = {}
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self, topic: K, max_buffer: int) -> Subscription[M]:
+        subscription = Subscription(self, topic, max_buffer)
+        self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def subscribers(self, topic: K | None = None) -> int:
+        """Subscribers of ``topic``, or of all topics."""
+        if topic is None:
+            return sum(map(len, self._topics.values()))
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic: K, message: M) -> int:
+        """Hand ``message`` to the subscribers of ``topic``, return how many took it."""
+        self.published += 1
+        # an overflowing subscriber leaves the topic while it is being iterated
+        return sum(subscription.deliver(message) for subscription in tuple(self._topics.get(topic, ())))
+
+    def cut_off(self, topic: K | None = None) -> None:
+        """Close the subscriptions of ``topic``, or of all topics, as having missed messages."""
+        topics = self._topics.values() if topic is None else [self._topics.get(topic, ())]
+        for subscription in [subscription for subscriptions in topics for subscription in subscriptions]:
+            subscription.close(missed=True)
+
+    def _unsubscribe(self, subscription: Subscription[M]) -> None:
+        subscriptions = self._topics.get(subscription.topic)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._topics[subscription.topic]
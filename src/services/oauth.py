@@ -1,18 +1,93 @@
+import datetime as dt
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Literal
 
 import jwt
 from core.config import SecuritySettings
+from core.config.constansts import UserRole
+from db import NotificationListener, notify
+from db.models import UserModel
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.security.utils import get_authorization_scheme_param
-from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
+from services.cache import CacheStats, TTLCache
 from services.errors.oauth import (
     InvalidTokenTypeError,
     UnauthorizedError,
 )
 
+CHANNEL = "auth"
+
+
+@dataclass(frozen=True, slots=False)
+class AuthUserSettings:
+    id: int
+    auto_comment_answer: bool
+    auto_answer_delay: dt.time
+
+
+@dataclass(frozen=True, slots=False)
+class AuthUser:
+    """The authenticated principal: only what permission checks and handlers need."""
+    id: int
+    role: UserRole
+    settings: AuthUserSettings | None
+
+    @classmethod
+    def from_model(cls, user: UserModel) -> "AuthUser":
+        settings = user.settings and AuthUserSettings(
+            id=user.settings.id,
+            auto_comment_answer=user.settings.auto_comment_answer,
+            auto_answer_delay=user.settings.auto_answer_delay,
+        )
+        return cls(id=user.id, role=user.role, settings=settings)
+
+
+class AuthUserCache:
+    """
+    Per-process cache of authenticated principals keyed by user id and token version.
+
+    An entry only matches tokens carrying the version it was loaded for, so bumping
+    ``UserModel.token_version`` revokes old tokens once their entry is gone. Call
+    ``invalidate`` whenever a cached field (role or settings) changes, and ``broadcast``
+    so that the other processes, which ``listen``, drop their entry too.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache: TTLCache[int, tuple[int, AuthUser]] = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, user_id: int, token_version: int) -> AuthUser | None:
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        version, user = entry
+        if version != token_version:
+            self._cache.delete(user_id)
+            return None
+        return user
+
+    def set(self, user: AuthUser, token_version: int) -> None:
+        self._cache.set(user.id, (token_version, user))
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.delete(user_id)
+
+    @staticmethod
+    async def broadcast(session: AsyncSession, user_id: int) -> None:
+        """Have every listening process ``invalidate`` the user, once the session's transaction commits."""
+        await notify(session, CHANNEL, str(user_id))
+
+    def listen(self, listener: NotificationListener) -> None:
+        # invalidations missed while disconnected are unknown, so everything goes
+        listener.listen(CHANNEL, lambda payload: self.invalidate(int(payload)), on_connect=self._cache.clear)
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._cache.stats
+
 
 class CustomHTTPBearer(HTTPBearer):
     async def __call__(self, request: Request) -> HTTPAuthorizationCredentials | None:
@@ -26,23 +101,22 @@ class CustomHTTPBearer(HTTPBearer):
 
 
 class JwtAuthService:
-    _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
     def __init__(self, security_settings: SecuritySettings):
         self._security_settings = security_settings
 
-    def _generate_token_payload(self, user_id: int, token_type: str) -> dict[str, str]:
+    def _generate_token_payload(self, user_id: int, token_type: str, token_version: int) -> dict[str, str]:
         lifetime = self._security_settings.ACCESS_TOKEN_EXPIRES_MINUTES
         return {
             "exp": (datetime.now(timezone.utc) + timedelta(minutes=lifetime)).timestamp(),
             "iat": datetime.now(timezone.utc).timestamp(),
             "sub": user_id,
             "type": token_type,
+            "ver": token_version,
         }
 
-    def generate_jwt_tokens(self, user_id: int) -> dict[str, str]:
-        access_payload = self._generate_token_payload(user_id, token_type="access")
-        refresh_payload = self._generate_token_payload(user_id, token_type="refresh")
+    def generate_jwt_tokens(self, user_id: int, token_version: int = 0) -> dict[str, str]:
+        access_payload = self._generate_token_payload(user_id, token_type="access", token_version=token_version)
+        refresh_payload = self._generate_token_payload(user_id, token_type="refresh", token_version=token_version)
         return {
             "access_token": jwt.encode(
                 access_payload,
@@ -58,11 +132,16 @@ class JwtAuthService:
             "refresh_token_expires_at": str(refresh_payload["exp"]),
         }
 
-    def refresh_token(self, refresh_token: str) -> (dict[str, str], int):
+    def refresh_token(self, refresh_token: str) -> (dict[str, str], int, int):
         payload = self.decode_jwt_token(refresh_token)
         if payload["type"] != "refresh":
             raise InvalidTokenTypeError
-        return self.generate_jwt_tokens(int(payload["sub"])), payload["sub"]
+        token_version = self.get_token_version(payload)
+        return self.generate_jwt_tokens(int(payload["sub"]), token_version), payload["sub"], token_version
+
+    @staticmethod
+    def get_token_version(payload: dict[str, str]) -> int:
+        return int(payload.get("ver", 0))
 
     def decode_jwt_token(self, token: str) -> dict[str, str]:
         try:
@@ -76,9 +155,3 @@ class JwtAuthService:
             return payload
         except jwt.ExpiredSignatureError:
             raise InvalidTokenTypeError
-
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return self._pwd_context.verify(plain_password, hashed_password)
-
-    def hash_password(self, password: str) -> str:
-        return self._pwd_context.hash(password)
@@ -0,0 +1,34 @@
+import base64
+import binascii
+from typing import Any, Generic, NamedTuple, Sequence, TypeVar
+
+import msgspec
+
+from services.errors import InvalidCursorError
+
+T = TypeVar("T")
+
+
+class Cursor(msgspec.Struct, frozen=True, array_like=True):
+    """Position of the last row of a page: the ordering it was built for, its ordering value and its id."""
+    ordering: str
+    value: Any
+    id: int
+
+
+class Page(NamedTuple, Generic[T]):
+    items: Sequence[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(ordering: str, value: Any, obj_id: int) -> str:
+    payload = msgspec.json.encode(Cursor(ordering=ordering, value=value, id=obj_id))
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode()
+
+
+def decode_cursor(raw: str) -> Cursor:
+    try:
+        payload = base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4))
+        return msgspec.json.decode(payload, type=Cursor)
+    except (binascii.Error, ValueError, msgspec.DecodeError):
+        raise InvalidCursorError(detail="Malformed pagination cursor")
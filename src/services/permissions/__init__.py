@@ -1,12 +1,15 @@
-from typing import Type
+from typing import Any, Type
 
 from db.models import CommentModel, PostModel, UserModel
+from sqlalchemy import ColumnElement, false, or_, true
 
 from services.errors import PermissionDeniedError
+from services.oauth import AuthUser
 from services.permissions.base import (
     AbstractModel,
     AbstractObjectPermission,
     PermissionRoles,
+    RowExpressions,
 )
 from services.permissions.comments import CommentPermissions
 from services.permissions.posts import PostPermissions
@@ -15,6 +18,7 @@ from services.permissions.users import UserPermission
 __all__ = [
     "check_object_permission",
     "check_operation_permission",
+    "get_object_permission_clause",
 ]
 
 OBJECT_PERMISSION_TABLE = {
@@ -26,22 +30,47 @@ OBJECT_PERMISSION_TABLE = {
 
 def check_object_permission(
         operation: str,
-        user: UserModel,
-        item: AbstractModel,
+        user: AuthUser,
+        item: AbstractModel | Any,
+        model: Type[AbstractModel] | None = None,
 ):
-    object_permission_class: Type[AbstractObjectPermission] = OBJECT_PERMISSION_TABLE.get(item.__tablename__)
+    """Check ``operation`` on ``item``, which may be a snapshot of a row of ``model`` rather than the row itself."""
+    model = model or type(item)
+    object_permission_class: Type[AbstractObjectPermission] = OBJECT_PERMISSION_TABLE.get(model.__tablename__)
     object_permission = object_permission_class.get_object_lvl_permission(item)
     for permission in object_permission:
         if operation == permission[0]:
             allowed_roles = permission[1]
-            if PermissionRoles.all.value in allowed_roles or user.role in allowed_roles or user.id in allowed_roles:
+            if _grants_role(allowed_roles, user) or user.id in allowed_roles:
                 return
     raise PermissionDeniedError
 
 
+def get_object_permission_clause(
+        operation: str,
+        user: AuthUser,
+        model: Type[AbstractModel],
+) -> ColumnElement[bool]:
+    """
+    SQL form of ``check_object_permission``, for the ``WHERE`` clause of a write to ``model``.
+
+    Built from the same object level permissions, with the row's columns in place of its values.
+    """
+    object_permission_class: Type[AbstractObjectPermission] = OBJECT_PERMISSION_TABLE.get(model.__tablename__)
+    object_permission = object_permission_class.get_object_lvl_permission(RowExpressions(model))
+    for permission in object_permission:
+        if operation == permission[0]:
+            allowed_roles = permission[1]
+            if _grants_role(allowed_roles, user):
+                return true()
+            # whatever is not a role names the user, such as an author_id column
+            return or_(false(), *(allowed == user.id for allowed in allowed_roles if not isinstance(allowed, str)))
+    return false()
+
+
 def check_operation_permission(
         operation: str,
-        user: UserModel,
+        user: AuthUser,
 ):
     model_name = operation.split(":")[0]
     object_permission_class: Type[AbstractObjectPermission] = OBJECT_PERMISSION_TABLE.get(model_name)
@@ -49,6 +78,10 @@ def check_operation_permission(
     for permission in operation_permission:
         if operation == permission[0]:
             allowed_roles = permission[1]
-            if PermissionRoles.all.value in allowed_roles or user.role.value in allowed_roles:
+            if _grants_role(allowed_roles, user):
                 return
     raise PermissionDeniedError
+
+
+def _grants_role(allowed_roles: list[Any], user: AuthUser) -> bool:
+    return PermissionRoles.all.value in allowed_roles or user.role.value in allowed_roles
@@ -1,10 +1,12 @@
 import dataclasses
 import enum
 from abc import ABC, abstractmethod
-from typing import Tuple, TypeVar
+from typing import Any, Tuple, Type, TypeVar
 
 from core.config.constansts import UserRole
 from db.models import PgBaseModel
+from sqlalchemy import ColumnElement, and_, select
+from sqlalchemy.orm import RelationshipProperty
 
 AbstractModel = TypeVar("AbstractModel", bound=PgBaseModel)
 
@@ -53,3 +55,24 @@ class AbstractObjectPermission(ABC):
     @abstractmethod
     def get_operation_lvl_permission() -> list[Tuple[str, list[str]]]:
         raise NotImplementedError
+
+
+class RowExpressions:
+    """
+    Any row of ``model``, handed to ``get_object_lvl_permission`` to get its permissions as SQL.
+
+    Columns read as themselves, columns of related rows as subqueries correlated through ``join``.
+    """
+
+    def __init__(self, model: Type[AbstractModel], join: ColumnElement[bool] | None = None):
+        self._model = model
+        self._join = join
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._model, name)
+        if isinstance(attribute.property, RelationshipProperty):
+            join = attribute.property.primaryjoin
+            return RowExpressions(attribute.property.mapper.class_, join if self._join is None else and_(self._join, join))
+        if self._join is None:
+            return attribute
+        return select(attribute).where(self._join).scalar_subquery()
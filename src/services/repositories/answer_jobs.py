@@ -0,0 +1,126 @@
+from datetime import timedelta
+from typing import Any, Collection, Sequence
+
+from db.models import AnswerJobModel, CommentModel, PostModel, UserSettingsModel
+from sqlalchemy import (
+    Interval,
+    Row,
+    cast,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.repositories.base import PgRepositoryMixin
+
+
+class AnswerJobRepository(PgRepositoryMixin):
+    model = AnswerJobModel
+
+    async def enqueue(self, session: AsyncSession, comment_ids: Collection[int]) -> int:
+        """
+        Queue an answer to each of the comments made on the post of an author who opted in.
+
+        Comments of the post author, automatic answers included, are not answered. The answer
+        is due ``auto_answer_delay`` after the comment was created. Return how many were queued.
+        """
+        comment, post, settings = CommentModel, PostModel, UserSettingsModel
+        due = (
+            select(comment.id, comment.created_at + cast(settings.auto_answer_delay, Interval))
+            .join(post, post.id == comment.post_id)
+            .join(settings, settings.user_id == post.author_id)
+            .where(comment.id.in_(comment_ids), settings.auto_comment_answer, comment.author_id != post.author_id)
+        )
+        stmt = insert(self.model.__table__).from_select(["comment_id", "due_at"], due).returning(self.model.id)
+        return len((await session.execute(stmt)).all())
+
+    async def claim(self, session: AsyncSession, limit: int, lease: float) -> Sequence[Row]:
+        """
+        Lease up to ``limit`` due jobs and load what answering them takes, in one round trip.
+
+        ``SKIP LOCKED`` lets concurrent claims pass over each other's jobs instead of queueing
+        behind them. A claim counts as an attempt and moves ``due_at`` to the end of the lease.
+        """
+        due = (
+            select(self.model.id)
+            .where(self.model.failed_at.is_(None), self.model.due_at <= func.now())
+            .order_by(self.model.due_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        claimed = (
+            update(self.model.__table__)
+            .where(self.model.id.in_(due))
+            .values(due_at=func.now() + timedelta(seconds=lease), attempts=self.model.attempts + 1)
+            .returning(self.model.id, self.model.attempts, self.model.comment_id)
+            .cte("claimed")
+        )
+        stmt = (
+            select(
+                claimed.c.id,
+                claimed.c.attempts,
+                claimed.c.comment_id,
+                CommentModel.content,
+                CommentModel.post_id,
+                PostModel.title,
+                PostModel.author_id,
+            )
+            .join(CommentModel, CommentModel.id == claimed.c.comment_id)
+            .join(PostModel, PostModel.id == CommentModel.post_id)
+        )
+        return (await session.execute(stmt)).all()
+
+    async def complete(
+            self,
+            session: AsyncSession,
+            job_id: int,
+            attempts: int,
+            answer: dict[str, Any],
+    ) -> int | None:
+        """
+        Delete the job and insert ``answer`` as a comment, unless the job was claimed again since.
+
+        Return the id of the answer, or ``None`` when another worker owns the job now.
+        """
+        done = (
+            delete(self.model.__table__)
+            .where(self.model.id == job_id, self.model.attempts == attempts)
+            .returning(self.model.id)
+            .cte("done")
+        )
+        answer_row = select(*(literal(value).label(name) for name, value in answer.items())).select_from(done)
+        stmt = (
+            insert(CommentModel.__table__)
+            .add_cte(done)
+            .from_select(list(answer), answer_row)
+            .returning(CommentModel.id)
+        )
+        return (await session.execute(stmt)).scalar_one_or_none()
+
+    async def fail(
+            self,
+            session: AsyncSession,
+            job_id: int,
+            attempts: int,
+            error: str,
+            retry_in: float | None,
+    ) -> None:
+        """Record a failed attempt and retry in ``retry_in`` seconds, or give up on the job when it is ``None``."""
+        values: dict[str, Any] = {"last_error": error}
+        if retry_in is None:
+            values["failed_at"] = func.now()
+        else:
+            values["due_at"] = func.now() + timedelta(seconds=retry_in)
+        stmt = update(self.model.__table__).where(self.model.id == job_id, self.model.attempts == attempts)
+        await session.execute(stmt.values(values))
+
+    async def seconds_until_due(self, session: AsyncSession) -> float | None:
+        """Time until the next pending job is due, negative when one is overdue, ``None`` when there is none."""
+        next_due = func.min(self.model.due_at) - func.now()
+        stmt = select(func.extract("epoch", next_due)).where(self.model.failed_at.is_(None))
+        seconds = (await session.execute(stmt)).scalar_one()
+        return None if seconds is None else float(seconds)
@@ -1,29 +1,76 @@
 import abc
-from typing import Any, List, Sequence, Type
+from datetime import datetime
+from functools import partial
+from typing import Any, Collection, List, Self, Sequence, Type
 
+import msgspec
+from db import after_commit
 from db.models.base import AbstractModel
 from sqlalchemy import (
+    ColumnElement,
     Row,
     RowMapping,
     Select,
+    and_,
+    bindparam,
     delete,
+    exists,
+    false,
+    func,
+    insert,
+    not_,
+    or_,
     select,
+    true,
+    tuple_,
     update,
 )
+from sqlalchemy.dialects.postgresql import Insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload, raiseload
 
-from services.errors import ResourceNotFoundError
+from services.cache import ObjectCache
+from services.errors import (
+    AbstractError,
+    InvalidCursorError,
+    InvalidOrderingError,
+    PermissionDeniedError,
+    ResourceInUseError,
+    ResourceNotFoundError,
+)
 from services.errors.base import DuplicateResourceError
+from services.filters import Pagination
+from services.pagination import Cursor, Page, decode_cursor, encode_cursor
 
 
 class AbstractRepository(abc.ABC):
     pass
 
 
+FOREIGN_KEY_VIOLATION = "23503"
+
+
 class PgRepositoryMixin(AbstractRepository):
+    # writes only flush, committing is left to the caller's unit of work
     model: Type[AbstractModel]
+    default_ordering: str = "-id"
+    # columns paginated listings may be ordered by, anything else is a client error
+    sortable: tuple[str, ...] = ("id",)
+    # relationships loaded in the same statement as the rows returned by *_returning writes
+    returning_joined: tuple[str, ...] = ()
+    # foreign keys of other tables to this one without ON DELETE CASCADE, referenced rows are not deleted
+    referenced_by: tuple[Any, ...] = ()
+    # snapshot ``get_cached`` builds from a row and its ``returning_joined`` relationships
+    cache_struct: Type[msgspec.Struct] | None = None
+    cache: ObjectCache | None = None
+
+    @classmethod
+    def with_cache(cls, cache: ObjectCache | None) -> Self:
+        repository = cls()
+        repository.cache = cache
+        return repository
 
     async def get(
             self,
@@ -48,6 +95,52 @@ class PgRepositoryMixin(AbstractRepository):
             raise ResourceNotFoundError(detail=f"{self.model.__name__} with id {obj_id} not found")
         return obj
 
+    async def get_cached(self, session: AsyncSession, obj_id: int) -> Any:
+        """
+        Return a ``cache_struct`` snapshot of the row, read through the repository cache.
+
+        Every write method of the repository invalidates the rows it touches. Relationships
+        are snapshotted with the row, so changes made to them elsewhere show up once the
+        entry expires.
+        """
+        async def load() -> msgspec.Struct:
+            stmt = select(self.model).where(self.model.id == obj_id).options(*self._returning_options(self.model))
+            obj = (await session.execute(stmt)).scalar_one_or_none()
+            if obj is None:
+                raise ResourceNotFoundError(detail=f"{self.model.__name__} with id {obj_id} not found")
+            return msgspec.convert(obj, self.cache_struct, from_attributes=True)
+
+        if self.cache is None:
+            return await load()
+        return await self.cache.get_or_load(self._cache_key(obj_id), self.cache_struct, load)
+
+    async def get_updated_at(self, session: AsyncSession, obj_id: int) -> datetime:
+        """Read only ``updated_at`` of the row, enough to revalidate a conditional request."""
+        stmt = select(self.model.updated_at).where(self.model.id == obj_id)
+        updated_at = (await session.execute(stmt)).scalar_one_or_none()
+        if updated_at is None:
+            raise ResourceNotFoundError(detail=f"{self.model.__name__} with id {obj_id} not found")
+        return updated_at
+
+    async def cache_generation(self) -> int:
+        """Generation of the table, bumped by every write, for keys of entries derived from many rows."""
+        if self.cache is None:
+            return 0
+        return await self.cache.generation(self.model.__tablename__)
+
+    async def invalidate_cached(self, session: AsyncSession, obj_ids: Collection[int] = ()) -> None:
+        if self.cache is None:
+            return
+        keys = [self._cache_key(obj_id) for obj_id in obj_ids]
+        invalidate = partial(self.cache.invalidate, keys, self.model.__tablename__)
+        await invalidate()
+        # a concurrent miss may read the old rows again until this transaction commits
+        after_commit(session, invalidate)
+        await self.cache.broadcast(session, keys, self.model.__tablename__)
+
+    def _cache_key(self, obj_id: int) -> str:
+        return f"{self.model.__tablename__}:{obj_id}"
+
     async def list(
             self,
             session: AsyncSession,
@@ -62,38 +155,375 @@ class PgRepositoryMixin(AbstractRepository):
         result = await session.execute(stmt)
         return result.scalars().all()
 
-    @staticmethod
-    async def create(session: AsyncSession, item: AbstractModel) -> AbstractModel:
+    async def create(self, session: AsyncSession, item: AbstractModel) -> AbstractModel:
         session.add(item)
         try:
-            await session.commit()
+            await session.flush()
         except IntegrityError as e:
             raise DuplicateResourceError(detail=str(e.orig))
         await session.refresh(item)
+        await self.invalidate_cached(session)
         return item
 
     async def update(self, session: AsyncSession, obj_id: int, data: dict):
         stmt = update(self.model).where(self.model.id == obj_id).values(data)
         await session.execute(stmt)
-        await session.commit()
+        await self.invalidate_cached(session, [obj_id])
 
     async def delete(self, session: AsyncSession, obj_id: int):
         await session.execute(delete(self.model).where(self.model.id == obj_id))
-        await session.commit()
+        await self.invalidate_cached(session, [obj_id])
 
-    async def create_bulk(self, session: AsyncSession, items: List[AbstractModel]) -> Sequence[Any]:
-        session.add_all(items)
+    async def insert_returning(self, session: AsyncSession, values: dict[str, Any]) -> AbstractModel:
+        """Insert a row and load it, with ``returning_joined`` relationships, in one round trip."""
+        written = insert(self.model.__table__).values(values).returning(*self._returning_columns()).cte("written")
+        entity = aliased(self.model, written)
+        stmt = select(entity).options(*self._returning_options(entity))
         try:
-            await session.commit()
+            obj = (await session.execute(stmt)).scalar_one()
         except IntegrityError as e:
-            raise DuplicateResourceError(detail=str(e.orig))
+            raise self._integrity_error(e)
+        await self.invalidate_cached(session)
+        return obj
+
+    async def update_returning(
+            self,
+            session: AsyncSession,
+            obj_id: int,
+            data: dict[str, Any],
+            where: ColumnElement[bool] = true(),
+    ) -> AbstractModel:
+        """
+        Update a row only if it matches ``where`` and load the fresh row in one round trip.
+
+        Raises ``ResourceNotFoundError`` when the row does not exist and ``PermissionDeniedError``
+        when it exists but ``where`` (usually an ownership predicate) excludes it.
+        """
+        if data and "updated_at" in self.model.__table__.c:
+            # a PATCH without fields changes nothing, nor the ETag derived from ``updated_at``
+            data = {**data, "updated_at": func.now()}
+        target = select(self.model.id).where(self.model.id == obj_id).cte("target")
+        if data:
+            written = (
+                update(self.model.__table__)
+                .where(self.model.id == obj_id, where)
+                .values(data)
+                .returning(*self._returning_columns())
+                .cte("written")
+            )
+            entity = aliased(self.model, written)
+            onclause = entity.id == target.c.id
+        else:
+            # nothing to write, an empty SET is a syntax error: only read the row if ``where`` allows it
+            entity = self.model
+            onclause = and_(entity.id == target.c.id, where)
+        stmt = (
+            select(target.c.id, entity)
+            .select_from(target)
+            .outerjoin(entity, onclause)
+            .options(*self._returning_options(entity))
+            .execution_options(populate_existing=True)
+        )
+        row = (await session.execute(stmt)).one_or_none()
+        if data:
+            await self.invalidate_cached(session, [obj_id])
+        return self._written_or_raise(obj_id, row)
+
+    async def delete_returning(
+            self,
+            session: AsyncSession,
+            obj_id: int,
+            where: ColumnElement[bool] = true(),
+            returning: Sequence[str] = (),
+    ) -> Row:
+        """
+        Delete a row only if it matches ``where``, telling 404 from 403 in the same round trip.
+
+        Raises ``ResourceInUseError`` when rows of ``referenced_by`` still point to it. Return the
+        deleted ``id`` and the ``returning`` columns of the row.
+        """
+        target = self._delete_target([obj_id], where)
+        columns = [self.model.__table__.c[name] for name in ("id", *returning)]
+        written = (
+            delete(self.model.__table__)
+            .where(self.model.id == obj_id, where, not_(self._referenced()))
+            .returning(*columns)
+            .cte("written")
+        )
+        stmt = (
+            select(target.c.id.label("target_id"), *written.c, target.c.allowed, target.c.referenced)
+            .select_from(target)
+            .outerjoin(written, written.c.id == target.c.id)
+        )
+        row = await self._delete_rows(session, stmt, one=True)
+        if row is not None and row.allowed and row.referenced:
+            raise self._in_use_error(obj_id)
+        await self.invalidate_cached(session, [obj_id])
+        self._written_or_raise(obj_id, row)
+        return row
 
-    async def update_bulk(self, session: AsyncSession, updates: List[dict]) -> Sequence[Any]:
-        results = await session.execute(update(self.model).values(updates).returning(self.model.id))
-        return results.scalars().all()
+    def _returning_columns(self) -> List[Any]:
+        return [column for column in self.model.__table__.c if not column.computed]
 
-    async def delete_bulk(self, session: AsyncSession, obj_ids: List[int]) -> None:
-        await session.execute(delete(self.model).where(self.model.id.in_(obj_ids)))
+    def _returning_options(self, entity: Any) -> List[Any]:
+        # anything beyond ``returning_joined`` would cost another round trip, so refuse to load it
+        return [
+            *(joinedload(getattr(entity, name)).raiseload("*") for name in self.returning_joined),
+            raiseload("*"),
+        ]
+
+    def _referenced(self) -> ColumnElement[bool]:
+        return or_(false(), *(exists().where(column == self.model.id) for column in self.referenced_by))
+
+    def _delete_target(self, obj_ids: Collection[int], where: ColumnElement[bool]) -> Any:
+        # whether each row may be deleted, and is still referenced, as the statement starts
+        return (
+            select(self.model.id, where.label("allowed"), self._referenced().label("referenced"))
+            .where(self.model.id.in_(obj_ids))
+            .cte("target")
+        )
+
+    async def _delete_rows(self, session: AsyncSession, stmt: Select, one: bool = False) -> Any:
+        try:
+            result = await session.execute(stmt)
+        except IntegrityError as e:
+            # referenced by a row written after the statement started
+            if getattr(e.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+                raise ResourceInUseError(detail=str(e.orig))
+            raise
+        return result.one_or_none() if one else result.all()
+
+    def _in_use_error(self, obj_id: int) -> AbstractError:
+        return ResourceInUseError(detail=f"{self.model.__name__} with id {obj_id} is still referenced")
+
+    @staticmethod
+    def _integrity_error(error: IntegrityError) -> AbstractError:
+        if getattr(error.orig, "sqlstate", None) == FOREIGN_KEY_VIOLATION:
+            return ResourceNotFoundError(detail=str(error.orig))
+        return DuplicateResourceError(detail=str(error.orig))
+
+    def _written_or_raise(self, obj_id: int, row: Row | None) -> Any:
+        if row is None:
+            raise ResourceNotFoundError(detail=f"{self.model.__name__} with id {obj_id} not found")
+        if row[1] is None:
+            raise PermissionDeniedError
+        return row[1]
+
+    async def create_bulk(
+            self,
+            session: AsyncSession,
+            rows: List[dict[str, Any]],
+            upsert_columns: Sequence[str] = (),
+    ) -> List[AbstractModel]:
+        """
+        Insert ``rows`` with multi-row ``INSERT ... RETURNING`` and return them in the given order.
+
+        With ``upsert_columns``, rows carrying an ``id`` overwrite those columns of the existing
+        row through ``ON CONFLICT (id) DO UPDATE`` instead. Relationships are not loaded.
+        """
+        inserts = [row for row in rows if row.get("id") is None]
+        upserts = [row for row in rows if row.get("id") is not None]
+        try:
+            created = iter(await self._insert_many(session, pg_insert(self.model), inserts, ordered=True))
+            upserted = {}
+            if upserts:
+                stmt = pg_insert(self.model)
+                values = {name: stmt.excluded[name] for name in upsert_columns}
+                if "updated_at" in self.model.__table__.c:
+                    values["updated_at"] = func.now()
+                stmt = stmt.on_conflict_do_update(index_elements=[self.model.id], set_=values)
+                # explicit ids identify the rows, asking for parameter order would cost a statement per row
+                upserted = {obj.id: obj for obj in await self._insert_many(session, stmt, upserts, ordered=False)}
+        except IntegrityError as e:
+            raise self._integrity_error(e)
+        if rows:
+            await self.invalidate_cached(session, list(upserted))
+        return [upserted[row["id"]] if row.get("id") is not None else next(created) for row in rows]
+
+    async def _insert_many(
+            self,
+            session: AsyncSession,
+            stmt: Insert,
+            rows: List[dict[str, Any]],
+            ordered: bool,
+    ) -> List[AbstractModel]:
+        if not rows:
+            return []
+        stmt = stmt.returning(self.model, sort_by_parameter_order=ordered).options(raiseload("*"))
+        result = await session.execute(stmt, rows, execution_options={"populate_existing": True})
+        return list(result.scalars())
+
+    async def update_bulk(self, session: AsyncSession, rows: List[dict[str, Any]], columns: Sequence[str]) -> None:
+        """
+        Update ``columns`` of every row by primary key, as one executemany of the same statement.
+
+        A missing or ``None`` value keeps the current column value.
+        """
+        if not rows:
+            return
+        table = self.model.__table__
+        values = {name: func.coalesce(bindparam(f"new_{name}"), table.c[name]) for name in columns}
+        if "updated_at" in table.c:
+            values["updated_at"] = func.now()
+        stmt = update(table).where(table.c.id == bindparam("row_id")).values(values)
+        await session.execute(
+            stmt,
+            [{"row_id": row["id"], **{f"new_{name}": row.get(name) for name in columns}} for row in rows],
+        )
+        await self.invalidate_cached(session, [row["id"] for row in rows])
+
+    async def delete_bulk(
+            self,
+            session: AsyncSession,
+            obj_ids: List[int],
+            where: ColumnElement[bool] = true(),
+    ) -> dict[int, AbstractError | None]:
+        """
+        Delete the rows matching ``where`` that nothing references any more.
+
+        Map every existing id to ``None`` once deleted, or to why it was kept: ``PermissionDeniedError``
+        when ``where`` rejects it, ``ResourceInUseError`` when rows of ``referenced_by`` point to it.
+        """
+        target = self._delete_target(obj_ids, where)
+        written = (
+            delete(self.model.__table__)
+            .where(self.model.id.in_(obj_ids), where, not_(self._referenced()))
+            .returning(self.model.id)
+            .cte("written")
+        )
+        stmt = (
+            select(target.c.id, target.c.allowed, written.c.id.label("written_id"))
+            .select_from(target)
+            .outerjoin(written, written.c.id == target.c.id)
+        )
+        kept: dict[int, AbstractError | None] = {}
+        for row in await self._delete_rows(session, stmt):
+            if row.written_id is not None:
+                kept[row.id] = None
+            elif not row.allowed:
+                kept[row.id] = PermissionDeniedError()
+            else:
+                kept[row.id] = self._in_use_error(row.id)
+        if deleted := [obj_id for obj_id, error in kept.items() if error is None]:
+            await self.invalidate_cached(session, deleted)
+        return kept
+
+    async def lock_writable(
+            self,
+            session: AsyncSession,
+            obj_ids: Collection[int],
+            where: ColumnElement[bool] = true(),
+    ) -> dict[int, bool]:
+        """Lock the rows with ``obj_ids`` for update and map every existing id to whether ``where`` allows it."""
+        stmt = (
+            select(self.model.id, where.label("allowed"))
+            .where(self.model.id.in_(obj_ids))
+            .with_for_update(of=self.model)
+        )
+        return dict((await session.execute(stmt)).tuples().all())
+
+    async def check_references(
+            self,
+            session: AsyncSession,
+            rows: List[dict[str, Any]],
+    ) -> dict[int, AbstractError]:
+        """Map the index of every row referencing a missing parent to its error, for bulk writes."""
+        return {}
+
+    async def paginate(
+            self,
+            session: AsyncSession,
+            stmt: Select,
+            filters: dict[str, Any] | None = None,
+            ordering: List[str] | None = None,
+            pagination: Pagination = Pagination(limit=10),
+            columns: dict[str, ColumnElement] | None = None,
+    ) -> Page:
+        """
+        Execute ``stmt`` as one page of results.
+
+        Without a cursor this is the usual ``OFFSET/LIMIT`` query. With a cursor the page is
+        fetched with an index-friendly ``WHERE (column, id) < (:value, :id)`` seek instead.
+        ``next_cursor`` is set whenever the page is full and ordered by a single column.
+        ``columns`` maps extra ordering names, such as a computed rank, to their SQL expressions.
+        """
+        stmt, ordering = self.paginate_query(stmt, filters, ordering, pagination, columns)
+        result = await session.execute(stmt)
+        return self.to_page(result.scalars().all(), ordering, pagination)
+
+    def paginate_query(
+            self,
+            stmt: Select,
+            filters: dict[str, Any] | None = None,
+            ordering: List[str] | None = None,
+            pagination: Pagination = Pagination(limit=10),
+            columns: dict[str, ColumnElement] | None = None,
+    ) -> tuple[Select, List[str]]:
+        """Build the statement ``paginate`` executes, returning it with the ordering it applied."""
+        ordering = [value for value in ordering or [] if value]
+        cursor = None
+        if pagination.cursor:
+            cursor = decode_cursor(pagination.cursor)
+            ordering = ordering or [cursor.ordering]
+            if ordering != [cursor.ordering]:
+                raise InvalidCursorError(detail="Cursor does not match the requested ordering")
+            if not self._is_sortable(cursor.ordering, columns):
+                # e.g. a search cursor replayed without the search
+                raise InvalidCursorError(detail="Cursor ordering is not available for this query")
+        ordering = ordering or [self.default_ordering]
+        for value in ordering:
+            if not self._is_sortable(value, columns):
+                raise InvalidOrderingError(detail=f"Cannot order by {value.lstrip('-')!r}")
+
+        if len(ordering) == 1:
+            stmt = self.filter_query(self.model, stmt, filters, None, limit=pagination.limit)
+            column = (columns or {}).get(ordering[0].lstrip("-"))
+            stmt = self.keyset_query(self.model, stmt, ordering[0], cursor, column)
+            if not cursor:
+                stmt = stmt.offset(pagination.offset)
+        else:
+            stmt = self.filter_query(
+                self.model, stmt, filters, ordering, pagination.limit, pagination.offset, columns,
+            )
+        return stmt, ordering
+
+    def _is_sortable(self, ordering: str, columns: dict[str, ColumnElement] | None) -> bool:
+        return ordering.lstrip("-") in (*self.sortable, *(columns or ()))
+
+    @staticmethod
+    def to_page(items: Sequence[Any], ordering: List[str], pagination: Pagination) -> Page:
+        next_cursor = None
+        if len(ordering) == 1 and items and len(items) == pagination.limit:
+            last = items[-1]
+            next_cursor = encode_cursor(ordering[0], getattr(last, ordering[0].lstrip("-")), last.id)
+        return Page(items=items, next_cursor=next_cursor)
+
+    @staticmethod
+    def keyset_query(
+            model: Type[AbstractModel],
+            stmt: Select,
+            ordering: str,
+            cursor: Cursor | None = None,
+            column: ColumnElement | None = None,
+    ) -> Select:
+        """Order ``stmt`` by ``ordering`` with ``id`` as a tie breaker and seek past ``cursor``."""
+        descending = ordering.startswith("-")
+        if column is None:
+            column = getattr(model, ordering.lstrip("-"))
+        if column is model.id:
+            keys, order_by = model.id, [model.id.desc() if descending else model.id]
+        else:
+            keys = tuple_(column, model.id)
+            order_by = [column.desc(), model.id.desc()] if descending else [column, model.id]
+
+        if cursor:
+            try:
+                value = msgspec.convert(cursor.value, column.type.python_type, strict=False)
+            except msgspec.ValidationError:
+                raise InvalidCursorError(detail="Malformed pagination cursor")
+            bound = cursor.id if column is model.id else tuple_(value, cursor.id)
+            stmt = stmt.where(keys < bound if descending else keys > bound)
+        return stmt.order_by(*order_by)
 
     @staticmethod
     def filter_query(
@@ -101,8 +531,9 @@ class PgRepositoryMixin(AbstractRepository):
             stmt: Select,
             filters: dict[str, str] | None = None,
             ordering: List[str] | None = None,
-            limit: int = 10,
-            offset: int = 0
+            limit: int | None = 10,
+            offset: int = 0,
+            columns: dict[str, ColumnElement] | None = None,
     ) -> Select:
         if filters:
             for key, value in filters.items():
@@ -112,8 +543,11 @@ class PgRepositoryMixin(AbstractRepository):
         if ordering:
             for value in ordering:
                 if value:
-                    if value.startswith("-"):
-                        stmt = stmt.order_by(getattr(model, value[1:]).desc())
-                    else:
-                        stmt = stmt.order_by(getattr(model, value))
-        return stmt.offset(offset).limit(limit)
+                    name = value.lstrip("-")
+                    column = (columns or {}).get(name)
+                    if column is None:
+                        column = getattr(model, name)
+                    stmt = stmt.order_by(column.desc() if value.startswith("-") else column)
+        if offset:
+            stmt = stmt.offset(offset)
+        return stmt.limit(limit)
@@ -1,25 +1,91 @@
-from typing import Any, Sequence
+from typing import Any, Collection, Sequence
 
-from db.models import CommentModel
-from sqlalchemy import select
+from db.models import CommentModel, PostModel
+from sqlalchemy import select, true
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload, raiseload
 
+from services.errors import AbstractError, ResourceNotFoundError
+from services.filters import Pagination
+from services.pagination import Page
 from services.repositories.base import PgRepositoryMixin
 
 
 class CommentRepository(PgRepositoryMixin):
     model = CommentModel
+    default_ordering = "created_at"
+    sortable = ("id", "created_at", "updated_at", "author_id", "post_id")
+    returning_joined = ("author",)
+
+    async def get_many_with_author(self, session: AsyncSession, comment_ids: Collection[int]) -> Sequence[CommentModel]:
+        """Load the comments that still exist among ``comment_ids``, with their authors, in one statement."""
+        stmt = (
+            select(self.model)
+            .where(self.model.id.in_(comment_ids))
+            .options(joinedload(self.model.author).raiseload("*"), raiseload("*"))
+        )
+        return (await session.execute(stmt)).scalars().all()
+
+    async def get_post_ids(self, session: AsyncSession, comment_ids: Collection[int]) -> dict[int, int]:
+        """Map the comments that exist among ``comment_ids`` to their post, which never changes."""
+        stmt = select(self.model.id, self.model.post_id).where(self.model.id.in_(comment_ids))
+        return dict((await session.execute(stmt)).tuples().all())
 
     async def get_comments_with_author(
             self,
             session: AsyncSession,
             filters: dict[str, Any] | None = None,
             ordering: list[str] | None = None,
-            limit: int = 10,
-            offset: int = 0
-    ) -> Sequence[CommentModel]:
+            pagination: Pagination = Pagination(limit=10),
+    ) -> Page[CommentModel]:
         stmt = select(self.model).options(joinedload(self.model.author))
-        stmt = self.filter_query(self.model, stmt, filters, ordering, limit, offset)
-        comments = await session.execute(stmt)
-        return comments.scalars().all()
+        return await self.paginate(session, stmt, filters, ordering, pagination)
+
+    async def get_post_comments_with_author(
+            self,
+            session: AsyncSession,
+            post_id: int,
+            ordering: list[str] | None = None,
+            pagination: Pagination = Pagination(limit=10),
+    ) -> Page[CommentModel]:
+        """
+        Return one page of a post's comments, raising ``ResourceNotFoundError`` for a missing post.
+
+        The page is a subquery left joined to the post row, so checking that the post exists and
+        seeking through ``ix_comments_post_id_created_at_id`` take a single statement. Relationships
+        other than ``author`` are not loaded.
+        """
+        page_stmt, ordering = self.paginate_query(
+            select(self.model), {"post_id": post_id}, ordering, pagination,
+        )
+        page = page_stmt.subquery("page")
+        comment = aliased(self.model, page)
+        tiebreaker = "-id" if ordering[-1].startswith("-") else "id"
+        stmt = (
+            select(PostModel.id, comment)
+            .outerjoin(page, true())
+            .where(PostModel.id == post_id)
+            .options(joinedload(comment.author).raiseload("*"), raiseload("*"))
+        )
+        # the subquery's order is not guaranteed to survive the join, re-sorting one page is cheap
+        stmt = self.filter_query(comment, stmt, None, [*ordering, tiebreaker], pagination.limit)
+        rows = (await session.execute(stmt)).all()
+        if not rows:
+            raise ResourceNotFoundError(detail=f"{PostModel.__name__} with id {post_id} not found")
+        items = [row[1] for row in rows if row[1] is not None]
+        return self.to_page(items, ordering, pagination)
+
+    async def check_references(
+            self,
+            session: AsyncSession,
+            rows: list[dict[str, Any]],
+    ) -> dict[int, AbstractError]:
+        post_ids = {row["post_id"] for row in rows}
+        # FOR KEY SHARE keeps the posts from being deleted until the comments are written
+        stmt = select(PostModel.id).where(PostModel.id.in_(post_ids)).with_for_update(key_share=True)
+        found = set((await session.execute(stmt)).scalars())
+        return {
+            index: ResourceNotFoundError(detail=f"{PostModel.__name__} with id {row['post_id']} not found")
+            for index, row in enumerate(rows)
+            if row["post_id"] not in found
+        }
@@ -0,0 +1,39 @@
+from datetime import timedelta
+from typing import Collection
+
+from db.models import GeneratedAnswerModel
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.repositories.base import PgRepositoryMixin
+
+
+class GeneratedAnswerRepository(PgRepositoryMixin):
+    model = GeneratedAnswerModel
+
+    async def lookup(self, session: AsyncSession, keys: Collection[bytes], ttl: float) -> dict[bytes, str]:
+        """Return the answers stored under ``keys`` less than ``ttl`` seconds ago, and mark them used."""
+        stmt = (
+            update(self.model.__table__)
+            .where(self.model.key.in_(keys), self.model.created_at > func.now() - timedelta(seconds=ttl))
+            .values(used_at=func.now(), hits=self.model.hits + 1)
+            .returning(self.model.key, self.model.content)
+        )
+        return dict((await session.execute(stmt)).tuples().all())
+
+    async def store(self, session: AsyncSession, key: bytes, content: str) -> None:
+        """Store ``content`` under ``key``, replacing an expired answer or one stored concurrently."""
+        stmt = pg_insert(self.model.__table__).values(key=key, content=content)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.model.key],
+            set_={"content": stmt.excluded.content, "created_at": func.now(), "used_at": func.now(), "hits": 0},
+        )
+        await session.execute(stmt)
+
+    async def prune(self, session: AsyncSession, ttl: float, max_entries: int) -> int:
+        """Delete expired answers and the least recently used ones beyond ``max_entries``, return how many are left."""
+        expired = self.model.created_at <= func.now() - timedelta(seconds=ttl)
+        evicted = select(self.model.id).where(~expired).order_by(self.model.used_at.desc()).offset(max_entries)
+        await session.execute(delete(self.model.__table__).where(or_(expired, self.model.id.in_(evicted))))
+        return (await session.execute(select(func.count()).select_from(self.model))).scalar_one()
@@ -1,26 +1,108 @@
 from dataclasses import asdict
-from typing import Sequence
+from typing import AsyncIterator, Sequence
 
-from db.models import PostModel
-from sqlalchemy import select
+import sqlalchemy
+from core.config.constansts import PostView
+from db.models import CommentModel, PostModel, UserModel
+from db.models.posts import SEARCH_CONFIG
+from schemas.structs import PostWithAuthorStruct
+from sqlalchemy import ColumnElement, Row, Select, func, null, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload, raiseload, with_expression
 
 from services.filters import Pagination, PostFilter
+from services.pagination import Page
 from services.repositories.base import PgRepositoryMixin
 
+HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=35, MinWords=15"
+EXCERPT_LENGTH = 200
+SUMMARY_COLUMNS = ("id", "title", "created_at", "updated_at", "author_id")
+
 
 class PostRepository(PgRepositoryMixin):
     model = PostModel
+    default_ordering = "-created_at"
+    # "rank" is only available to searches
+    sortable = ("id", "title", "created_at", "updated_at", "author_id")
+    returning_joined = ("author",)
+    referenced_by = (CommentModel.post_id,)
+    cache_struct = PostWithAuthorStruct
 
     async def get_posts_with_author(
             self,
             session: AsyncSession,
             filters: PostFilter,
             ordering: list[str],
-            pagination: Pagination
-    ) -> Sequence[PostModel]:
-        stmt = select(self.model).options(joinedload(self.model.author))
-        stmt = self.filter_query(self.model, stmt, asdict(filters), ordering, pagination.limit, pagination.offset)
-        posts = await session.execute(stmt)
-        return posts.scalars().all()
+            pagination: Pagination,
+            view: PostView = PostView.FULL,
+    ) -> Page[PostModel | Row]:
+        """
+        One page of posts with their authors.
+
+        The summary view selects plain columns with an excerpt computed in SQL, so the full
+        content never leaves the database. Its items are rows rather than ``PostModel`` objects.
+        """
+        filters = asdict(filters)
+        search = filters.pop("search", None)
+        rank = headline = columns = None
+        if search:
+            query = func.websearch_to_tsquery(SEARCH_CONFIG, search)
+            rank = func.ts_rank(self.model.search_vector, query, type_=sqlalchemy.Float)
+            headline = func.ts_headline(SEARCH_CONFIG, self.model.content, query, HEADLINE_OPTIONS)
+            ordering, columns = ordering or ["-rank"], {"rank": rank}
+
+        if view is not PostView.SUMMARY:
+            stmt = select(self.model).options(joinedload(self.model.author))
+            if search:
+                stmt = stmt.where(self.model.search_vector.bool_op("@@")(query)).options(
+                    with_expression(self.model.rank, rank),
+                    with_expression(self.model.headline, headline),
+                )
+            return await self.paginate(session, stmt, filters, ordering, pagination, columns=columns)
+
+        stmt = self.summary_query(ordering, rank, headline)
+        if search:
+            stmt = stmt.where(self.model.search_vector.bool_op("@@")(query))
+        stmt, ordering = self.paginate_query(stmt, filters, ordering, pagination, columns)
+        result = await session.execute(stmt)
+        return self.to_page(result.all(), ordering, pagination)
+
+    def summary_query(
+            self,
+            ordering: list[str] | None = None,
+            rank: ColumnElement | None = None,
+            headline: ColumnElement | None = None,
+    ) -> Select:
+        """Select summary columns and an ``excerpt``, plus the ordering columns the next cursor is read from."""
+        names = {*SUMMARY_COLUMNS, *(value.lstrip("-") for value in ordering or [])}
+        author = aliased(UserModel, name="author")
+        return select(
+            *(column for name, column in self.model.__table__.columns.items() if name in names),
+            func.left(self.model.content, EXCERPT_LENGTH).label("excerpt"),
+            author,
+            # always present, looking up a missing attribute on a row is slow
+            (rank if rank is not None else null()).label("rank"),
+            (headline if headline is not None else null()).label("headline"),
+        ).join(self.model.author.of_type(author))
+
+    async def stream_posts_with_author(
+            self,
+            session: AsyncSession,
+            filters: PostFilter,
+            batch_size: int = 1000,
+    ) -> AsyncIterator[Sequence[PostModel]]:
+        """
+        Yield every post matching ``filters`` in ``id`` order, ``batch_size`` rows at a time.
+
+        Rows are read from a server-side cursor, so memory does not grow with the table.
+        """
+        stmt = select(self.model).options(joinedload(self.model.author).raiseload("*"), raiseload("*"))
+        filters = asdict(filters)
+        search = filters.pop("search", None)
+        if search:
+            query = func.websearch_to_tsquery(SEARCH_CONFIG, search)
+            stmt = stmt.where(self.model.search_vector.bool_op("@@")(query))
+        stmt = self.filter_query(self.model, stmt, filters, ["id"], limit=None)
+        result = await session.stream_scalars(stmt, execution_options={"yield_per": batch_size})
+        async for partition in result.partitions():
+            yield partition
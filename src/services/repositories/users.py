@@ -1,5 +1,6 @@
+from core.config.constansts import UserRole
 from db.models import UserModel, UserSettingsModel
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.errors import ResourceNotFoundError
@@ -17,6 +18,17 @@ class UserRepository(PgRepositoryMixin):
             raise ResourceNotFoundError(detail=f"User not found with username {username}")
         return user
 
+    async def set_role(self, session: AsyncSession, user_id: int, role: UserRole) -> None:
+        """Change the role, and bump ``token_version`` so the tokens issued for the old one stop working."""
+        stmt = (
+            update(self.model)
+            .where(self.model.id == user_id)
+            .values(role=role, token_version=self.model.token_version + 1)
+            .returning(self.model.id)
+        )
+        if (await session.execute(stmt)).scalar_one_or_none() is None:
+            raise ResourceNotFoundError(detail=f"User not found with id {user_id}")
+
     @staticmethod
     async def create_with_settings(
             session: AsyncSession,
@@ -26,7 +38,7 @@ class UserRepository(PgRepositoryMixin):
         await session.flush()
         settings = UserSettingsModel(user_id=user.id)
         session.add(settings)
-        await session.commit()
+        await session.flush()
         return user
 
 
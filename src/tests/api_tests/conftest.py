@@ -1,5 +1,8 @@
+import asyncio
+
 import pytest
 from core.config import MainSettings
+from db import NotificationListener
 from httpx import AsyncClient
 from services.oauth import JwtAuthService
 
@@ -16,3 +19,9 @@ def login_client(client: AsyncClient, user_id: int, get_jwt_service: JwtAuthServ
 
 def logout_client(client: AsyncClient):
     client.headers.pop("Authorization")
+
+
+async def listening(listener: NotificationListener) -> None:
+    # subscribers are cut off whenever listening starts
+    while not listener.connected:
+        await asyncio.sleep(0.01)
@@ -0,0 +1,92 @@
+import logging
+
+import pytest
+from core.config.constansts import UserRole
+from db import Database
+from db.query_log import is_plain_read
+from factories import UserFactory
+from fastapi import FastAPI
+from httpx import AsyncClient
+from services.oauth import JwtAuthService
+from services.repositories.users import UserRepository
+from starlette import status
+from web.api.admin import query_stats_url_name
+from web.api.posts import get_post_url_name, list_posts_url_name
+
+from api_tests.conftest import login_client
+
+
+@pytest.mark.anyio
+class TestAdminAPI:
+    repository = UserRepository()
+
+    async def test_query_stats_permission_denied(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        response = await async_client.get(fastapi_app.url_path_for(query_stats_url_name))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    async def test_query_stats(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+            caplog: pytest.LogCaptureFixture,
+    ):
+        async with database_connect.unit_of_work() as session:
+            admin = await self.repository.create(session, UserFactory(id=None, role=UserRole.ADMIN))
+        login_client(async_client, admin.id, get_jwt_service)
+        query_log = fastapi_app.state.db.query_log
+        # every statement is slow
+        query_log.threshold = 0
+
+        with caplog.at_level(logging.WARNING, logger="db.query_log"):
+            for author_id in (1, 2):
+                response = await async_client.get(
+                    fastapi_app.url_path_for(list_posts_url_name), params={"author_id": author_id},
+                )
+                assert response.status_code == status.HTTP_200_OK
+                await async_client.get(fastapi_app.url_path_for(get_post_url_name, post_id=author_id))
+            await query_log.wait_for_explain()
+        assert f"in GET {fastapi_app.url_path_for(list_posts_url_name)}" in caplog.text
+        assert "parameters (int" in caplog.text
+        assert "Buffers: shared" in caplog.text
+
+        response = await async_client.get(fastapi_app.url_path_for(query_stats_url_name), params={"limit": 50})
+        assert response.status_code == status.HTTP_200_OK
+        stats = response.json()
+        totals = [item["total_seconds"] for item in stats]
+        assert totals == sorted(totals, reverse=True)
+        # both pages share one normalized statement
+        posts = [
+            item for item in stats
+            if "FROM posts LEFT OUTER JOIN users" in item["statement"] and "LIMIT" in item["statement"]
+        ]
+        assert [item["calls"] for item in posts] == [2]
+        assert "$1" not in posts[0]["statement"]
+        assert any(item["plan"] for item in stats)
+        # requests are named by route, not by path
+        origins = {item["last_slow_origin"] for item in stats}
+        assert "GET /api/v1/posts/{post_id}" in origins
+        assert not any(origin and origin.endswith(("/1", "/2")) for origin in origins)
+
+
+@pytest.mark.parametrize(("statement", "explained"), [
+    ("SELECT posts.id FROM posts WHERE posts.id = ?", True),
+    ("WITH page AS (SELECT comments.id FROM comments) SELECT page.id FROM page", True),
+    ("WITH written AS (UPDATE posts SET title=? WHERE posts.id = ? RETURNING posts.id) SELECT written.id FROM written", False),
+    ("WITH target AS (SELECT posts.id FROM posts), written AS (DELETE FROM posts RETURNING posts.id) SELECT ?", False),
+    ("SELECT posts.id FROM posts WHERE posts.id IN (...) FOR KEY SHARE", False),
+    ("INSERT INTO posts (title) VALUES (?)", False),
+    ("SELECT posts.updated_at FROM posts", True),
+])
+def test_only_plain_reads_are_explained(statement: str, explained: bool):
+    assert is_plain_read(statement) is explained
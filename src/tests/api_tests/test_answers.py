@@ -0,0 +1,390 @@
+import asyncio
+import contextlib
+from datetime import datetime, time, timedelta
+from typing import Sequence
+
+import pytest
+from core.config import MainSettings
+from db import Database, NotificationListener
+from db.models import (
+    AnswerJobModel,
+    CommentModel,
+    GeneratedAnswerModel,
+    UserSettingsModel,
+)
+from factories import PostFactory, UserFactory
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+from services.answers import (
+    AnswerCache,
+    AnswerPipeline,
+    AnswerPrompt,
+    BatchingBackend,
+    GenerationBackend,
+    StubGenerationBackend,
+    normalize_comment,
+)
+from services.comment_feed import CommentFeed
+from services.hub import Hub
+from services.oauth import JwtAuthService
+from services.repositories.answer_jobs import AnswerJobRepository
+from services.repositories.users import UserRepository
+from sqlalchemy import select, update
+from web.api.comments import (
+    comment_answer_stream_url_name,
+    comment_bulk_create_url_name,
+    comment_create_url_name,
+)
+
+from api_tests.conftest import listening, login_client
+
+AUTHOR_ID, COMMENTER_ID, POST_ID = 1, 2, 1
+
+
+@pytest.fixture(scope="function")
+async def create_test_data(database_connect: Database, async_client: AsyncClient, get_jwt_service: JwtAuthService):
+    repository = UserRepository()
+    async with database_connect.unit_of_work() as session:
+        author = await repository.create_with_settings(session, UserFactory(id=None))
+        commenter = await repository.create_with_settings(session, UserFactory(id=None))
+        await session.execute(
+            update(UserSettingsModel)
+            .where(UserSettingsModel.user_id == author.id)
+            .values(auto_comment_answer=True, auto_answer_delay=time(0))
+        )
+        session.add(PostFactory(author_id=author.id, title="Answers"))
+    login_client(async_client, commenter.id, get_jwt_service)
+
+
+async def get_jobs(database_connect: Database) -> list[AnswerJobModel]:
+    async with database_connect.get_async_session() as session:
+        return list((await session.execute(select(AnswerJobModel).order_by(AnswerJobModel.id))).scalars())
+
+
+async def get_author_comments(database_connect: Database) -> list[str]:
+    async with database_connect.get_async_session() as session:
+        stmt = select(CommentModel.content).where(CommentModel.author_id == AUTHOR_ID).order_by(CommentModel.id)
+        return list((await session.execute(stmt)).scalars())
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("create_test_data")
+class TestAnswerPipeline:
+    async def test_comment_is_answered(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        url = fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID)
+        response = await async_client.post(url, json={"content": "Nice post"})
+        assert response.status_code == status.HTTP_201_CREATED
+        [job] = await get_jobs(database_connect)
+        assert job.comment_id == response.json()["id"]
+
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        feed: CommentFeed = fastapi_app.state.comment_feed
+        await listening(fastapi_app.state.notifications)
+        watching = feed.subscribe(POST_ID)
+        assert await pipeline.run_once() == 1
+        await pipeline.drain()
+        assert await get_jobs(database_connect) == []
+        assert await get_author_comments(database_connect) == ['Thank you for your 2-word comment on "Answers"']
+        # watchers of the post see the answer like any other comment
+        created = await asyncio.wait_for(anext(watching), 5)
+        watching.close()
+        assert (created.event, created.comment.author_id) == ("created", AUTHOR_ID)
+        # the answer is the author's own comment, which is never answered
+        assert await pipeline.run_once() == 0
+
+    async def test_only_opted_in_authors_are_answered(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.unit_of_work() as session:
+            session.add(PostFactory(author_id=COMMENTER_ID))
+        response = await async_client.post(
+            fastapi_app.url_path_for(comment_bulk_create_url_name),
+            json={"items": [{"post_id": POST_ID, "content": "First"}, {"post_id": 2, "content": "Own post"}]},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        jobs = await get_jobs(database_connect)
+        assert [job.comment_id for job in jobs] == [response.json()["results"][0]["id"]]
+
+    async def test_failed_answer_is_retried(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        url = fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID)
+        await async_client.post(url, json={"content": "Nice post"})
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+
+        async def generate(prompt):
+            raise RuntimeError("backend is down")
+
+        monkeypatch.setattr(pipeline.backend, "generate", generate)
+        assert await pipeline.run_once() == 1
+        await pipeline.drain()
+        [job] = await get_jobs(database_connect)
+        assert (job.attempts, job.last_error, job.failed_at) == (1, "RuntimeError('backend is down')", None)
+        # backing off
+        assert await pipeline.run_once() == 0
+        assert await get_author_comments(database_connect) == []
+
+    async def test_concurrent_claims_skip_locked_jobs(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        url = fastapi_app.url_path_for(comment_bulk_create_url_name)
+        items = [{"post_id": POST_ID, "content": f"Comment {index}"} for index in range(3)]
+        assert (await async_client.post(url, json={"items": items})).status_code == status.HTTP_200_OK
+
+        repository = AnswerJobRepository()
+        async with database_connect.get_async_session() as first, database_connect.get_async_session() as second:
+            claimed_first = await repository.claim(first, 2, lease=60)
+            # would block on the first claim's row locks without SKIP LOCKED
+            claimed_second = await repository.claim(second, 5, lease=60)
+            await first.commit()
+            await second.commit()
+        assert len(claimed_first) == 2
+        assert len(claimed_second) == 1
+        assert {job.id for job in claimed_first}.isdisjoint(job.id for job in claimed_second)
+
+    async def test_near_identical_comments_share_an_answer(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        prompts = []
+        generate = pipeline.backend.generate
+
+        async def recording_generate(prompt):
+            prompts.append(prompt.comment)
+            return await generate(prompt)
+
+        monkeypatch.setattr(pipeline.backend, "generate", recording_generate)
+        url = fastapi_app.url_path_for(comment_bulk_create_url_name)
+        items = [{"post_id": POST_ID, "content": content} for content in ("Great post!", "great  POST", "Why?")]
+        assert (await async_client.post(url, json={"items": items})).status_code == status.HTTP_200_OK
+        assert await pipeline.run_once() == 3
+        await pipeline.drain()
+        # one of the two great posts waits for the answer to the other
+        assert len(prompts) == 2 and "Why?" in prompts
+
+        # and later ones find it in the table
+        url = fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID)
+        await async_client.post(url, json={"content": "GREAT post."})
+        assert await pipeline.run_once() == 1
+        await pipeline.drain()
+        assert len(prompts) == 2
+        answers = await get_author_comments(database_connect)
+        assert len(answers) == 4 and len(set(answers)) == 2
+        assert (pipeline.cache.stats.hits, pipeline.cache.stats.misses) == (2, 2)
+
+    async def test_answer_cache_is_pruned(self, fastapi_app: FastAPI, database_connect: Database):
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        now = datetime.utcnow()
+        async with database_connect.unit_of_work() as session:
+            session.add(GeneratedAnswerModel(key=b"expired", content="", created_at=now - timedelta(days=2)))
+            for index in range(3):
+                session.add(GeneratedAnswerModel(key=b"%d" % index, content="", used_at=now - timedelta(minutes=index)))
+        pipeline.cache.max_size = 2
+        await pipeline.prune_cache()
+        async with database_connect.get_async_session() as session:
+            keys = (await session.execute(select(GeneratedAnswerModel.key))).scalars()
+            assert sorted(keys) == [b"0", b"1"]
+        assert pipeline.cache.size == 2
+
+    async def test_answer_is_streamed_to_readers(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        streamed = []
+        stream = pipeline.backend.stream
+
+        def recording_stream(prompt):
+            streamed.append(prompt.comment)
+            return stream(prompt)
+
+        monkeypatch.setattr(pipeline.backend, "stream", recording_stream)
+        await listening(fastapi_app.state.notifications)
+        readers = [pipeline.subscribe(POST_ID), pipeline.subscribe(POST_ID)]
+        url = fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID)
+        comment_id = (await async_client.post(url, json={"content": "Nice post"})).json()["id"]
+        assert await pipeline.run_once() == 1
+        await pipeline.drain()
+        for reader in readers:
+            reader.close()
+
+        # both readers follow the same generation
+        assert streamed == ["Nice post"]
+        first, second = [[event async for event in reader] for reader in readers]
+        assert first == second
+        *chunks, done = first
+        [answer] = await get_author_comments(database_connect)
+        assert len(chunks) > 1 and {event.event for event in chunks} == {"chunk"}
+        assert "".join(event.text for event in chunks) == answer
+        assert (done.event, done.comment_id, done.text) == ("done", comment_id, answer)
+
+    async def test_answer_stream_endpoint(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        await async_client.post(
+            fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID), json={"content": "Nice post"},
+        )
+        # the test client buffers whole responses, so the stream is read at the ASGI level
+        disconnected, started, body = asyncio.Event(), [], bytearray()
+
+        async def receive():
+            if not started:
+                started.append(True)
+                return {"type": "http.request", "body": b""}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.append(message)
+            body.extend(message.get("body", b""))
+            if b"event: done" in body:
+                disconnected.set()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": fastapi_app.url_path_for(comment_answer_stream_url_name, post_id=POST_ID),
+            "query_string": b"", "root_path": "", "server": ("test", 80), "client": ("test", 1),
+            "headers": [(name.encode(), value.encode()) for name, value in async_client.headers.items()],
+        }
+        await listening(fastapi_app.state.notifications)
+        request = asyncio.create_task(fastapi_app(scope, receive, send))
+        while not pipeline.hub.subscribers(POST_ID):
+            await asyncio.sleep(0.01)
+        assert await pipeline.run_once() == 1
+        await pipeline.drain()
+        await asyncio.wait_for(request, 5)
+
+        start = started[1]
+        assert start["status"] == status.HTTP_200_OK
+        assert (b"content-type", b"text/event-stream; charset=utf-8") in start["headers"]
+        assert body.startswith(b"event: chunk\ndata: {")
+        assert b'"event":"done"' in body
+        assert pipeline.hub.subscribers() == 0
+
+    async def test_answers_are_relayed_to_other_processes(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            get_test_settings: MainSettings,
+            database_connect: Database,
+    ):
+        pipeline: AnswerPipeline = fastapi_app.state.answer_pipeline
+        # another worker, with a database connection of its own to listen on
+        listener = NotificationListener(database_connect.url, get_test_settings.db.LISTEN_KEEPALIVE)
+        elsewhere = AnswerPipeline(database_connect, StubGenerationBackend(), get_test_settings.answers, listener)
+        listening_elsewhere = asyncio.create_task(listener.run())
+        try:
+            await asyncio.wait_for(listening(fastapi_app.state.notifications), 5)
+            await asyncio.wait_for(listening(listener), 5)
+            here, there = pipeline.subscribe(POST_ID), elsewhere.subscribe(POST_ID)
+            url = fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID)
+            comment_id = (await async_client.post(url, json={"content": "Nice post"})).json()["id"]
+            assert await pipeline.run_once() == 1
+            await pipeline.drain()
+
+            # the other worker streamed nothing, its readers learn the answer is posted
+            relayed = await asyncio.wait_for(anext(there), 5)
+            [answer] = await get_author_comments(database_connect)
+            assert (relayed.event, relayed.comment_id, relayed.text) == ("done", comment_id, "")
+            async with database_connect.get_async_session() as session:
+                content = (await session.execute(
+                    select(CommentModel.content).where(CommentModel.id == relayed.answer_id)
+                )).scalar_one()
+            assert content == answer
+            # the worker that answered publishes its own answer once
+            here.close()
+            assert [event.event async for event in here].count("done") == 1
+        finally:
+            listening_elsewhere.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await listening_elsewhere
+
+
+@pytest.mark.anyio
+async def test_slow_reader_is_cut_off():
+    hub: Hub[int, str] = Hub()
+    slow, fast = hub.subscribe(1, max_buffer=2), hub.subscribe(1, max_buffer=10)
+    assert [hub.publish(1, message) for message in "abc"] == [2, 2, 1]
+    assert (slow.missed, fast.missed, hub.overflows, hub.subscribers(1)) == (True, False, 1, 1)
+    fast.close()
+    # the slow reader still gets what it buffered, then its stream ends
+    assert [message async for message in slow] == ["a", "b"]
+    assert [message async for message in fast] == ["a", "b", "c"]
+    assert hub.subscribers() == 0
+
+
+def test_answer_cache_key():
+    cache = AnswerCache({"backend": "stub"}, ttl=60, max_size=10)
+    key = cache.key(POST_ID, AnswerPrompt(post_title="Answers", comment="Great post!"))
+    assert cache.key(POST_ID, AnswerPrompt(post_title="Answers", comment="great  POST")) == key
+    # the answer quotes the title, a renamed post is answered anew
+    assert cache.key(POST_ID, AnswerPrompt(post_title="Renamed", comment="Great post!")) != key
+    assert cache.key(2, AnswerPrompt(post_title="Answers", comment="Great post!")) != key
+
+
+def test_normalize_comment():
+    assert normalize_comment("  Great,  POST!! ") == normalize_comment("great post") == "great post"
+    assert normalize_comment("ﬁne") == "fine"
+    # nothing but punctuation is kept as written
+    assert normalize_comment(" 👍 ") == "👍"
+
+
+class RecordingBackend(GenerationBackend):
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    async def generate_many(self, prompts: Sequence[AnswerPrompt]) -> list[str]:
+        self.calls.append([prompt.comment for prompt in prompts])
+        if any(prompt.comment == "fail" for prompt in prompts):
+            raise RuntimeError("backend is down")
+        await asyncio.sleep(0)
+        return [prompt.comment.upper() for prompt in prompts]
+
+
+@pytest.mark.anyio
+async def test_batching_backend_groups_concurrent_prompts():
+    inner, batches = RecordingBackend(), []
+    backend = BatchingBackend(
+        inner, max_batch_size=3, max_wait=0.01, max_concurrent_batches=1, max_pending=10, on_batch=batches.append,
+    )
+    comments = ["a", "b", "c", "d", "a"]
+    answers = await asyncio.gather(*(backend.generate(AnswerPrompt("Post", comment)) for comment in comments))
+    assert answers == ["A", "B", "C", "D", "A"]
+    # the second "a" shares the pending answer, "d" goes out once the wait is over
+    assert inner.calls == [["a", "b", "c"], ["d"]]
+    assert backend.coalesced == 1
+    assert [stats.size for stats in batches] == [3, 1]
+    assert backend.pending == 0
+
+    results = await asyncio.gather(
+        *(backend.generate(AnswerPrompt("Post", comment)) for comment in ("fail", "e")), return_exceptions=True,
+    )
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+    assert (batches[-1].size, batches[-1].failed) == (2, True)
+    await backend.close()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+
+import pytest
+from db import Database
+from factories import PostFactory, UserFactory
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+from services.comment_feed import CommentFeed
+from services.oauth import JwtAuthService
+from sqlalchemy import text
+from web.api.comments import (
+    BEARER_SUBPROTOCOL,
+    comment_bulk_create_url_name,
+    comment_bulk_delete_url_name,
+    comment_bulk_update_url_name,
+    comment_create_url_name,
+    comment_delete_url_name,
+    comment_feed_url_name,
+    comment_update_url_name,
+)
+
+from api_tests.conftest import listening, login_client, logout_client
+
+POST_ID = 1
+
+
+@pytest.fixture(scope="function")
+async def create_test_data(database_connect: Database, async_client: AsyncClient, get_jwt_service: JwtAuthService):
+    async with database_connect.unit_of_work() as session:
+        user = UserFactory(id=None)
+        session.add(user)
+        await session.flush()
+        session.add(PostFactory(author_id=user.id, title="Live"))
+    login_client(async_client, user.id, get_jwt_service)
+
+
+class Watcher:
+    """A WebSocket client driven at the ASGI level, the test client has no WebSocket support."""
+
+    def __init__(
+            self,
+            app: FastAPI,
+            client: AsyncClient,
+            post_id: int,
+            subprotocols: list[str] | None = None,
+            query_string: bytes = b"",
+    ):
+        self.messages: asyncio.Queue[dict] = asyncio.Queue()
+        self.incoming: asyncio.Queue[dict] = asyncio.Queue()
+        self.incoming.put_nowait({"type": "websocket.connect"})
+        scope = {
+            "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "subprotocols": subprotocols or [],
+            "path": app.url_path_for(comment_feed_url_name, post_id=post_id),
+            "query_string": query_string, "root_path": "", "server": ("test", 80), "client": ("test", 1),
+            "headers": [(name.encode(), value.encode()) for name, value in client.headers.items()],
+        }
+        self.task = asyncio.create_task(app(scope, self.incoming.get, self.messages.put))
+
+    async def receive(self) -> dict:
+        return await asyncio.wait_for(self.messages.get(), 5)
+
+    async def event(self) -> dict:
+        message = await self.receive()
+        assert message["type"] == "websocket.send"
+        return json.loads(message["text"])
+
+    async def disconnect(self) -> None:
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        await asyncio.wait_for(self.task, 5)
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("create_test_data")
+class TestCommentFeed:
+    async def test_changes_are_pushed_to_watchers(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        feed: CommentFeed = fastapi_app.state.comment_feed
+        await listening(feed.listener)
+        watchers = [Watcher(fastapi_app, async_client, POST_ID) for _ in range(2)]
+        for watcher in watchers:
+            assert (await watcher.receive())["type"] == "websocket.accept"
+        assert feed.hub.subscribers(POST_ID) == 2
+
+        response = await async_client.post(
+            fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID), json={"content": "First"},
+        )
+        comment_id = response.json()["id"]
+        await async_client.patch(
+            fastapi_app.url_path_for(comment_update_url_name, comment_id=comment_id), json={"content": "Edited"},
+        )
+        response = await async_client.delete(fastapi_app.url_path_for(comment_delete_url_name, comment_id=comment_id))
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        for watcher in watchers:
+            created, updated, deleted = [await watcher.event() for _ in range(3)]
+            assert (created["event"], created["post_id"], created["comment_id"]) == ("created", POST_ID, comment_id)
+            assert created["comment"]["content"] == "First"
+            assert "username" in created["comment"]["author"]
+            assert (updated["event"], updated["comment"]["content"]) == ("updated", "Edited")
+            assert (deleted["event"], deleted["comment_id"], deleted["comment"]) == ("deleted", comment_id, None)
+            await watcher.disconnect()
+        assert feed.hub.subscribers() == 0
+
+    async def test_bulk_changes_are_pushed_to_watchers(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        feed: CommentFeed = fastapi_app.state.comment_feed
+        await listening(feed.listener)
+        subscription = feed.subscribe(POST_ID)
+
+        async def events(count: int) -> list[tuple[str, int, str | None]]:
+            # read as they come, a comment deleted before it was loaded is only reported deleted
+            received = [await asyncio.wait_for(anext(subscription), 5) for _ in range(count)]
+            return [(event.event, event.comment_id, event.comment and event.comment.content) for event in received]
+
+        items = [{"post_id": POST_ID, "content": "First"}, {"post_id": POST_ID, "content": "Second"}]
+        response = await async_client.post(fastapi_app.url_path_for(comment_bulk_create_url_name), json={"items": items})
+        first, second = [result["id"] for result in response.json()["results"]]
+        assert await events(2) == [("created", first, "First"), ("created", second, "Second")]
+        await async_client.patch(
+            fastapi_app.url_path_for(comment_bulk_update_url_name), json={"items": [{"id": first, "content": "Edited"}]},
+        )
+        assert await events(1) == [("updated", first, "Edited")]
+        await async_client.post(fastapi_app.url_path_for(comment_bulk_delete_url_name), json={"ids": [first, second]})
+        assert await events(2) == [("deleted", first, None), ("deleted", second, None)]
+        subscription.close()
+
+    async def test_unauthenticated_watcher_is_refused(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        logout_client(async_client)
+        watcher = Watcher(fastapi_app, async_client, POST_ID)
+        message = await watcher.receive()
+        assert (message["type"], message["code"]) == ("websocket.close", status.WS_1008_POLICY_VIOLATION)
+        await asyncio.wait_for(watcher.task, 5)
+
+    async def test_browsers_authenticate_with_a_subprotocol(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        token = async_client.headers["Authorization"].removeprefix("Bearer ")
+        logout_client(async_client)
+        # tokens in the URL end up in access logs, they are not accepted
+        watcher = Watcher(fastapi_app, async_client, POST_ID, query_string=f"token={token}".encode())
+        assert (await watcher.receive())["code"] == status.WS_1008_POLICY_VIOLATION
+        await asyncio.wait_for(watcher.task, 5)
+
+        watcher = Watcher(fastapi_app, async_client, POST_ID, subprotocols=[BEARER_SUBPROTOCOL, token])
+        # the token is not echoed back
+        assert await watcher.receive() == {"type": "websocket.accept", "subprotocol": BEARER_SUBPROTOCOL, "headers": []}
+        await watcher.disconnect()
+
+    async def test_watching_a_missing_post_is_refused(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        feed: CommentFeed = fastapi_app.state.comment_feed
+        watcher = Watcher(fastapi_app, async_client, POST_ID + 1)
+        message = await watcher.receive()
+        assert (message["type"], message["code"]) == ("websocket.close", status.WS_1008_POLICY_VIOLATION)
+        assert "not found" in message["reason"]
+        await asyncio.wait_for(watcher.task, 5)
+        assert feed.hub.subscribers() == 0
+
+    async def test_watchers_resync_after_the_listener_reconnects(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        feed: CommentFeed = fastapi_app.state.comment_feed
+        await listening(feed.listener)
+        watcher = Watcher(fastapi_app, async_client, POST_ID)
+        assert (await watcher.receive())["type"] == "websocket.accept"
+        async with database_connect.get_async_session() as session:
+            await session.execute(text(
+                "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                "WHERE pid <> pg_backend_pid() AND query LIKE 'LISTEN %'"
+            ))
+
+        # changes made while nobody listened are lost, the watcher is told to reload
+        assert await watcher.event() == {"event": "resync"}
+        await asyncio.wait_for(listening(feed.listener), 10)
+        assert feed.listener.connects == 2
+        await async_client.post(
+            fastapi_app.url_path_for(comment_create_url_name, post_id=POST_ID), json={"content": "Back"},
+        )
+        assert (await watcher.event())["comment"]["content"] == "Back"
+        await watcher.disconnect()
@@ -3,12 +3,19 @@ from db import Database
 from factories import CommentFactory, PostFactory, UserFactory
 from fastapi import FastAPI, status
 from httpx import AsyncClient
+from schemas.comments import OutputCommentSchema
 from services.oauth import JwtAuthService
 from web.api.comments import (
+    comment_bulk_create_url_name,
+    comment_bulk_delete_url_name,
+    comment_bulk_update_url_name,
     comment_create_url_name,
     comment_list_url_name,
     comment_update_url_name,
+    get_comments,
 )
+from web.dependencies.filters import NEXT_CURSOR_HEADER
+from web.middlewares import QueryBudgetExceededError
 
 from api_tests.conftest import login_client, logout_client
 
@@ -50,6 +57,106 @@ class TestCommentAPI:
         assert response.status_code == status.HTTP_200_OK
         response_data = response.json()
         assert len(response_data) == 2
+        assert list(response_data[0]) == list(OutputCommentSchema.model_fields)
+
+    async def test_get_comments_query_budget(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        url = fastapi_app.url_path_for(comment_list_url_name, post_id=1)
+        # the first request also loads the authenticated user
+        assert (await async_client.get(url)).status_code == status.HTTP_200_OK
+        # comments come with their authors in one statement, their posts are never loaded
+        monkeypatch.setattr(get_comments, "query_budget", 1)
+        assert (await async_client.get(url)).status_code == status.HTTP_200_OK
+        monkeypatch.setattr(get_comments, "query_budget", 0)
+        with pytest.raises(QueryBudgetExceededError, match="ran 1 SQL statements, its budget is 0"):
+            await async_client.get(url)
+
+    async def test_get_comments_conditional(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(comment_list_url_name, post_id=1)
+        etag = (await async_client.get(url)).headers["ETag"]
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        await async_client.post(fastapi_app.url_path_for(comment_create_url_name, post_id=1), json={"content": "New"})
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 3
+
+    async def test_get_comments_cursor_pagination(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(comment_list_url_name, post_id=1)
+        response = await async_client.get(url, params={"limit": 1})
+        assert response.status_code == status.HTTP_200_OK
+        first_page = response.json()
+        assert len(first_page) == 1
+
+        response = await async_client.get(url, params={"limit": 1, "cursor": response.headers[NEXT_CURSOR_HEADER]})
+        assert response.status_code == status.HTTP_200_OK
+        second_page = response.json()
+        assert [comment["id"] for comment in first_page + second_page] == [1, 2]
+
+    async def test_get_comments_ordering(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(comment_list_url_name, post_id=1)
+        response = await async_client.get(url, params={"order_by": "-created_at"})
+        assert response.status_code == status.HTTP_200_OK
+        assert [comment["id"] for comment in response.json()] == [2, 1]
+
+    async def test_get_comments_for_post_without_comments(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            post = PostFactory(author_id=1)
+            session.add(post)
+            await session.commit()
+        response = await async_client.get(fastapi_app.url_path_for(comment_list_url_name, post_id=post.id))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == []
+        assert NEXT_CURSOR_HEADER not in response.headers
+
+    async def test_bulk_create_comments(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(comment_bulk_create_url_name)
+        items = [{"post_id": 1, "content": "First"}, {"post_id": 999, "content": "Lost"}, {"post_id": 1, "content": "Last"}]
+        response = await async_client.post(url, json={"items": items})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [201, 404, 201]
+        assert [results[0]["item"]["content"], results[2]["item"]["content"]] == ["First", "Last"]
+
+    async def test_bulk_update_and_delete_comments(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(comment_bulk_update_url_name)
+        response = await async_client.patch(url, json={"items": [{"id": 1, "content": "Edited"}, {"id": 2, "content": "Edited"}]})
+        assert [result["status"] for result in response.json()["results"]] == [200, 403]
+
+        # the post author may delete every comment on the post
+        url = fastapi_app.url_path_for(comment_bulk_delete_url_name)
+        response = await async_client.post(url, json={"ids": [1, 2, 999]})
+        assert [result["status"] for result in response.json()["results"]] == [204, 204, 404]
 
     async def test_get_comments_for_non_existing_post(
             self,
@@ -0,0 +1,53 @@
+import pytest
+from db import Database
+from factories import UserFactory
+from fastapi import FastAPI
+from httpx import AsyncClient
+from prometheus_client.parser import text_string_to_metric_families
+from services.oauth import JwtAuthService
+from services.repositories.users import UserRepository
+from starlette import status
+from web.api.metrics import metrics_url_name
+from web.api.users import me_url_name
+
+from api_tests.conftest import login_client
+
+
+async def scrape(async_client: AsyncClient, fastapi_app: FastAPI) -> dict[tuple[str, frozenset], float]:
+    response = await async_client.get(fastapi_app.url_path_for(metrics_url_name))
+    assert response.status_code == status.HTTP_200_OK
+    return {
+        (sample.name, frozenset(sample.labels.items())): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+@pytest.mark.anyio
+class TestMetricsAPI:
+    repository = UserRepository()
+
+    async def test_metrics(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        route = fastapi_app.url_path_for(me_url_name)
+        requests = ("http_requests_total", frozenset({"method": "GET", "route": route, "status": "200"}.items()))
+
+        before = await scrape(async_client, fastapi_app)
+        for _ in range(3):
+            assert (await async_client.get(route)).status_code == status.HTTP_200_OK
+        after = await scrape(async_client, fastapi_app)
+
+        assert after[requests] - before.get(requests, 0) == 3
+        auth = frozenset({"cache": "auth"}.items())
+        assert after[("cache_hits_total", auth)] - before.get(("cache_hits_total", auth), 0) == 2
+        assert after[("cache_hit_ratio", auth)] == fastapi_app.state.auth_cache.stats.hit_ratio
+        assert after[("db_pool_checkouts_total", frozenset())] > before.get(("db_pool_checkouts_total", frozenset()), 0)
+        assert ("db_pool_checked_out", frozenset()) in after
@@ -56,3 +56,14 @@ class TestAuthAPI:
         assert response_data["username"] == data_login["username"]
         assert response_data["access_token"]
         assert response_data["refresh_token"]
+
+    async def test_login_password_hasher_saturated(self, async_client: AsyncClient, fastapi_app: FastAPI):
+        await self.test_register(async_client, fastapi_app)
+        fastapi_app.state.password_hasher.max_pending = 0
+        url = fastapi_app.url_path_for(login_url_name)
+        response = await async_client.post(url, json={
+            "username": self.test_user.username,
+            "password": self.user_password,
+        })
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "1"
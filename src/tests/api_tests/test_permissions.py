@@ -0,0 +1,78 @@
+import pytest
+from core.config.constansts import UserRole
+from db import Database
+from db.models import CommentModel, PostModel, UserSettingsModel
+from factories import CommentFactory, PostFactory, UserFactory
+from services.errors import PermissionDeniedError, ResourceNotFoundError
+from services.oauth import AuthUser
+from services.permissions import (
+    OBJECT_PERMISSION_TABLE,
+    check_object_permission,
+    get_object_permission_clause,
+)
+from services.permissions.base import OperationPermission
+from services.repositories.users import UserSettingsRepository
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+OBJECT_OPERATIONS = {
+    PostModel: [OperationPermission.Post.can_update, OperationPermission.Post.can_delete, OperationPermission.Post.can_view],
+    CommentModel: [OperationPermission.Comment.can_update, OperationPermission.Comment.can_delete],
+}
+
+
+@pytest.mark.anyio
+async def test_permission_clauses_agree_with_checks(database_connect: Database):
+    assert {model.__tablename__ for model in OBJECT_OPERATIONS} <= set(OBJECT_PERMISSION_TABLE)
+    async with database_connect.unit_of_work() as session:
+        post_author, commenter, other = UserFactory(id=None), UserFactory(id=None), UserFactory(id=None)
+        admin = UserFactory(id=None, role=UserRole.ADMIN)
+        session.add_all([post_author, commenter, other, admin])
+        await session.flush()
+        post = PostFactory(author_id=post_author.id)
+        session.add(post)
+        await session.flush()
+        session.add(CommentFactory(author_id=commenter.id, post_id=post.id))
+    users = [AuthUser(id=user.id, role=user.role, settings=None) for user in (post_author, commenter, other, admin)]
+
+    decisions = set()
+    async with database_connect.get_async_session() as session:
+        items = {
+            PostModel: (await session.execute(select(PostModel))).scalar_one(),
+            CommentModel: (
+                await session.execute(select(CommentModel).options(joinedload(CommentModel.post)))
+            ).scalar_one(),
+        }
+        for model, operations in OBJECT_OPERATIONS.items():
+            for operation in operations:
+                for user in users:
+                    try:
+                        check_object_permission(operation, user, items[model])
+                        allowed = True
+                    except PermissionDeniedError:
+                        allowed = False
+                    clause = get_object_permission_clause(operation, user, model)
+                    matched = (await session.execute(select(model.id).where(clause))).scalar_one_or_none()
+                    assert allowed == (matched is not None), (operation, user)
+                    decisions.add(allowed)
+    assert decisions == {True, False}
+
+
+@pytest.mark.anyio
+async def test_update_returning_without_changes(database_connect: Database):
+    repository = UserSettingsRepository()
+    async with database_connect.unit_of_work() as session:
+        user = UserFactory(id=None)
+        session.add(user)
+        await session.flush()
+        session.add(UserSettingsModel(user_id=user.id))
+        await session.flush()
+        settings_id = (await session.execute(select(UserSettingsModel.id))).scalar_one()
+
+        # user_settings has no updated_at, so nothing is written
+        found = await repository.update_returning(session, settings_id, {})
+        assert found.user_id == user.id
+        with pytest.raises(PermissionDeniedError):
+            await repository.update_returning(session, settings_id, {}, where=UserSettingsModel.user_id != user.id)
+        with pytest.raises(ResourceNotFoundError):
+            await repository.update_returning(session, settings_id + 1, {})
@@ -1,23 +1,41 @@
+import asyncio
+import contextlib
+import json
 import random
+from datetime import datetime
 
 import pytest
-from db import Database
+from core.config import MainSettings
+from db import Database, NotificationListener
 from db.models import PostModel, UserModel
-from factories import PostFactory, UserFactory
+from factories import CommentFactory, PostFactory, UserFactory
 from fastapi import FastAPI
 from httpx import AsyncClient
+from schemas.bulk import BULK_MAX_ITEMS
+from schemas.posts import PostListItemSchema, PostSummarySchema, PostWithAuthorSchema
+from schemas.users import OutputUserSchema
+from services.cache import InProcessCacheBackend, ObjectCache
 from services.oauth import JwtAuthService
-from sqlalchemy import select
+from services.repositories.posts import EXCERPT_LENGTH
+from services.repositories.users import UserRepository
+from sqlalchemy import event, select
 from starlette import status
 from web.api.posts import (
+    bulk_create_posts_url_name,
+    bulk_delete_posts_url_name,
+    bulk_update_posts_url_name,
     create_post_url_name,
     delete_post_url_name,
+    export_posts_url_name,
     get_post_url_name,
     list_posts_url_name,
     update_post_url_name,
 )
+from web.compression import CompressionPolicy
+from web.dependencies.filters import NEXT_CURSOR_HEADER
+from web.responses import CACHE_STATUS_HEADER
 
-from api_tests.conftest import login_client, logout_client
+from api_tests.conftest import listening, login_client, logout_client
 
 
 @pytest.fixture(scope="function")
@@ -51,6 +69,145 @@ class TestPostsAPI:
     ):
         response = await async_client.get(fastapi_app.url_path_for(list_posts_url_name))
         assert response.status_code == status.HTTP_200_OK
+        post = response.json()[0]
+        assert list(post) == list(PostListItemSchema.model_fields)
+        assert list(post["author"]) == list(OutputUserSchema.model_fields)
+
+    async def test_get_posts_summary(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            session.add(PostFactory(author_id=1, title="Long", content="zymurgy " * 100))
+            await session.commit()
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        statements = []
+
+        def on_execute(conn, cursor, statement, *args) -> None:
+            statements.append(statement)
+
+        engine = fastapi_app.state.db.async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", on_execute)
+        try:
+            response = await async_client.get(url, params={"view": "summary", "order_by": "-id", "limit": 1})
+        finally:
+            event.remove(engine, "before_cursor_execute", on_execute)
+        assert response.status_code == status.HTTP_200_OK
+        post = response.json()[0]
+        assert list(post) == list(PostSummarySchema.model_fields)
+        assert post["excerpt"] == ("zymurgy " * 100)[:EXCERPT_LENGTH]
+        assert "posts.content" not in statements[-1].replace("left(posts.content", "")
+        assert response.headers[NEXT_CURSOR_HEADER]
+
+        found = await async_client.get(url, params={"view": "summary", "q": "zymurgy"})
+        assert [post["title"] for post in found.json()] == ["Long"]
+        assert found.json()[0]["rank"] > 0
+
+        full = await async_client.get(url, params={"order_by": "-id", "limit": 1})
+        assert full.headers[CACHE_STATUS_HEADER] == "MISS"
+        assert full.json()[0]["content"] == "zymurgy " * 100
+
+    async def test_get_posts_page_cache(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        params = {"limit": 3, "order_by": "-id"}
+        first = await async_client.get(url, params=params)
+        second = await async_client.get(url, params=params)
+        assert first.headers[CACHE_STATUS_HEADER] == "MISS"
+        assert second.headers[CACHE_STATUS_HEADER] == "HIT"
+        assert second.content == first.content
+        assert second.headers[NEXT_CURSOR_HEADER] == first.headers[NEXT_CURSOR_HEADER]
+        assert (await async_client.get(url, params={**params, "limit": 4})).headers[CACHE_STATUS_HEADER] == "MISS"
+
+        response = await async_client.post(
+            fastapi_app.url_path_for(create_post_url_name), json={"title": "Fresh", "content": "Fresh"}
+        )
+        response = await async_client.get(url, params=params)
+        assert response.headers[CACHE_STATUS_HEADER] == "MISS"
+        assert response.json()[0]["title"] == "Fresh"
+        assert fastapi_app.state.page_cache.stats.hit_ratio == 0.25
+
+        # pages show authors, so they follow the users table too
+        async with database_connect.unit_of_work() as session:
+            await UserRepository.with_cache(fastapi_app.state.object_cache).invalidate_cached(session, [1])
+        assert (await async_client.get(url, params=params)).headers[CACHE_STATUS_HEADER] == "MISS"
+
+    async def test_caches_of_other_processes_are_invalidated(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            get_test_settings: MainSettings,
+            database_connect: Database,
+    ):
+        # the object cache of another worker, listening on a connection of its own
+        elsewhere = ObjectCache(InProcessCacheBackend(max_size=100, ttl=60))
+        listener = NotificationListener(database_connect.url, get_test_settings.db.LISTEN_KEEPALIVE)
+        elsewhere.listen(listener)
+        listening_elsewhere = asyncio.create_task(listener.run())
+        try:
+            await asyncio.wait_for(listening(listener), 5)
+            async with database_connect.get_async_session() as session:
+                post_id = (await session.execute(select(PostModel.id).where(PostModel.author_id == 1))).scalars().first()
+
+            async def generation_reaches(expected: int) -> None:
+                while await elsewhere.generation("posts") != expected:
+                    await asyncio.sleep(0.01)
+
+            # it cleared what it had when it started listening, it may have missed invalidations
+            await asyncio.wait_for(generation_reaches(1), 5)
+            key = f"posts:{post_id}"
+            await elsewhere.backend.set(key, b"stale")
+            response = await async_client.patch(
+                fastapi_app.url_path_for(update_post_url_name, post_id=post_id), json={"title": "Fresh"},
+            )
+            assert response.status_code == status.HTTP_200_OK
+            await asyncio.wait_for(generation_reaches(2), 5)
+            assert await elsewhere.backend.get(key) is None
+        finally:
+            listening_elsewhere.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await listening_elsewhere
+
+    async def test_get_posts_compressed(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            monkeypatch: pytest.MonkeyPatch,
+    ):
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        plain = await async_client.get(url, headers={"Accept-Encoding": "identity"})
+        assert plain.headers[CACHE_STATUS_HEADER] == "MISS"
+        assert "content-encoding" not in plain.headers
+        assert plain.headers["vary"] == "Accept-Encoding"
+
+        compressed = await async_client.get(url, headers={"Accept-Encoding": "gzip;q=0.5, identity;q=0.1"})
+        assert compressed.headers[CACHE_STATUS_HEADER] == "HIT"
+        assert compressed.headers["content-encoding"] == "gzip"
+        assert compressed.headers["vary"] == "Accept-Encoding"
+        assert int(compressed.headers["content-length"]) < len(plain.content)
+        assert compressed.content == plain.content
+        # the compressed body was stored next to the plain one
+        compress = CompressionPolicy.compress
+        calls = 0
+
+        async def counting_compress(*args):
+            nonlocal calls
+            calls += 1
+            return await compress(*args)
+
+        monkeypatch.setattr(CompressionPolicy, "compress", counting_compress)
+        again = await async_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert again.content == compressed.content
+        assert calls == 0
+
+        small = await async_client.get(url, params={"limit": 1}, headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
 
     async def test_post_by_title(
             self,
@@ -98,6 +255,256 @@ class TestPostsAPI:
         response = await async_client.get(url, params={"order_by": "-id"})
         assert response.status_code == status.HTTP_200_OK
 
+    @pytest.mark.parametrize("order_by", ["-created_at", "id", "-title"])
+    async def test_get_posts_cursor_pagination(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            order_by: str,
+    ):
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        response = await async_client.get(url, params={"limit": 100, "order_by": order_by})
+        expected_ids = [post["id"] for post in response.json()]
+
+        seen_ids, params = [], {"limit": 3, "order_by": order_by}
+        while True:
+            response = await async_client.get(url, params=params)
+            assert response.status_code == status.HTTP_200_OK
+            seen_ids.extend(post["id"] for post in response.json())
+            if NEXT_CURSOR_HEADER not in response.headers:
+                break
+            params = {"limit": 3, "cursor": response.headers[NEXT_CURSOR_HEADER]}
+        assert seen_ids == expected_ids
+
+    async def test_get_posts_invalid_cursor(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        response = await async_client.get(url, params={"cursor": "not-a-cursor"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = await async_client.get(url, params={"limit": 1})
+        cursor = response.headers[NEXT_CURSOR_HEADER]
+        response = await async_client.get(url, params={"cursor": cursor, "order_by": "id"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    async def test_search_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            session.add_all([
+                PostFactory(author_id=1, title="Quantum computing", content="Qubits are not bits."),
+                PostFactory(author_id=1, title="Gardening", content="Quantum effects in photosynthesis."),
+            ])
+            await session.commit()
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        response = await async_client.get(url, params={"q": "quantum"})
+        assert response.status_code == status.HTTP_200_OK
+        response_data = response.json()
+        assert [post["title"] for post in response_data] == ["Quantum computing", "Gardening"]
+        assert response_data[0]["rank"] > response_data[1]["rank"]
+        assert "<mark>Quantum</mark>" in response_data[1]["headline"]
+
+        response = await async_client.get(url, params={"q": "quantum", "limit": 1})
+        assert response.json()[0]["title"] == "Quantum computing"
+        response = await async_client.get(
+            url, params={"q": "quantum", "limit": 1, "cursor": response.headers[NEXT_CURSOR_HEADER]}
+        )
+        assert [post["title"] for post in response.json()] == ["Gardening"]
+
+    @pytest.mark.parametrize("view", ["full", "summary"])
+    async def test_rank_ordering_requires_search(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            view: str,
+    ):
+        async with database_connect.get_async_session() as session:
+            session.add_all([
+                PostFactory(author_id=1, title="Quantum computing"),
+                PostFactory(author_id=1, title="Quantum gardening"),
+            ])
+            await session.commit()
+        url = fastapi_app.url_path_for(list_posts_url_name)
+        response = await async_client.get(url, params={"q": "quantum", "limit": 1, "view": view})
+        cursor = response.headers[NEXT_CURSOR_HEADER]
+        response = await async_client.get(url, params={"q": "quantum", "order_by": ["-rank", "id"], "view": view})
+        assert response.status_code == status.HTTP_200_OK
+
+        for params in ({"order_by": "-rank"}, {"order_by": "content"}, {"cursor": cursor}):
+            response = await async_client.get(url, params={**params, "view": view})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, params
+
+    @pytest.mark.parametrize("gzip", [False, True])
+    async def test_export_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            gzip: bool,
+    ):
+        url = fastapi_app.url_path_for(export_posts_url_name)
+        # without negotiation only the flag decides the encoding
+        response = await async_client.get(url, params={"gzip": gzip}, headers={"Accept-Encoding": "identity"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert response.headers.get("content-encoding") == ("gzip" if gzip else None)
+        posts = [json.loads(line) for line in response.text.splitlines()]
+        assert [post["id"] for post in posts] == list(range(1, 8))
+        assert list(posts[0]) == list(PostWithAuthorSchema.model_fields)
+
+    async def test_export_posts_compressed_stream(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(export_posts_url_name)
+        negotiated = await async_client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert negotiated.headers["content-encoding"] == "gzip"
+        assert "content-length" not in negotiated.headers
+        explicit = await async_client.get(url, params={"gzip": True}, headers={"Accept-Encoding": "gzip"})
+        # the export already gzips itself and must not be encoded twice
+        assert explicit.headers["content-encoding"] == "gzip"
+        assert explicit.text == negotiated.text
+
+    async def test_export_posts_filters(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(export_posts_url_name)
+        response = await async_client.get(url, params={"author_id": 1})
+        assert response.status_code == status.HTTP_200_OK
+        authors = {json.loads(line)["author_id"] for line in response.text.splitlines()}
+        assert authors == {1}
+
+    async def test_bulk_create_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(bulk_create_posts_url_name)
+        items = [{"title": f"Bulk {i}", "content": "Content"} for i in range(3)]
+        response = await async_client.post(url, json={"items": [*items, {"id": 1, "title": "T", "content": "C"}]})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [201, 201, 201, 422]
+        assert [result["item"]["title"] for result in results[:3]] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+        assert all(result["item"]["author_id"] == 1 for result in results[:3])
+
+    async def test_bulk_upsert_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            own = (await session.execute(select(PostModel.id).where(PostModel.author_id == 1))).scalars().first()
+            other = (await session.execute(select(PostModel.id).where(PostModel.author_id != 1))).scalars().first()
+        url = fastapi_app.url_path_for(bulk_create_posts_url_name)
+        items = [
+            {"id": own, "title": "Upserted", "content": "Content"},
+            {"id": other, "title": "Upserted", "content": "Content"},
+            {"id": 10 ** 6, "title": "Upserted", "content": "Content"},
+            {"title": "New", "content": "Content"},
+        ]
+        response = await async_client.post(url, params={"upsert": True}, json={"items": items})
+        assert response.status_code == status.HTTP_200_OK
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [200, 403, 404, 201]
+        assert results[0]["item"]["title"] == "Upserted"
+        assert results[0]["id"] == own
+
+    async def test_bulk_repeated_ids(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            own = (await session.execute(select(PostModel.id).where(PostModel.author_id == 1))).scalars().first()
+        # one upsert statement cannot write the same row twice
+        items = [{"id": own, "title": "First", "content": "Content"}, {"id": own, "title": "Second", "content": "Content"}]
+        response = await async_client.post(
+            fastapi_app.url_path_for(bulk_create_posts_url_name), params={"upsert": True}, json={"items": items},
+        )
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        response = await async_client.patch(fastapi_app.url_path_for(bulk_update_posts_url_name), json={"items": items})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    async def test_bulk_update_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            own = (await session.execute(select(PostModel).where(PostModel.author_id == 1))).scalars().first()
+            other = (await session.execute(select(PostModel.id).where(PostModel.author_id != 1))).scalars().first()
+        url = fastapi_app.url_path_for(bulk_update_posts_url_name)
+        items = [{"id": own.id, "title": "Bulk title"}, {"id": other, "title": "Bulk title"}, {"id": 10 ** 6}]
+        response = await async_client.patch(url, json={"items": items})
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.json()["results"]] == [200, 403, 404]
+        async with database_connect.get_async_session() as session:
+            post = await session.get(PostModel, own.id)
+            assert (post.title, post.content) == ("Bulk title", own.content)
+            assert post.updated_at > own.updated_at
+            assert (await session.get(PostModel, other)).title != "Bulk title"
+
+    async def test_bulk_delete_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            own = (await session.execute(select(PostModel.id).where(PostModel.author_id == 1))).scalars().first()
+            other = (await session.execute(select(PostModel.id).where(PostModel.author_id != 1))).scalars().first()
+        url = fastapi_app.url_path_for(bulk_delete_posts_url_name)
+        response = await async_client.post(url, json={"ids": [own, other, 10 ** 6]})
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.json()["results"]] == [204, 403, 404]
+        async with database_connect.get_async_session() as session:
+            assert await session.get(PostModel, own) is None
+            assert await session.get(PostModel, other) is not None
+
+    async def test_delete_commented_posts(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.unit_of_work() as session:
+            commented, bare = PostFactory(author_id=1), PostFactory(author_id=1)
+            session.add_all([commented, bare])
+            await session.flush()
+            session.add(CommentFactory(author_id=1, post_id=commented.id))
+        url = fastapi_app.url_path_for(bulk_delete_posts_url_name)
+        response = await async_client.post(url, json={"ids": [commented.id, bare.id]})
+        assert response.status_code == status.HTTP_200_OK
+        # the rest of the batch is deleted all the same
+        assert [result["status"] for result in response.json()["results"]] == [409, 204]
+        response = await async_client.delete(fastapi_app.url_path_for(delete_post_url_name, post_id=commented.id))
+        assert response.status_code == status.HTTP_409_CONFLICT
+        async with database_connect.get_async_session() as session:
+            assert await session.get(PostModel, commented.id) is not None
+            assert await session.get(PostModel, bare.id) is None
+
+    async def test_bulk_too_many_items(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+    ):
+        url = fastapi_app.url_path_for(bulk_delete_posts_url_name)
+        response = await async_client.post(url, json={"ids": list(range(BULK_MAX_ITEMS + 1))})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
     async def test_create_post(
             self,
             async_client: AsyncClient,
@@ -133,6 +540,79 @@ class TestPostsAPI:
         response_data = response.json()
         assert response_data["id"] == post.id
 
+    async def test_get_post_read_through_cache(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            user = await session.get(UserModel, 1)
+            post = (await session.execute(select(PostModel).where(PostModel.author_id == user.id))).scalars().first()
+        url = fastapi_app.url_path_for(get_post_url_name, post_id=post.id)
+        # warm the auth cache, so only the post lookup can reach the database below
+        await async_client.get(url)
+        await async_client.patch(fastapi_app.url_path_for(update_post_url_name, post_id=post.id), json={"title": "A"})
+
+        statements = []
+        engine = fastapi_app.state.db.async_engine.sync_engine
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            responses = await asyncio.gather(*(async_client.get(url) for _ in range(5)))
+            responses.append(await async_client.get(url))
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert [response.json()["title"] for response in responses] == ["A"] * 6
+        # concurrent misses share one query, later reads never reach the database
+        assert len(statements) == 1
+
+        response = await async_client.patch(
+            fastapi_app.url_path_for(bulk_update_posts_url_name), json={"items": [{"id": post.id, "title": "B"}]}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        response = await async_client.get(url)
+        assert response.json()["title"] == "B"
+        assert PostWithAuthorSchema.model_validate(response.json()).author.id == user.id
+
+        await async_client.delete(fastapi_app.url_path_for(delete_post_url_name, post_id=post.id))
+        response = await async_client.get(url)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    async def test_get_post_conditional(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+    ):
+        async with database_connect.get_async_session() as session:
+            user = await session.get(UserModel, 1)
+            post = (await session.execute(select(PostModel).where(PostModel.author_id == user.id))).scalars().first()
+        url = fastapi_app.url_path_for(get_post_url_name, post_id=post.id)
+        response = await async_client.get(url)
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private, no-cache"
+
+        response = await async_client.get(url, headers={"If-None-Match": f'"stale", {etag}'})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        # a PATCH without fields writes nothing
+        response = await async_client.patch(fastapi_app.url_path_for(update_post_url_name, post_id=post.id), json={})
+        assert response.status_code == status.HTTP_200_OK
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        await async_client.patch(fastapi_app.url_path_for(update_post_url_name, post_id=post.id), json={"title": "B"})
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        response = await async_client.get(fastapi_app.url_path_for(get_post_url_name, post_id=10 ** 6), headers={
+            "If-None-Match": etag,
+        })
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
     async def test_update_post_permission_denied(
             self,
             async_client: AsyncClient,
@@ -164,6 +644,19 @@ class TestPostsAPI:
         assert response.status_code == status.HTTP_200_OK
         response_data = response.json()
         assert response_data["title"] == "New Title"
+        assert datetime.fromisoformat(response_data["updated_at"]) > post.updated_at
+
+    @pytest.mark.parametrize("method", ["patch", "delete"])
+    async def test_write_missing_post(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            method: str,
+    ):
+        url_name = update_post_url_name if method == "patch" else delete_post_url_name
+        url = fastapi_app.url_path_for(url_name, post_id=10 ** 6)
+        response = await async_client.request(method, url, json={"title": "New Title"} if method == "patch" else None)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
     async def test_delete_post_permission_denied(
             self,
@@ -0,0 +1,38 @@
+import pytest
+from commands.seed import SeedPlan, seed_command
+from core.config import MainSettings
+from db import Database
+from sqlalchemy import text
+
+TABLES = ("users", "user_settings", "posts", "comments")
+
+
+async def count_rows(database_connect: Database) -> dict[str, int]:
+    async with database_connect.get_async_session() as session:
+        return {table: (await session.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one() for table in TABLES}
+
+
+async def count_indexes(database_connect: Database) -> int:
+    async with database_connect.get_async_session() as session:
+        stmt = text("SELECT count(*) FROM pg_indexes WHERE tablename IN ('posts', 'comments')")
+        return (await session.execute(stmt)).scalar_one()
+
+
+@pytest.mark.anyio
+async def test_seed_through_copy(get_test_settings: MainSettings, database_connect: Database):
+    before, indexes = await count_rows(database_connect), await count_indexes(database_connect)
+    plan = SeedPlan(users=5, posts=7, comments=20, author_skew=2.0, post_skew=3.0, days=30)
+    await seed_command(plan, batch_size=3, workers=2, password="password", keep_indexes=False, settings=get_test_settings)
+
+    after = await count_rows(database_connect)
+    assert {table: after[table] - before[table] for table in TABLES} == {
+        "users": 5, "user_settings": 5, "posts": 7, "comments": 20,
+    }
+    assert await count_indexes(database_connect) == indexes
+    async with database_connect.get_async_session() as session:
+        for table in ("users", "posts"):
+            # rows were copied with explicit ids, the next id must come after them
+            next_id = (await session.execute(text(f"SELECT nextval(pg_get_serial_sequence('{table}', 'id'))"))).scalar_one()
+            assert next_id == (await session.execute(text(f"SELECT max(id) FROM {table}"))).scalar_one() + 1
+        orphans = text("SELECT count(*) FROM comments WHERE post_id NOT IN (SELECT id FROM posts)")
+        assert (await session.execute(orphans)).scalar_one() == 0
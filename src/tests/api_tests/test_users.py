@@ -1,7 +1,10 @@
+import asyncio
 from datetime import datetime, timedelta
 from typing import cast
 
 import pytest
+from commands.user import set_role_command
+from core.config import MainSettings
 from core.config.constansts import UserRole
 from db import Database
 from db.models import UserModel
@@ -10,6 +13,7 @@ from fastapi import FastAPI
 from httpx import AsyncClient
 from services.oauth import JwtAuthService
 from services.repositories.users import UserRepository
+from sqlalchemy import event, update
 from starlette import status
 from tests.api_tests.conftest import login_client
 from web.api.users import me_url_name, user_all_url_name, user_settings_url_name
@@ -32,7 +36,7 @@ class TestUserAPI:
             database_connect: Database,
             get_jwt_service: JwtAuthService,
     ):
-        async with database_connect.get_async_session() as session:
+        async with database_connect.unit_of_work() as session:
             user = await self.repository.create_with_settings(session, UserFactory(id=None))
             user = cast(UserModel, user)
 
@@ -45,6 +49,30 @@ class TestUserAPI:
         assert response_data["email"] == user.email
         assert response_data["id"] == user.id
 
+    async def test_me_conditional(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        url = fastapi_app.url_path_for(me_url_name)
+        etag = (await async_client.get(url)).headers["ETag"]
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+        # settings are part of the response, so changing them changes the ETag
+        await async_client.patch(
+            fastapi_app.url_path_for(user_settings_url_name),
+            json={"auto_comment_answer": True, "auto_answer_delay": "00:05:00"},
+        )
+        response = await async_client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["settings"]["auto_comment_answer"] is True
+
     async def test_all_permission_denied(
             self,
             async_client: AsyncClient,
@@ -53,7 +81,7 @@ class TestUserAPI:
             get_jwt_service: JwtAuthService,
     ):
         url = fastapi_app.url_path_for(user_all_url_name)
-        async with database_connect.get_async_session() as session:
+        async with database_connect.unit_of_work() as session:
             user = await self.repository.create(session, UserFactory(id=None))
             user = cast(UserModel, user)
 
@@ -69,9 +97,9 @@ class TestUserAPI:
             get_jwt_service: JwtAuthService,
     ):
         url = fastapi_app.url_path_for(user_all_url_name)
-        async with database_connect.get_async_session() as session:
+        async with database_connect.unit_of_work() as session:
             admin = await self.repository.create(session, UserFactory(id=None, role=UserRole.ADMIN))
-            await self.repository.create_bulk(session, [UserFactory(id=None) for _ in range(5)])
+            session.add_all([UserFactory(id=None) for _ in range(5)])
 
         login_client(async_client, admin.id, get_jwt_service)
         response = await async_client.get(url)
@@ -87,7 +115,7 @@ class TestUserAPI:
             get_jwt_service: JwtAuthService,
     ):
         url = fastapi_app.url_path_for(user_settings_url_name)
-        async with database_connect.get_async_session() as session:
+        async with database_connect.unit_of_work() as session:
             user = await self.repository.create_with_settings(session, UserFactory(id=None))
             user = cast(UserModel, user)
         login_client(async_client, user.id, get_jwt_service)
@@ -98,3 +126,113 @@ class TestUserAPI:
         data = response.json()
         assert response.status_code == status.HTTP_200_OK
         assert data["settings"]["auto_answer_delay"] == "00:05:00"
+
+    async def test_auth_user_is_cached(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        url = fastapi_app.url_path_for(me_url_name)
+        for _ in range(3):
+            response = await async_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+        stats = fastapi_app.state.auth_cache.stats
+        assert (stats.hits, stats.misses) == (2, 1)
+
+    async def test_request_checks_out_one_connection(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        checkouts = []
+        pool = fastapi_app.state.db.async_engine.sync_engine.pool
+        listener = lambda *args: checkouts.append(args)  # noqa: E731
+        event.listen(pool, "checkout", listener)
+        try:
+            # an auth cache miss, so the auth dependency and the handler both query
+            response = await async_client.get(fastapi_app.url_path_for(me_url_name))
+        finally:
+            event.remove(pool, "checkout", listener)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(checkouts) == 1
+
+    async def test_update_user_settings_invalidates_auth_cache(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        response = await async_client.patch(
+            fastapi_app.url_path_for(user_settings_url_name),
+            json={"auto_comment_answer": True, "auto_answer_delay": "00:01:00"},
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["settings"]["auto_comment_answer"] is True
+        assert fastapi_app.state.auth_cache.get(user.id, 0) is None
+
+        await async_client.get(fastapi_app.url_path_for(me_url_name))
+        assert fastapi_app.state.auth_cache.get(user.id, 0).settings.auto_comment_answer is True
+
+    async def test_revoked_token(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+            await session.execute(update(UserModel).where(UserModel.id == user.id).values(token_version=1))
+            await session.commit()
+        login_client(async_client, user.id, get_jwt_service)
+        response = await async_client.get(fastapi_app.url_path_for(me_url_name))
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        tokens = get_jwt_service.generate_jwt_tokens(user.id, token_version=1)
+        async_client.headers.update({"Authorization": f"Bearer {tokens['access_token']}"})
+        response = await async_client.get(fastapi_app.url_path_for(me_url_name))
+        assert response.status_code == status.HTTP_200_OK
+
+    async def test_role_change_revokes_tokens(
+            self,
+            async_client: AsyncClient,
+            fastapi_app: FastAPI,
+            database_connect: Database,
+            get_jwt_service: JwtAuthService,
+            get_test_settings: MainSettings,
+    ):
+        async with database_connect.unit_of_work() as session:
+            user = await self.repository.create_with_settings(session, UserFactory(id=None))
+        login_client(async_client, user.id, get_jwt_service)
+        url = fastapi_app.url_path_for(me_url_name)
+        # the principal is now cached for the old token
+        response = await async_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+
+        await set_role_command(user.username, UserRole.ADMIN, get_test_settings)
+
+        async def revoked():
+            while (await async_client.get(url)).status_code != status.HTTP_401_UNAUTHORIZED:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(revoked(), 5)
+        tokens = get_jwt_service.generate_jwt_tokens(user.id, token_version=1)
+        async_client.headers.update({"Authorization": f"Bearer {tokens['access_token']}"})
+        response = await async_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        async with database_connect.unit_of_work() as session:
+            assert (await self.repository.get(session, user.id)).role == UserRole.ADMIN
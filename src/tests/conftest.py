@@ -1,3 +1,4 @@
+import asyncio
 from typing import AsyncGenerator
 
 import httpx
@@ -94,10 +95,13 @@ async def async_client(fastapi_app: FastAPI) -> AsyncGenerator[httpx.AsyncClient
     :param fastapi_app: fastapi application.
     :return: test client.
     """
-    async with httpx.AsyncClient(
+    async with fastapi_app.router.lifespan_context(fastapi_app), httpx.AsyncClient(
             transport=ASGITransport(app=fastapi_app),
             base_url="http://test"
     ) as client:
+        # caches are cleared and subscribers cut off whenever listening starts, not in the middle of a test
+        while not fastapi_app.state.notifications.connected:
+            await asyncio.sleep(0.01)
         yield client
 
 
@@ -1,11 +1,18 @@
 from fastapi.routing import APIRouter
 
+from web.middlewares import query_budget
+
+from .admin import router as admin_router
+from .comments import feed_router as comment_feed_router
 from .comments import router as comment_router
+from .metrics import router as metrics_router
 from .oauth import router as auth_router
 from .posts import router as post_router
 from .users import router as user_router
 
 __all__ = [
+    "comment_feed_router",
+    "metrics_router",
     "v1_api_router",
 ]
 
@@ -13,6 +20,7 @@ v1_api_router = APIRouter(prefix="/v1")
 
 
 @v1_api_router.get("/healthcheck", name="health_check")
+@query_budget(0)
 async def healthcheck():
     return {"status": "ok"}
 
@@ -21,3 +29,4 @@ v1_api_router.include_router(auth_router, tags=["auth"], prefix="/oauth")
 v1_api_router.include_router(user_router, tags=["users"], prefix="/users")
 v1_api_router.include_router(post_router, tags=["posts"], prefix="/posts")
 v1_api_router.include_router(comment_router, tags=["comments"], prefix="/comments")
+v1_api_router.include_router(admin_router, tags=["admin"], prefix="/admin")
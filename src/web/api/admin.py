@@ -0,0 +1,26 @@
+from db import Database
+from fastapi import APIRouter, Depends, Query
+from schemas.queries import QueryStatsSchema
+
+from web.dependencies import inject_database
+from web.dependencies.oauth import require_admin
+from web.middlewares import query_budget
+
+query_stats_url_name = "admin_query_stats"
+
+router = APIRouter(dependencies=[
+    Depends(require_admin),
+])
+
+
+@router.get("/queries", name=query_stats_url_name)
+@query_budget(1)
+async def get_query_stats(
+        limit: int = Query(20, ge=1, le=100),
+        db: Database = Depends(inject_database),
+) -> list[QueryStatsSchema]:
+    """Statements that took most database time in total, as seen by the worker serving the request."""
+    return [
+        QueryStatsSchema.model_validate(stats, from_attributes=True)
+        for stats in db.query_log.top(limit)
+    ]
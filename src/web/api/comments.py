@@ -1,24 +1,150 @@
-from db import Database
-from fastapi import APIRouter, Depends
+import asyncio
+
+import jwt
+import msgspec
+from fastapi import APIRouter, Depends, Query, Response, WebSocket, status
 from fastapi.requests import Request
+from fastapi.responses import StreamingResponse
+from fastapi.security.utils import get_authorization_scheme_param
+from schemas.bulk import BulkDeleteSchema, BulkResultSchema
 from schemas.comments import (
+    BaseCommentSchema,
+    BulkCreateCommentsSchema,
+    BulkUpdateCommentsSchema,
     InputCommentSchema,
     OutputCommentSchema,
 )
-from services.permissions import check_object_permission, check_operation_permission
+from schemas.structs import CommentStruct
+from services.answers import AnswerPipeline
+from services.bulk import bulk_create, bulk_delete, bulk_update
+from services.comment_feed import CommentFeed
+from services.errors import AbstractError
+from services.errors.oauth import UnauthorizedError
+from services.oauth import JwtAuthService
+from services.permissions import (
+    check_object_permission,
+    check_operation_permission,
+    get_object_permission_clause,
+)
 from services.permissions.base import OperationPermission
 from services.repositories.comments import CommentRepository
 from services.repositories.posts import PostRepository
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from web.dependencies import inject_database
-from web.dependencies.oauth import add_auth_user_to_request
+from web.dependencies import (
+    inject_answer_pipeline,
+    inject_comment_feed,
+    inject_jwt_service,
+    inject_session,
+)
+from web.dependencies.filters import NEXT_CURSOR_HEADER, get_ordering, get_pagination
+from web.dependencies.oauth import add_auth_user_to_request, authenticate
+from web.middlewares import query_budget
+from web.responses import (
+    EVENT_STREAM_MEDIA_TYPE,
+    ConditionalRequest,
+    EventStreamResponse,
+    StructResponse,
+)
 
 router = APIRouter(dependencies=[Depends(add_auth_user_to_request)])
+# WebSockets authenticate in the handler, without a session held for the whole connection
+feed_router = APIRouter()
 
 comment_create_url_name = "create_comment"
 comment_update_url_name = "update_comment"
 comment_delete_url_name = "delete_comment"
 comment_list_url_name = "list_comments"
+comment_bulk_create_url_name = "bulk_create_comments"
+comment_bulk_update_url_name = "bulk_update_comments"
+comment_bulk_delete_url_name = "bulk_delete_comments"
+comment_answer_stream_url_name = "stream_comment_answers"
+comment_feed_url_name = "watch_comments"
+
+RESYNC = msgspec.json.encode({"event": "resync"}).decode()
+# browsers cannot set headers on a WebSocket, they offer this subprotocol followed by the access token
+BEARER_SUBPROTOCOL = "bearer"
+
+
+@router.post("/bulk", name=comment_bulk_create_url_name)
+@query_budget(5)
+async def bulk_create_comments(
+        request: Request,
+        data: BulkCreateCommentsSchema,
+        upsert: bool = Query(False, description="Overwrite the content of items carrying an id"),
+        session: AsyncSession = Depends(inject_session),
+        repository: CommentRepository = Depends(CommentRepository),
+        answers: AnswerPipeline = Depends(inject_answer_pipeline),
+        feed: CommentFeed = Depends(inject_comment_feed),
+) -> BulkResultSchema[BaseCommentSchema]:
+    user = request.state.user
+    check_operation_permission(OperationPermission.Comment.can_create, user)
+    results = await bulk_create(
+        session,
+        repository,
+        [{**item.model_dump(exclude_none=True), "author_id": user.id} for item in data.items],
+        upsert_columns=("content",) if upsert else (),
+        where=get_object_permission_clause(OperationPermission.Comment.can_update, user, repository.model),
+    )
+    await answers.enqueue(session, [result.id for result in results if result.status == status.HTTP_201_CREATED])
+    await feed.notify_many(session, [
+        ("created" if result.status == status.HTTP_201_CREATED else "updated", result.item.post_id, result.id)
+        for result in results
+        if result.item is not None
+    ])
+    return BulkResultSchema[BaseCommentSchema].model_validate({"results": results}, from_attributes=True)
+
+
+@router.patch("/bulk", name=comment_bulk_update_url_name)
+@query_budget(5)
+async def bulk_update_comments(
+        request: Request,
+        data: BulkUpdateCommentsSchema,
+        session: AsyncSession = Depends(inject_session),
+        repository: CommentRepository = Depends(CommentRepository),
+        feed: CommentFeed = Depends(inject_comment_feed),
+) -> BulkResultSchema[BaseCommentSchema]:
+    results = await bulk_update(
+        session,
+        repository,
+        [item.model_dump() for item in data.items],
+        columns=("content",),
+        where=get_object_permission_clause(
+            OperationPermission.Comment.can_update, request.state.user, repository.model
+        ),
+    )
+    updated = [result.id for result in results if result.status == status.HTTP_200_OK]
+    if updated:
+        post_ids = await repository.get_post_ids(session, updated)
+        await feed.notify_many(session, [("updated", post_ids[comment_id], comment_id) for comment_id in updated])
+    return BulkResultSchema[BaseCommentSchema].model_validate({"results": results}, from_attributes=True)
+
+
+@router.post("/bulk/delete", name=comment_bulk_delete_url_name)
+@query_budget(4)
+async def bulk_delete_comments(
+        request: Request,
+        data: BulkDeleteSchema,
+        session: AsyncSession = Depends(inject_session),
+        repository: CommentRepository = Depends(CommentRepository),
+        feed: CommentFeed = Depends(inject_comment_feed),
+) -> BulkResultSchema[BaseCommentSchema]:
+    # read before the rows are gone, watchers of the posts are told once the deletion commits
+    post_ids = await repository.get_post_ids(session, data.ids)
+    results = await bulk_delete(
+        session,
+        repository,
+        data.ids,
+        where=get_object_permission_clause(
+            OperationPermission.Comment.can_delete, request.state.user, repository.model
+        ),
+    )
+    await feed.notify_many(session, [
+        ("deleted", post_ids[result.id], result.id)
+        for result in results
+        if result.status == status.HTTP_204_NO_CONTENT and result.id in post_ids
+    ])
+    return BulkResultSchema[BaseCommentSchema].model_validate({"results": results}, from_attributes=True)
 
 
 @router.post(
@@ -27,62 +153,175 @@ comment_list_url_name = "list_comments"
     response_model=OutputCommentSchema,
     status_code=201
 )
+@query_budget(4)
 async def create_comment(
         request: Request,
         post_id: int,
         data: InputCommentSchema,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: CommentRepository = Depends(CommentRepository),
+        answers: AnswerPipeline = Depends(inject_answer_pipeline),
+        feed: CommentFeed = Depends(inject_comment_feed),
 ) -> OutputCommentSchema:
     check_operation_permission(OperationPermission.Comment.can_create, request.state.user)
-    async with db.get_async_session() as session:
-        comment_to_create = repository.model(
-            **data.model_dump(),
-            author_id=request.state.user.id,
-            post_id=post_id
-        )
-        comment = await repository.create(session, comment_to_create)
+    comment = await repository.insert_returning(session, {
+        **data.model_dump(),
+        "author_id": request.state.user.id,
+        "post_id": post_id,
+    })
+    await answers.enqueue(session, [comment.id])
+    await feed.notify(session, "created", post_id, comment.id)
     return OutputCommentSchema.model_validate(comment, from_attributes=True)
 
 
 @router.patch("/{comment_id}", name=comment_update_url_name, response_model=OutputCommentSchema)
+@query_budget(3)
 async def update_comment(
         request: Request,
         comment_id: int,
         data: InputCommentSchema,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: CommentRepository = Depends(CommentRepository),
+        feed: CommentFeed = Depends(inject_comment_feed),
 ) -> OutputCommentSchema:
-    async with db.get_async_session() as session:
-        comment = await repository.get(session, comment_id)
-        check_object_permission(OperationPermission.Comment.can_update, request.state.user, comment)
-        await repository.update(session, comment.id, data.model_dump(exclude_unset=True, exclude_defaults=True))
+    comment = await repository.update_returning(
+        session,
+        comment_id,
+        data.model_dump(exclude_unset=True, exclude_defaults=True),
+        where=get_object_permission_clause(
+            OperationPermission.Comment.can_update, request.state.user, repository.model
+        ),
+    )
+    await feed.notify(session, "updated", comment.post_id, comment.id)
     return OutputCommentSchema.model_validate(comment, from_attributes=True)
 
 
 @router.delete("/{comment_id}", name=comment_delete_url_name, status_code=204)
+@query_budget(3)
 async def delete_comment(
         request: Request,
         comment_id: int,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: CommentRepository = Depends(CommentRepository),
+        feed: CommentFeed = Depends(inject_comment_feed),
 ) -> None:
-    async with db.get_async_session() as session:
-        comment = await repository.get(session, comment_id)
-        check_object_permission(OperationPermission.Comment.can_delete, request.state.user, comment)
-        await repository.delete(session, comment.id)
+    deleted = await repository.delete_returning(
+        session,
+        comment_id,
+        where=get_object_permission_clause(
+            OperationPermission.Comment.can_delete, request.state.user, repository.model
+        ),
+        returning=("post_id",),
+    )
+    await feed.notify(session, "deleted", deleted.post_id, comment_id)
 
 
-@router.get("/{post_id}", name=comment_list_url_name)
+@router.get(
+    "/{post_id}/answers",
+    name=comment_answer_stream_url_name,
+    response_class=StreamingResponse,
+    responses={200: {"content": {EVENT_STREAM_MEDIA_TYPE: {}}}},
+)
+@query_budget(1)
+async def stream_answers(
+        request: Request,
+        post_id: int,
+        answers: AnswerPipeline = Depends(inject_answer_pipeline),
+) -> StreamingResponse:
+    """
+    Server-sent events of the automatic answers to the comments of the post.
+
+    ``chunk`` events carry the text of an answer as it is generated, the first one of an answer
+    in progress carries its text so far. ``done`` carries the whole answer once it is posted,
+    ``failed`` drops the chunks of an attempt that failed. Answers are streamed by the process
+    writing them only, readers connected elsewhere get ``done`` with the id of the answer and
+    no text, and fetch it.
+    """
+    check_operation_permission(OperationPermission.Comment.can_view, request.state.user)
+    return EventStreamResponse(lambda: answers.subscribe(post_id), answers.settings.STREAM_HEARTBEAT)
+
+
+@router.get("/{post_id}", name=comment_list_url_name, response_model=list[OutputCommentSchema])
+@query_budget(2)
 async def get_comments(
         request: Request,
         post_id: int,
-        db: Database = Depends(inject_database),
-        post_repository: PostRepository = Depends(PostRepository),
+        session: AsyncSession = Depends(inject_session),
+        pagination=Depends(get_pagination),
+        ordering=Depends(get_ordering),
         repository: CommentRepository = Depends(CommentRepository),
-) -> list[OutputCommentSchema]:
+        conditional: ConditionalRequest = Depends(ConditionalRequest),
+) -> Response:
     check_operation_permission(OperationPermission.Comment.can_view, request.state.user)
-    async with db.get_async_session() as session:
-        await post_repository.get(session, post_id)
-        comments = await repository.get_comments_with_author(session, filters={"post_id": post_id})
-    return [OutputCommentSchema.model_validate(comment, from_attributes=True) for comment in comments]
+    page = await repository.get_post_comments_with_author(session, post_id, ordering, pagination)
+    headers = {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor else None
+    return conditional.respond(StructResponse(page.items, list[CommentStruct], headers=headers))
+
+
+@feed_router.websocket("/{post_id}/live", name=comment_feed_url_name)
+async def watch_comments(
+        websocket: WebSocket,
+        post_id: int,
+        oauth_service: JwtAuthService = Depends(inject_jwt_service),
+) -> None:
+    """
+    Push the comments created, updated and deleted on the post as JSON ``CommentFeedEvent``.
+
+    A ``resync`` event means changes were missed, the client reloads the comments and keeps
+    watching. Whatever is watched, a process listens on a single database connection.
+
+    The access token comes in the ``Authorization`` header or, from browsers, as the subprotocol
+    offered after ``bearer``. It is never read from the query string, which ends up in access logs.
+    """
+    state = websocket.app.state
+    token, subprotocol = _websocket_token(websocket)
+    try:
+        if not token:
+            raise UnauthorizedError
+        async with state.db.unit_of_work() as session:
+            user = await authenticate(token, oauth_service, session, state.auth_cache)
+            check_operation_permission(OperationPermission.Comment.can_view, user)
+            # nothing would ever be pushed about a post that does not exist
+            posts = PostRepository.with_cache(state.object_cache)
+            post = await posts.get_cached(session, post_id)
+        check_object_permission(OperationPermission.Post.can_view, user, post, posts.model)
+    except (AbstractError, jwt.InvalidTokenError) as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=getattr(e, "detail", None))
+        return
+    # the token is not echoed back, only the subprotocol naming it
+    await websocket.accept(subprotocol=subprotocol)
+    feed: CommentFeed = state.comment_feed
+
+    async def push() -> None:
+        subscription = feed.subscribe(post_id)
+        try:
+            while True:
+                async for event in subscription:
+                    await websocket.send_text(msgspec.json.encode(event).decode())
+                # subscribe again before the client reloads, so it misses nothing in between
+                subscription = feed.subscribe(post_id)
+                await websocket.send_text(RESYNC)
+        finally:
+            subscription.close()
+
+    async def wait_for_disconnect() -> None:
+        # watchers send nothing
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(wait_for_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _websocket_token(websocket: WebSocket) -> tuple[str | None, str | None]:
+    """The access token of the WebSocket handshake and the subprotocol to accept it with."""
+    subprotocols = websocket.scope.get("subprotocols", [])
+    if BEARER_SUBPROTOCOL in subprotocols[:-1]:
+        return subprotocols[subprotocols.index(BEARER_SUBPROTOCOL) + 1], BEARER_SUBPROTOCOL
+    scheme, credentials = get_authorization_scheme_param(websocket.headers.get("Authorization"))
+    return (credentials if scheme.lower() == "bearer" else None), None
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Response
+from fastapi.requests import Request
+
+from web.metrics import CONTENT_TYPE_LATEST, render_latest
+from web.middlewares import query_budget
+
+metrics_url_name = "metrics"
+
+router = APIRouter()
+
+
+@router.get("/metrics", name=metrics_url_name, include_in_schema=False)
+@query_budget(0)
+async def metrics(request: Request) -> Response:
+    # scrapes see this worker's current gauges rather than the ones from the last interval
+    request.app.state.metrics_sampler.sample()
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
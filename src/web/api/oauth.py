@@ -9,10 +9,19 @@ from schemas.oauth import (
 )
 from schemas.users import OutputUserSchema
 from services.errors import InvalidCredentialsError
+from services.errors.oauth import UnauthorizedError
 from services.oauth import JwtAuthService
+from services.passwords import PasswordHasher
 from services.repositories.users import UserRepository
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from web.dependencies import inject_database, inject_jwt_service
+from web.dependencies import (
+    inject_database,
+    inject_jwt_service,
+    inject_password_hasher,
+    inject_session,
+)
+from web.middlewares import query_budget
 
 router = APIRouter()
 
@@ -27,18 +36,21 @@ refresh_token_url_name = "refresh-token"
     response_model=ResponseTokenScheme,
     status_code=status.HTTP_200_OK
 )
+@query_budget(1)
 async def login(
         data: LoginSchema,
         jwt_service: JwtAuthService = Depends(inject_jwt_service),
+        password_hasher: PasswordHasher = Depends(inject_password_hasher),
         db: Database = Depends(inject_database),
         repository: UserRepository = Depends(UserRepository)
 
 ) -> ResponseTokenScheme:
+    # not the request unit of work, the connection must be back in the pool before bcrypt runs
     async with db.get_async_session() as session:
         user = await repository.get_by_username(session, data.username)
-    if not jwt_service.verify_password(data.password, user.password):
+    if not await password_hasher.verify(data.password, user.password):
         raise InvalidCredentialsError
-    tokens = jwt_service.generate_jwt_tokens(user.id)
+    tokens = jwt_service.generate_jwt_tokens(user.id, user.token_version)
     return ResponseTokenScheme(
         **OutputUserSchema.model_validate(user, from_attributes=True).model_dump(),
         **tokens
@@ -51,17 +63,18 @@ async def login(
     response_model=ResponseTokenScheme,
     status_code=status.HTTP_201_CREATED
 )
+@query_budget(2)
 async def register(
         data: RegisterSchema,
         jwt_service: JwtAuthService = Depends(inject_jwt_service),
-        db: Database = Depends(inject_database),
+        password_hasher: PasswordHasher = Depends(inject_password_hasher),
+        session: AsyncSession = Depends(inject_session),
         repository: UserRepository = Depends(UserRepository)
 ) -> ResponseTokenScheme:
     user = UserModel(**data.model_dump())
-    user.password = jwt_service.hash_password(data.password)
-    async with db.get_async_session() as session:
-        await repository.create_with_settings(session, user)
-    tokens = jwt_service.generate_jwt_tokens(user.id)
+    user.password = await password_hasher.hash(data.password)
+    await repository.create_with_settings(session, user)
+    tokens = jwt_service.generate_jwt_tokens(user.id, user.token_version)
     return ResponseTokenScheme(
         **OutputUserSchema.model_validate(user, from_attributes=True).model_dump(),
         **tokens
@@ -74,15 +87,17 @@ async def register(
     response_model=ResponseTokenScheme,
     status_code=status.HTTP_200_OK
 )
+@query_budget(1)
 async def refresh_token(
         refresh_token_data: RefreshTokenInputSchema,
         jwt_service: JwtAuthService = Depends(inject_jwt_service),
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: UserRepository = Depends(UserRepository)
 ) -> ResponseTokenScheme:
-    tokens, user_id = jwt_service.refresh_token(refresh_token_data.refresh_token)
-    async with db.get_async_session() as session:
-        user = await repository.get(session, user_id)
+    tokens, user_id, token_version = jwt_service.refresh_token(refresh_token_data.refresh_token)
+    user = await repository.get(session, user_id)
+    if user.token_version != token_version:
+        raise UnauthorizedError(detail="Token has been revoked")
     return ResponseTokenScheme(
         **OutputUserSchema.model_validate(user, from_attributes=True).model_dump(),
         **tokens
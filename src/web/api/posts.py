@@ -1,101 +1,250 @@
+from typing import AsyncIterator
+
+import msgspec
+from core.config.constansts import PostView
 from db import Database
-from db.models import PostModel
-from fastapi import APIRouter, Depends, Request, Response
-from schemas.posts import InputPostSchema, PostWithAuthorSchema, UpdatePostSchema
-from services.permissions import check_object_permission, check_operation_permission
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from schemas.bulk import BulkDeleteSchema, BulkResultSchema
+from schemas.posts import (
+    BasePostSchema,
+    BulkCreatePostsSchema,
+    BulkUpdatePostsSchema,
+    InputPostSchema,
+    PostListItemSchema,
+    PostSummarySchema,
+    PostWithAuthorSchema,
+    UpdatePostSchema,
+)
+from schemas.structs import PostListItemStruct, PostSummaryStruct
+from services.bulk import bulk_create, bulk_delete, bulk_update
+from services.cache import ObjectCache
+from services.export import NDJSON_MEDIA_TYPE, export_posts_ndjson, gzip_stream
+from services.permissions import (
+    check_object_permission,
+    check_operation_permission,
+    get_object_permission_clause,
+)
 from services.permissions.base import OperationPermission
 from services.repositories.posts import PostRepository
+from services.repositories.users import UserRepository
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from web.dependencies import inject_database
-from web.dependencies.filters import get_ordering, get_pagination, get_post_filters
+from web.dependencies import (
+    inject_database,
+    inject_page_cache,
+    inject_post_repository,
+    inject_session,
+    inject_user_repository,
+)
+from web.dependencies.filters import (
+    NEXT_CURSOR_HEADER,
+    get_ordering,
+    get_pagination,
+    get_post_filters,
+)
 from web.dependencies.oauth import (
     add_auth_user_to_request,
 )
+from web.middlewares import query_budget
+from web.responses import (
+    ConditionalRequest,
+    MsgSpecJSONResponse,
+    StructResponse,
+    cached_response,
+    make_etag,
+)
 
 list_posts_url_name = "posts_list"
 create_post_url_name = "posts_create"
 get_post_url_name = "posts_get"
 update_post_url_name = "posts_update"
 delete_post_url_name = "posts_delete"
+export_posts_url_name = "posts_export"
+bulk_create_posts_url_name = "posts_bulk_create"
+bulk_update_posts_url_name = "posts_bulk_update"
+bulk_delete_posts_url_name = "posts_bulk_delete"
 
 router = APIRouter(
     dependencies=[Depends(add_auth_user_to_request)],
 )
 
 
-@router.get("", name=list_posts_url_name)
+@router.get("", name=list_posts_url_name, response_model=list[PostListItemSchema] | list[PostSummarySchema])
+@query_budget(2)
 async def get_post_list(
         request: Request,
-        db: Database = Depends(inject_database),
+        view: PostView = Query(PostView.FULL, description="``summary`` replaces the content with a short excerpt"),
+        session: AsyncSession = Depends(inject_session),
         pagination=Depends(get_pagination),
         filters=Depends(get_post_filters),
         ordering=Depends(get_ordering),
-        repository: PostRepository = Depends(PostRepository),
-) -> list[PostWithAuthorSchema]:
+        repository: PostRepository = Depends(inject_post_repository),
+        users: UserRepository = Depends(inject_user_repository),
+        page_cache: ObjectCache = Depends(inject_page_cache),
+) -> Response:
+    check_operation_permission(OperationPermission.Post.can_view_list, request.state.user)
+
+    async def render() -> StructResponse:
+        page = await repository.get_posts_with_author(session, filters, ordering, pagination, view)
+        headers = {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor else None
+        struct = PostSummaryStruct if view is PostView.SUMMARY else PostListItemStruct
+        return StructResponse(page.items, list[struct], headers=headers)
+
+    # the list is granted to everyone, so a page depends only on the query and the generations of
+    # the tables it shows, posts and their authors
+    query = msgspec.json.encode([filters, ordering, pagination, view]).decode()
+    generations = f"{await repository.cache_generation()}:{await users.cache_generation()}"
+    key = f"{repository.model.__tablename__}:list:{generations}:{query}"
+    return await cached_response(page_cache, key, render, request)
+
+
+@router.get(
+    "/export",
+    name=export_posts_url_name,
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+@query_budget(2)
+async def export_posts(
+        request: Request,
+        db: Database = Depends(inject_database),
+        filters=Depends(get_post_filters),
+        gzip: bool = Query(False, description="Compress the stream with gzip"),
+) -> StreamingResponse:
     check_operation_permission(OperationPermission.Post.can_view_list, request.state.user)
-    async with db.get_async_session() as session:
-        posts = await repository.get_posts_with_author(session, filters, ordering, pagination)
-    return [PostWithAuthorSchema.model_validate(post, from_attributes=True) for post in posts]
+
+    async def stream() -> AsyncIterator[bytes]:
+        # the request session is closed before the body is sent, so the stream owns its own
+        async with db.get_async_session() as session:
+            async for chunk in export_posts_ndjson(session, filters):
+                yield chunk
+
+    headers = {"Content-Disposition": 'attachment; filename="posts.ndjson"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(gzip_stream(stream()), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+@router.post("/bulk", name=bulk_create_posts_url_name)
+@query_budget(5)
+async def bulk_create_posts(
+        request: Request,
+        data: BulkCreatePostsSchema,
+        upsert: bool = Query(False, description="Overwrite the title and content of items carrying an id"),
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository),
+) -> BulkResultSchema[BasePostSchema]:
+    user = request.state.user
+    check_operation_permission(OperationPermission.Post.can_create, user)
+    results = await bulk_create(
+        session,
+        repository,
+        [{**item.model_dump(exclude_none=True), "author_id": user.id} for item in data.items],
+        upsert_columns=("title", "content") if upsert else (),
+        where=get_object_permission_clause(OperationPermission.Post.can_update, user, repository.model),
+    )
+    return BulkResultSchema[BasePostSchema].model_validate({"results": results}, from_attributes=True)
+
+
+@router.patch("/bulk", name=bulk_update_posts_url_name)
+@query_budget(4)
+async def bulk_update_posts(
+        request: Request,
+        data: BulkUpdatePostsSchema,
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository),
+) -> BulkResultSchema[BasePostSchema]:
+    results = await bulk_update(
+        session,
+        repository,
+        [item.model_dump(exclude_unset=True) for item in data.items],
+        columns=("title", "content"),
+        where=get_object_permission_clause(OperationPermission.Post.can_update, request.state.user, repository.model),
+    )
+    return BulkResultSchema[BasePostSchema].model_validate({"results": results}, from_attributes=True)
+
+
+@router.post("/bulk/delete", name=bulk_delete_posts_url_name)
+@query_budget(3)
+async def bulk_delete_posts(
+        request: Request,
+        data: BulkDeleteSchema,
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository),
+) -> BulkResultSchema[BasePostSchema]:
+    results = await bulk_delete(
+        session,
+        repository,
+        data.ids,
+        where=get_object_permission_clause(OperationPermission.Post.can_delete, request.state.user, repository.model),
+    )
+    return BulkResultSchema[BasePostSchema].model_validate({"results": results}, from_attributes=True)
 
 
 @router.post("", name=create_post_url_name, status_code=201)
+@query_budget(3)
 async def create_post(
         request: Request,
         data: InputPostSchema,
-        db: Database = Depends(inject_database),
-        repository: PostRepository = Depends(PostRepository),
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository),
 ) -> PostWithAuthorSchema:
     check_operation_permission(OperationPermission.Post.can_create, request.state.user)
-    post = PostModel(
+    post = await repository.insert_returning(session, {
         **data.model_dump(),
-        author_id=request.state.user.id,
-    )
-    async with db.get_async_session() as session:
-        await repository.create(session, post)
-        post = await repository.get(session, post.id)
+        "author_id": request.state.user.id,
+    })
     return PostWithAuthorSchema.model_validate(post, from_attributes=True)
 
 
-@router.get("/{post_id}", name=get_post_url_name)
+@router.get("/{post_id}", name=get_post_url_name, response_model=PostWithAuthorSchema)
+@query_budget(2)
 async def get_post(
         request: Request,
         post_id: int,
-        db: Database = Depends(inject_database),
-        repository: PostRepository = Depends(PostRepository)
-
-) -> PostWithAuthorSchema:
-    async with db.get_async_session() as session:
-        post = await repository.get(session, post_id)
-    check_object_permission(OperationPermission.Post.can_view, request.state.user, post)
-    return PostWithAuthorSchema.model_validate(post, from_attributes=True)
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository),
+        conditional: ConditionalRequest = Depends(ConditionalRequest),
+) -> Response:
+    post = await repository.get_cached(session, post_id)
+    check_object_permission(OperationPermission.Post.can_view, request.state.user, post, repository.model)
+    etag = make_etag(post.id, post.updated_at)
+    if conditional.matches(etag):
+        return conditional.not_modified(etag)
+    return conditional.respond(MsgSpecJSONResponse(post), etag)
 
 
 @router.patch("/{post_id}", name=update_post_url_name)
+@query_budget(3)
 async def update_post(
         request: Request,
         post_id: int,
         data: UpdatePostSchema,
-        db: Database = Depends(inject_database),
-        repository: PostRepository = Depends(PostRepository)
+        session: AsyncSession = Depends(inject_session),
+        repository: PostRepository = Depends(inject_post_repository)
 ) -> PostWithAuthorSchema:
-    async with db.get_async_session() as session:
-        post = await repository.get(session, post_id)
-        check_object_permission(OperationPermission.Post.can_update, request.state.user, post)
-        await repository.update(session, post.id, data.model_dump(
-            exclude_unset=True, exclude_defaults=True
-        ))
+    post = await repository.update_returning(
+        session,
+        post_id,
+        data.model_dump(exclude_unset=True, exclude_defaults=True),
+        where=get_object_permission_clause(OperationPermission.Post.can_update, request.state.user, repository.model),
+    )
     return PostWithAuthorSchema.model_validate(post, from_attributes=True)
 
 
 @router.delete("/{post_id}", status_code=204, name=delete_post_url_name)
+@query_budget(3)
 async def delete_post(
         request: Request,
         post_id: int,
-        db: Database = Depends(inject_database),
-        repository=Depends(PostRepository)
+        session: AsyncSession = Depends(inject_session),
+        repository=Depends(inject_post_repository)
 ):
-    async with db.get_async_session() as session:
-        post = await repository.get(session, post_id)
-        check_object_permission(OperationPermission.Post.can_delete, request.state.user, post)
-        await repository.delete(session, post_id)
+    await repository.delete_returning(
+        session,
+        post_id,
+        where=get_object_permission_clause(OperationPermission.Post.can_delete, request.state.user, repository.model),
+    )
     return Response(status_code=204)
@@ -1,17 +1,21 @@
-from db import Database
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from fastapi.requests import Request
 from schemas.users import (
     OutputUserSchema,
     UpdateUserSettingsSchema,
     UserWithSettingsSchema,
 )
+from services.oauth import AuthUserCache
 from services.permissions import check_operation_permission
 from services.permissions.base import OperationPermission
 from services.repositories.users import UserRepository, UserSettingsRepository
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from web.dependencies import inject_database
+from web.dependencies import inject_auth_cache, inject_session
 from web.dependencies.oauth import add_auth_user_to_request
+from web.middlewares import query_budget
+from web.responses import ConditionalRequest, make_etag
 
 me_url_name = "users_me"
 user_all_url_name = "users_all"
@@ -22,27 +26,34 @@ router = APIRouter(dependencies=[
 ])
 
 
-@router.get("/me", name=me_url_name)
+@router.get("/me", name=me_url_name, response_model=UserWithSettingsSchema)
+@query_budget(3)
 async def get_me(
         request: Request,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: UserRepository = Depends(UserRepository),
-) -> UserWithSettingsSchema:
-    async with db.get_async_session() as session:
-        user = await repository.get(session, request.state.user.id, joined=[repository.model.settings])
-    return UserWithSettingsSchema.model_validate(user, from_attributes=True)
+        conditional: ConditionalRequest = Depends(ConditionalRequest),
+) -> Response:
+    user_id = request.state.user.id
+    if conditional.requested:
+        etag = make_etag(user_id, await repository.get_updated_at(session, user_id))
+        if conditional.matches(etag):
+            return conditional.not_modified(etag)
+    user = await repository.get(session, user_id, joined=[repository.model.settings])
+    body = UserWithSettingsSchema.model_validate(user, from_attributes=True).model_dump_json()
+    return conditional.respond(Response(body, media_type="application/json"), make_etag(user.id, user.updated_at))
 
 
 @router.get("/all", name=user_all_url_name)
+@query_budget(2)
 async def get_all(
         request: Request,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
         repository: UserRepository = Depends(UserRepository),
 
 ) -> list[OutputUserSchema]:
     check_operation_permission(OperationPermission.User.can_view_list, request.state.user)
-    async with db.get_async_session() as session:
-        users = await repository.list(session)
+    users = await repository.list(session)
     return [
         OutputUserSchema.model_validate(user, from_attributes=True)
         for user in users
@@ -50,15 +61,22 @@ async def get_all(
 
 
 @router.patch("/me/settings", name=user_settings_url_name)
+@query_budget(5)
 async def update_user_settings(
         request: Request,
         data: UpdateUserSettingsSchema,
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
+        auth_cache: AuthUserCache = Depends(inject_auth_cache),
+        repository: UserRepository = Depends(UserRepository),
         settings_repository: UserSettingsRepository = Depends(UserSettingsRepository),
 ) -> UserWithSettingsSchema:
     user = request.state.user
-    async with db.get_async_session() as session:
-        await settings_repository.update(
-            session, user.settings.id, data.model_dump(exclude_defaults=True, exclude_none=True)
-        )
+    await settings_repository.update(
+        session, user.settings.id, data.model_dump(exclude_defaults=True, exclude_none=True)
+    )
+    # settings are part of the user's representation, and its ETag follows updated_at
+    await repository.update(session, user.id, {"updated_at": func.now()})
+    auth_cache.invalidate(user.id)
+    await auth_cache.broadcast(session, user.id)
+    user = await repository.get(session, user.id, joined=[repository.model.settings])
     return UserWithSettingsSchema.model_validate(user, from_attributes=True)
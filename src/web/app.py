@@ -1,21 +1,104 @@
+import asyncio
+import contextlib
 import logging
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
 
-import msgspec
 from core.config import create_settings
+from db import Database, NotificationListener
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
 from services import errors
+from services.answers import AnswerPipeline, create_backend
+from services.cache import InProcessCacheBackend, ObjectCache
+from services.comment_feed import CommentFeed
+from services.oauth import AuthUserCache
+from services.passwords import PasswordHasher
 
-from web.api import v1_api_router
+from web.api import comment_feed_router, metrics_router, v1_api_router
+from web.metrics import MetricsSampler, mark_worker_dead, observe_answer_batch
 from web.middlewares import setup_middlewares
+from web.responses import MsgSpecJSONResponse
+
+__all__ = [
+    "MsgSpecJSONResponse",
+    "create_app",
+    "server",
+]
 
 logger = logging.getLogger(__name__)
 
 
-class MsgSpecJSONResponse(JSONResponse):
-    def render(self, content: Any) -> bytes:
-        return msgspec.json.encode(content)
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    Own process-wide resources for the lifetime of a worker.
+
+    Settings are resolved through ``dependency_overrides`` so tests that override
+    ``create_settings`` get a database bound to the test settings.
+    """
+    settings = app.dependency_overrides.get(create_settings, create_settings)()
+    db = Database(settings.db)
+    await db.connect()
+    app.state.db = db
+    # one connection per process hears the notifications of every component
+    app.state.notifications = NotificationListener(db.url, settings.db.LISTEN_KEEPALIVE)
+    app.state.query_budget_mode = settings.db.QUERY_BUDGET_MODE
+    app.state.auth_cache = AuthUserCache(
+        max_size=settings.cache.AUTH_CACHE_MAX_SIZE,
+        ttl=settings.cache.AUTH_CACHE_TTL,
+    )
+    app.state.object_cache = ObjectCache(InProcessCacheBackend(
+        max_size=settings.cache.OBJECT_CACHE_MAX_SIZE,
+        ttl=settings.cache.OBJECT_CACHE_TTL,
+    ))
+    app.state.auth_cache.listen(app.state.notifications)
+    app.state.object_cache.listen(app.state.notifications)
+    app.state.page_cache = ObjectCache(InProcessCacheBackend(
+        max_size=settings.cache.PAGE_CACHE_MAX_SIZE,
+        ttl=settings.cache.PAGE_CACHE_TTL,
+    ))
+    app.state.password_hasher = PasswordHasher(
+        max_workers=settings.security.PASSWORD_HASH_WORKERS,
+        max_pending=settings.security.PASSWORD_HASH_MAX_PENDING,
+    )
+    backend = create_backend(settings.answers, on_batch=observe_answer_batch if settings.metrics.ENABLED else None)
+    app.state.answer_pipeline = AnswerPipeline(db, backend, settings.answers, app.state.notifications)
+    answering = None
+    if settings.answers.ENABLED:
+        answering = asyncio.create_task(app.state.answer_pipeline.run())
+    app.state.comment_feed = CommentFeed(db, settings.comment_feed, app.state.notifications)
+    watching = None
+    if settings.comment_feed.ENABLED:
+        watching = asyncio.create_task(app.state.comment_feed.run())
+    listening = asyncio.create_task(app.state.notifications.run())
+    app.state.metrics_sampler = MetricsSampler(app.state)
+    sampling = None
+    if settings.metrics.ENABLED:
+        sampling = asyncio.create_task(app.state.metrics_sampler.run(settings.metrics.SAMPLE_INTERVAL))
+    logger.info("Database pool is ready")
+    try:
+        yield
+    finally:
+        if sampling is not None:
+            sampling.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await sampling
+        mark_worker_dead()
+        listening.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await listening
+        if watching is not None:
+            watching.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watching
+        if answering is not None:
+            answering.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await answering
+        await app.state.answer_pipeline.close()
+        app.state.password_hasher.shutdown()
+        await db.disconnect()
+        logger.info("Database pool is closed")
 
 
 def create_app() -> FastAPI:
@@ -24,6 +107,7 @@ def create_app() -> FastAPI:
         description="FastAPI test project",
         version="1.0.0",
         default_response_class=MsgSpecJSONResponse,
+        lifespan=lifespan,
     )
     return app
 
@@ -32,6 +116,15 @@ def server() -> FastAPI:
     settings = create_settings()
     app: FastAPI = create_app()
     app.exception_handler(errors.AbstractError)(errors.global_exception_handler)
-    setup_middlewares(app=app, settings=settings.cors)
+    setup_middlewares(
+        app=app,
+        settings=settings.cors,
+        compression=settings.compression,
+        metrics=settings.metrics,
+    )
     app.include_router(v1_api_router, prefix="/api")
+    if settings.comment_feed.ENABLED:
+        app.include_router(comment_feed_router, prefix="/api/v1/comments", tags=["comments"])
+    if settings.metrics.ENABLED:
+        app.include_router(metrics_router)
     return app
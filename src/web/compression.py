@@ -0,0 +1,138 @@
+import asyncio
+import zlib
+from dataclasses import dataclass
+from typing import Callable, NamedTuple, Protocol
+
+from core.config import CompressionSettings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# below this size compressing inline is cheaper than a hop to a worker thread
+THREAD_THRESHOLD = 64 * 1024
+# every chunk of these must reach the client when it is sent, a stream compressor holds chunks back
+UNBUFFERED_MEDIA_TYPES = ("text/event-stream",)
+
+
+class StreamCompressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+class Codec(NamedTuple):
+    name: str
+    compress: Callable[[bytes, int], bytes]
+    stream: Callable[[int], StreamCompressor]
+
+
+GZIP = Codec(
+    "gzip",
+    lambda data, level: zlib.compress(data, level, wbits=16 + zlib.MAX_WBITS),
+    lambda level: zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS),
+)
+
+# in order of preference when the client accepts several equally
+CODECS: dict[str, Codec] = {}
+if zstandard is not None:
+    CODECS["zstd"] = Codec(
+        "zstd",
+        lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+        lambda level: zstandard.ZstdCompressor(level=level).compressobj(),
+    )
+if brotli is not None:
+    CODECS["br"] = Codec("br", lambda data, quality: brotli.compress(data, quality=quality), _BrotliStream)
+CODECS["gzip"] = GZIP
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+    """Map every coding in an ``Accept-Encoding`` header to its quality value."""
+    accepted = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = params.partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+@dataclass(frozen=True, slots=False)
+class CompressionPolicy:
+    """Which responses get compressed, with which codec and at which level."""
+    min_size: int
+    media_types: tuple[str, ...]
+    levels: dict[str, int]
+
+    @classmethod
+    def from_settings(cls, settings: CompressionSettings) -> "CompressionPolicy":
+        return cls(
+            min_size=settings.MIN_SIZE,
+            media_types=tuple(settings.MEDIA_TYPES),
+            levels={"gzip": settings.GZIP_LEVEL, "zstd": settings.ZSTD_LEVEL, "br": settings.BROTLI_QUALITY},
+        )
+
+    def negotiate(self, accept_encoding: str | None) -> Codec | None:
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_quality = None, 0.0
+        for name, codec in CODECS.items():
+            quality = accepted.get(name, wildcard)
+            if quality > best_quality:
+                best, best_quality = codec, quality
+        return best
+
+    def accepts_media_type(self, content_type: str | None) -> bool:
+        media_type = (content_type or "").partition(";")[0].strip().lower()
+        return media_type not in UNBUFFERED_MEDIA_TYPES and any(
+            media_type.startswith(allowed) if allowed.endswith("/") else media_type == allowed
+            for allowed in self.media_types
+        )
+
+    async def compress(self, codec: Codec, data: bytes) -> bytes:
+        if len(data) < THREAD_THRESHOLD:
+            return codec.compress(data, self.levels[codec.name])
+        # zlib, zstd and brotli all release the GIL
+        return await asyncio.to_thread(codec.compress, data, self.levels[codec.name])
+
+    def stream(self, codec: Codec) -> StreamCompressor:
+        return codec.stream(self.levels[codec.name])
+
+
+async def compress_chunk(compressor: StreamCompressor, data: bytes, last: bool) -> bytes:
+    def run() -> bytes:
+        return compressor.compress(data) + (compressor.flush() if last else b"")
+
+    if len(data) < THREAD_THRESHOLD:
+        return run()
+    return await asyncio.to_thread(run)
+
+
+def weak_etag(etag: str) -> str:
+    """An encoded response is a different representation, so its validator can no longer be strong."""
+    return etag if etag.startswith("W/") else f"W/{etag}"
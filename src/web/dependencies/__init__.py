@@ -1,6 +1,27 @@
-from .base import inject_database, inject_jwt_service
+from .base import (
+    inject_answer_pipeline,
+    inject_auth_cache,
+    inject_comment_feed,
+    inject_database,
+    inject_jwt_service,
+    inject_object_cache,
+    inject_page_cache,
+    inject_password_hasher,
+    inject_post_repository,
+    inject_session,
+    inject_user_repository,
+)
 
 __all__ = [
+    "inject_answer_pipeline",
+    "inject_auth_cache",
+    "inject_comment_feed",
     "inject_database",
-    "inject_jwt_service"
+    "inject_jwt_service",
+    "inject_object_cache",
+    "inject_page_cache",
+    "inject_password_hasher",
+    "inject_post_repository",
+    "inject_session",
+    "inject_user_repository",
 ]
@@ -1,19 +1,38 @@
+from typing import AsyncGenerator
+
 from core.config import MainSettings, create_settings
 from db import Database
-from fastapi import Depends
-from services.oauth import JwtAuthService
-
+from fastapi import Depends, Request
+from services.answers import AnswerPipeline
+from services.cache import ObjectCache
+from services.comment_feed import CommentFeed
+from services.oauth import AuthUserCache, JwtAuthService
+from services.passwords import PasswordHasher
+from services.repositories.posts import PostRepository
+from services.repositories.users import UserRepository
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def inject_database(
-        settings: MainSettings = Depends(create_settings)
 
-) -> Database:
+def inject_database(request: Request) -> Database:
     """
-    Create and return database instance.
+    Return the database instance owned by the application lifespan.
 
     :return: database instance.
     """
-    return Database(settings.db)
+    return request.app.state.db
+
+
+async def inject_session(db: Database = Depends(inject_database)) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Yield the request scoped session.
+
+    FastAPI caches dependencies per request, so the auth dependency and the handler share
+    one session and one pooled connection, committed once after the handler returns.
+
+    :return: database session.
+    """
+    async with db.unit_of_work() as session:
+        yield session
 
 
 def inject_jwt_service(settings: MainSettings = Depends(create_settings)) -> JwtAuthService:
@@ -23,3 +42,75 @@ def inject_jwt_service(settings: MainSettings = Depends(create_settings)) -> Jwt
     :return: jwt service instance.
     """
     return JwtAuthService(security_settings=settings.security)
+
+
+def inject_auth_cache(request: Request) -> AuthUserCache:
+    """
+    Return the authenticated user cache owned by the application lifespan.
+
+    :return: authenticated user cache.
+    """
+    return request.app.state.auth_cache
+
+
+def inject_object_cache(request: Request) -> ObjectCache:
+    """
+    Return the repository object cache owned by the application lifespan.
+
+    :return: object cache.
+    """
+    return request.app.state.object_cache
+
+
+def inject_page_cache(request: Request) -> ObjectCache:
+    """
+    Return the rendered response cache owned by the application lifespan.
+
+    :return: page cache.
+    """
+    return request.app.state.page_cache
+
+
+def inject_answer_pipeline(request: Request) -> AnswerPipeline:
+    """
+    Return the automatic answer pipeline owned by the application lifespan.
+
+    :return: answer pipeline.
+    """
+    return request.app.state.answer_pipeline
+
+
+def inject_comment_feed(request: Request) -> CommentFeed:
+    """
+    Return the live comment feed owned by the application lifespan.
+
+    :return: comment feed.
+    """
+    return request.app.state.comment_feed
+
+
+def inject_post_repository(cache: ObjectCache = Depends(inject_object_cache)) -> PostRepository:
+    """
+    Create a post repository reading and invalidating through the object cache.
+
+    :return: post repository.
+    """
+    return PostRepository.with_cache(cache)
+
+
+def inject_user_repository(cache: ObjectCache = Depends(inject_object_cache)) -> UserRepository:
+    """
+    Create a user repository invalidating through the object cache, authors are shown with posts.
+
+    :return: user repository.
+    """
+    return UserRepository.with_cache(cache)
+
+
+def inject_password_hasher(request: Request) -> PasswordHasher:
+    """
+    Return the password hasher owned by the application lifespan.
+
+    :return: password hasher.
+    """
+    return request.app.state.password_hasher
@@ -1,12 +1,15 @@
 from fastapi import Query
 from services.filters import Pagination, PostFilter
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 def get_pagination(
         limit: int = Query(10, ge=1, le=100),
-        offset: int = Query(0, ge=0)
+        offset: int = Query(0, ge=0),
+        cursor: str = Query(None, description=f"Opaque keyset cursor taken from the {NEXT_CURSOR_HEADER} header"),
 ) -> Pagination:
-    return Pagination(limit, offset)
+    return Pagination(limit, offset, cursor)
 
 
 def get_ordering(
@@ -18,9 +21,11 @@ def get_ordering(
 def get_post_filters(
         title: str = Query(None),
         author_id: int = Query(None),
+        q: str = Query(None, min_length=1, max_length=256, description="Full-text search over title and content"),
 
 ) -> PostFilter:
     return PostFilter(
         title=title,
         author_id=author_id,
+        search=q,
     )
@@ -1,32 +1,57 @@
 from typing import Awaitable, Callable
 
-from db import Database
+from core.config.constansts import UserRole
 from fastapi import Depends, Request
 from fastapi.security import HTTPAuthorizationCredentials
-from services.oauth import CustomHTTPBearer, JwtAuthService
+from services.errors import PermissionDeniedError
+from services.errors.oauth import UnauthorizedError
+from services.oauth import AuthUser, AuthUserCache, CustomHTTPBearer, JwtAuthService
 from services.permissions import check_operation_permission
 from services.repositories.users import UserRepository
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from web.dependencies.base import inject_database, inject_jwt_service
+from web.dependencies.base import inject_auth_cache, inject_jwt_service, inject_session
+
+
+async def authenticate(
+        token: str,
+        oauth_service: JwtAuthService,
+        session: AsyncSession,
+        auth_cache: AuthUserCache,
+) -> AuthUser:
+    user_payload = oauth_service.decode_jwt_token(token)
+    user_id = int(user_payload.get("sub"))
+    token_version = oauth_service.get_token_version(user_payload)
+    user = auth_cache.get(user_id, token_version)
+    if user is None:
+        repository = UserRepository()
+        user_model = await repository.get(session, user_id, joined=[repository.model.settings])
+        if user_model.token_version != token_version:
+            raise UnauthorizedError(detail="Token has been revoked")
+        user = AuthUser.from_model(user_model)
+        auth_cache.set(user, token_version)
+    return user
 
 
 async def add_auth_user_to_request(
         request: Request,
         oauth_creds: HTTPAuthorizationCredentials = Depends(CustomHTTPBearer()),
         oauth_service: JwtAuthService = Depends(inject_jwt_service),
-        db: Database = Depends(inject_database),
+        session: AsyncSession = Depends(inject_session),
+        auth_cache: AuthUserCache = Depends(inject_auth_cache),
 
-) -> str:
-    user_payload = oauth_service.decode_jwt_token(
-        oauth_creds.credentials
-    )
-    async with db.get_async_session() as session:
-        repository = UserRepository()
-        user = await repository.get(session, int(user_payload.get("sub")))
+) -> AuthUser:
+    user = await authenticate(oauth_creds.credentials, oauth_service, session, auth_cache)
     request.state.user = user
     return user
 
 
+async def require_admin(user: AuthUser = Depends(add_auth_user_to_request)) -> AuthUser:
+    if user.role != UserRole.ADMIN:
+        raise PermissionDeniedError
+    return user
+
+
 def check_route_permission(
         operation: str,
 ):
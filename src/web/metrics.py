@@ -0,0 +1,179 @@
+import asyncio
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from services.answers import BatchingBackend, BatchStats
+from starlette.datastructures import State
+
+__all__ = [
+    "CONTENT_TYPE_LATEST",
+    "MetricsSampler",
+    "REQUESTS",
+    "REQUEST_LATENCY",
+    "mark_worker_dead",
+    "observe_answer_batch",
+    "render_latest",
+]
+
+# set by the entrypoint: every worker writes its samples to files there and any worker serves the sum
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUESTS = Counter("http_requests", "HTTP requests", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the last body chunk is sent",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+POOL_SIZE = Gauge("db_pool_size", "Connections the pool keeps open", multiprocess_mode="livesum")
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections in use", multiprocess_mode="livesum")
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond the pool size", multiprocess_mode="livesum")
+POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connection checkouts")
+POOL_WAIT = Counter("db_pool_wait_seconds", "Time checkouts spent waiting for a connection")
+
+CACHE_HITS = Counter("cache_hits", "Cache hits", ["cache"])
+CACHE_MISSES = Counter("cache_misses", "Cache misses", ["cache"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries held by the cache", ["cache"], multiprocess_mode="livesum")
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Hit ratio of a worker's cache since it started", ["cache"], multiprocess_mode="liveall",
+)
+
+PASSWORD_WORKERS = Gauge("password_hash_workers", "Threads hashing passwords", multiprocess_mode="livesum")
+PASSWORD_PENDING = Gauge("password_hash_pending", "Password operations queued or running", multiprocess_mode="livesum")
+PASSWORD_REJECTED = Counter("password_hash_rejected", "Password operations rejected with 503")
+
+ANSWERS_IN_FLIGHT = Gauge("answer_jobs_in_flight", "Automatic answers being written", multiprocess_mode="livesum")
+ANSWERS_COMPLETED = Counter("answer_jobs_completed", "Automatic answers posted")
+ANSWERS_FAILED = Counter("answer_jobs_failed", "Failed automatic answer attempts")
+ANSWER_PROMPTS_PENDING = Gauge(
+    "answer_prompts_pending", "Prompts queued or being generated", multiprocess_mode="livesum",
+)
+ANSWER_PROMPTS_COALESCED = Counter("answer_prompts_coalesced", "Prompts answered by a generation already pending")
+ANSWER_BATCH_SIZE = Histogram(
+    "answer_batch_size", "Prompts per generation backend call", buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+ANSWER_BATCH_WAIT = Histogram(
+    "answer_batch_wait_seconds", "Time the oldest prompt of a batch was queued",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+ANSWER_BATCH_LATENCY = Histogram(
+    "answer_batch_duration_seconds", "Generation backend call latency",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+ANSWER_BATCH_FAILURES = Counter("answer_batch_failures", "Generation backend calls that failed")
+ANSWER_STREAM_SUBSCRIBERS = Gauge(
+    "answer_stream_subscribers", "Readers following answers as they are generated", multiprocess_mode="livesum",
+)
+ANSWER_STREAM_OVERFLOWS = Counter("answer_stream_overflows", "Answer stream readers cut off for falling behind")
+COMMENT_FEED_WATCHERS = Gauge(
+    "comment_feed_watchers", "WebSocket clients watching the comments of a post", multiprocess_mode="livesum",
+)
+COMMENT_FEED_NOTIFICATIONS = Counter("comment_feed_notifications", "Comment changes heard from the database")
+COMMENT_FEED_OVERFLOWS = Counter("comment_feed_overflows", "Comment watchers told to resync for falling behind")
+NOTIFICATION_LISTENER_CONNECTS = Counter(
+    "notification_listener_connects", "Times the connection listening for notifications (re)connected",
+)
+# every worker sees the same table, its latest count is not summed
+ANSWER_CACHE_ENTRIES = Gauge("answer_cache_entries", "Generated answers stored", multiprocess_mode="livemax")
+
+
+class MetricsSampler:
+    """
+    Copy the in-process stats of one worker, kept by the pool, caches, password hasher, answer pipeline and
+    comment feed, into the collector.
+
+    Those stats are plain attributes, so the hot paths pay nothing. Counters advance by the
+    difference since the previous sample, so a collector shared by workers sums them correctly.
+    """
+
+    def __init__(self, state: State):
+        self.state = state
+        self._last: dict[tuple[Counter, tuple[str, ...]], float] = {}
+
+    def _advance(self, counter: Counter, value: float, *labels: str) -> None:
+        delta = value - self._last.get((counter, labels), 0)
+        self._last[(counter, labels)] = value
+        # a negative delta means the source was recreated, it starts counting from zero again
+        if delta > 0:
+            (counter.labels(*labels) if labels else counter).inc(delta)
+
+    def sample(self) -> None:
+        pool = self.state.db.pool_stats()
+        POOL_SIZE.set(pool.size)
+        POOL_CHECKED_OUT.set(pool.checked_out)
+        POOL_OVERFLOW.set(pool.overflow)
+        self._advance(POOL_CHECKOUTS, pool.checkouts)
+        self._advance(POOL_WAIT, pool.wait_seconds)
+
+        caches = {
+            "auth": self.state.auth_cache.stats,
+            "object": self.state.object_cache.stats,
+            "page": self.state.page_cache.stats,
+        }
+        for name, stats in caches.items():
+            self._advance(CACHE_HITS, stats.hits, name)
+            self._advance(CACHE_MISSES, stats.misses, name)
+            CACHE_ENTRIES.labels(name).set(stats.size)
+            CACHE_HIT_RATIO.labels(name).set(stats.hit_ratio)
+
+        hasher = self.state.password_hasher
+        PASSWORD_WORKERS.set(hasher.max_workers)
+        PASSWORD_PENDING.set(hasher.pending)
+        self._advance(PASSWORD_REJECTED, hasher.rejected)
+
+        answers = self.state.answer_pipeline
+        ANSWERS_IN_FLIGHT.set(answers.in_flight)
+        self._advance(ANSWERS_COMPLETED, answers.completed)
+        self._advance(ANSWERS_FAILED, answers.failed)
+        ANSWER_STREAM_SUBSCRIBERS.set(answers.hub.subscribers())
+        self._advance(ANSWER_STREAM_OVERFLOWS, answers.hub.overflows)
+        cache = answers.cache.stats
+        self._advance(CACHE_HITS, cache.hits, "answer")
+        self._advance(CACHE_MISSES, cache.misses, "answer")
+        CACHE_HIT_RATIO.labels("answer").set(cache.hit_ratio)
+        ANSWER_CACHE_ENTRIES.set(cache.size)
+        feed = self.state.comment_feed
+        COMMENT_FEED_WATCHERS.set(feed.hub.subscribers())
+        self._advance(COMMENT_FEED_NOTIFICATIONS, feed.received)
+        self._advance(COMMENT_FEED_OVERFLOWS, feed.hub.overflows)
+        self._advance(NOTIFICATION_LISTENER_CONNECTS, self.state.notifications.connects)
+        if isinstance(answers.backend, BatchingBackend):
+            ANSWER_PROMPTS_PENDING.set(answers.backend.pending)
+            self._advance(ANSWER_PROMPTS_COALESCED, answers.backend.coalesced)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+
+def observe_answer_batch(stats: BatchStats) -> None:
+    ANSWER_BATCH_SIZE.observe(stats.size)
+    ANSWER_BATCH_WAIT.observe(stats.wait_seconds)
+    ANSWER_BATCH_LATENCY.observe(stats.seconds)
+    if stats.failed:
+        ANSWER_BATCH_FAILURES.inc()
+
+
+def render_latest() -> bytes:
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_worker_dead() -> None:
+    """Drop the live gauges of this worker from the shared collector, counters keep their totals."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
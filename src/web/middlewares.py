@@ -1,13 +1,191 @@
-from core.config import CORSSettings
+import logging
+import time
+from typing import Callable, TypeVar
+
+from core.config import CompressionSettings, CORSSettings, MetricsSettings
+from db import count_statements
 from fastapi import FastAPI
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from web.compression import (
+    CompressionPolicy,
+    StreamCompressor,
+    compress_chunk,
+    weak_etag,
+)
+from web.metrics import REQUEST_LATENCY, REQUESTS
+
+logger = logging.getLogger(__name__)
+
+E = TypeVar("E", bound=Callable)
+
+
+class QueryBudgetExceededError(RuntimeError):
+    pass
+
+
+def query_budget(max_statements: int) -> Callable[[E], E]:
+    """
+    Declare how many SQL statements one request to the decorated route may run, authentication included.
+
+    Apply it below the router decorator. ``QueryBudgetMiddleware`` checks the budget after
+    the response, as configured by ``DB_QUERY_BUDGET_MODE``.
+    """
+    def decorator(endpoint: E) -> E:
+        endpoint.query_budget = max_statements
+        return endpoint
+
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL statements of every request and report routes that exceed their ``query_budget``.
+
+    In ``warn`` mode an overrun is logged. In ``raise`` mode, which tests use, it fails the request.
+    The count also names the request in the slow query log, whatever the mode.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        def request() -> str:
+            # the router leaves the matched route in the scope, its template names all requests to it
+            return f"{scope['method']} {getattr(scope.get('route'), 'path_format', 'unmatched')}"
+
+        with count_statements(request) as counter:
+            await self.app(scope, receive, send)
+        mode = getattr(scope["app"].state, "query_budget_mode", "off")
+        # the router leaves the matched endpoint in the scope
+        budget = getattr(scope.get("endpoint"), "query_budget", None)
+        if mode == "off" or budget is None or counter.count <= budget:
+            return
+        message = (
+            f"{request()} ran {counter.count} SQL statements, its budget is {budget}, "
+            f"they took {counter.seconds * 1000:.1f} ms"
+        )
+        if mode == "raise":
+            raise QueryBudgetExceededError(message)
+        logger.warning(message)
+
+
+class MetricsMiddleware:
+    """
+    Count requests and time them until their last body chunk, labelled by route template.
+
+    The template keeps label cardinality bounded, paths that match no route share ``unmatched``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.labels(scope["method"], route, str(status)).inc()
+            REQUEST_LATENCY.labels(scope["method"], route).observe(time.perf_counter() - started)
+
+
+class CompressionMiddleware:
+    """
+    Compress eligible responses with the best codec the client accepts.
+
+    Buffered bodies below ``min_size`` are left alone, streamed bodies are compressed chunk
+    by chunk. Responses that already carry a ``Content-Encoding``, such as pre-compressed
+    cache entries or a gzip export, pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, policy: CompressionPolicy):
+        self.app = app
+        self.policy = policy
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codec = self.policy.negotiate(Headers(scope=scope).get("accept-encoding"))
+        start: Message | None = None
+        compressor: StreamCompressor | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(scope=start)
+                eligible = (
+                    start["status"] >= 200
+                    and start["status"] not in (204, 304)
+                    and "content-encoding" not in headers
+                    and self.policy.accepts_media_type(headers.get("content-type"))
+                )
+                if eligible and "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if not eligible or codec is None or (not more_body and len(body) < self.policy.min_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = codec.name
+                if "etag" in headers:
+                    headers["ETag"] = weak_etag(headers["etag"])
+                if not more_body:
+                    body = await self.policy.compress(codec, body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                compressor = self.policy.stream(codec)
+                await send(start)
+                start = None
+
+            chunk = await compress_chunk(compressor, body, last=not more_body)
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
 
 
 def setup_middlewares(
         *,
         app: FastAPI,
         settings: CORSSettings,
+        compression: CompressionSettings,
+        metrics: MetricsSettings,
 ) -> None:
+    app.add_middleware(QueryBudgetMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=settings.ALLOW_ORIGIN,
@@ -15,3 +193,9 @@ def setup_middlewares(
         allow_methods=settings.ALLOW_METHODS,
         allow_headers=settings.ALLOW_HEADERS,
     )
+    # kept on the app so response caches can store bodies compressed the same way
+    app.state.compression = CompressionPolicy.from_settings(compression)
+    app.add_middleware(CompressionMiddleware, policy=app.state.compression)
+    # outermost, so latency includes every other middleware
+    if metrics.ENABLED:
+        app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import msgspec
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from services.cache import ObjectCache
+from services.hub import Subscription
+
+from web.compression import CompressionPolicy
+
+CACHE_STATUS_HEADER = "X-Cache"
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+# responses depend on the caller's token, and clients must revalidate before reusing them
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+class MsgSpecJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return msgspec.json.encode(content)
+
+
+class StructResponse(MsgSpecJSONResponse):
+    """
+    Encode ORM objects or rows through a msgspec ``Struct`` type.
+
+    Returning a response skips FastAPI's response model validation, so declare the
+    pydantic schema with ``response_model=`` on the route to keep OpenAPI accurate.
+    """
+
+    def __init__(self, content: Any, struct_type: Any, **kwargs) -> None:
+        super().__init__(msgspec.convert(content, struct_type, from_attributes=True), **kwargs)
+
+
+class RenderedResponse(msgspec.Struct):
+    """An encoded response body with the headers it was sent with, as stored by ``cached_response``."""
+    body: bytes
+    media_type: str | None = None
+    headers: dict[str, str] = {}
+    # the body compressed by codec name, filled in as clients ask for them
+    encoded: dict[str, bytes] = {}
+
+
+async def cached_response(
+        cache: ObjectCache,
+        key: str,
+        render: Callable[[], Awaitable[Response]],
+        request: Request,
+) -> Response:
+    """
+    Serve the response stored under ``key``, rendering and storing it on a miss.
+
+    Only cache responses that are the same for every user who may request them, and put
+    whatever they depend on, such as a table generation, in ``key``. Compressed bodies are
+    stored next to the plain one, so a hit costs no compression.
+    """
+    policy: CompressionPolicy = request.app.state.compression
+    codec = policy.negotiate(request.headers.get("accept-encoding"))
+    status = "HIT"
+
+    def compressible(rendered: RenderedResponse) -> bool:
+        return len(rendered.body) >= policy.min_size and policy.accepts_media_type(rendered.media_type)
+
+    async def load() -> RenderedResponse:
+        nonlocal status
+        status = "MISS"
+        response = await render()
+        headers = {name: value for name, value in response.headers.items() if name not in ("content-length", "content-type")}
+        rendered = RenderedResponse(body=response.body, media_type=response.media_type, headers=headers)
+        if codec is not None and compressible(rendered):
+            rendered.encoded[codec.name] = await policy.compress(codec, rendered.body)
+        return rendered
+
+    rendered = await cache.get_or_load(key, RenderedResponse, load)
+    headers = {**rendered.headers, CACHE_STATUS_HEADER: status}
+    if not compressible(rendered):
+        return Response(rendered.body, media_type=rendered.media_type, headers=headers)
+
+    headers["Vary"] = "Accept-Encoding"
+    if codec is None:
+        return Response(rendered.body, media_type=rendered.media_type, headers=headers)
+    if codec.name not in rendered.encoded:
+        rendered.encoded[codec.name] = await policy.compress(codec, rendered.body)
+        await cache.set(key, rendered)
+    headers["Content-Encoding"] = codec.name
+    return Response(rendered.encoded[codec.name], media_type=rendered.media_type, headers=headers)
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    Server-sent events of a hub subscription, each message as JSON under its ``event`` name.
+
+    ``subscribe`` is called once the body is sent, and the subscription is closed with the stream.
+    A comment goes out when no event did for ``heartbeat`` seconds, so proxies keep idle streams
+    open. A subscriber cut off for falling behind gets a last ``resync`` event: it has missed
+    events and should reload what it shows.
+    """
+
+    media_type = EVENT_STREAM_MEDIA_TYPE
+
+    def __init__(self, subscribe: Callable[[], Subscription], heartbeat: float, **kwargs) -> None:
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **kwargs.pop("headers", {})}
+        super().__init__(self._encode(subscribe, heartbeat), headers=headers, **kwargs)
+
+    @staticmethod
+    async def _encode(subscribe: Callable[[], Subscription], heartbeat: float) -> AsyncIterator[bytes]:
+        with subscribe() as subscription:
+            while True:
+                try:
+                    message = await asyncio.wait_for(anext(subscription), heartbeat)
+                except TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                except StopAsyncIteration:
+                    break
+                yield b"event: %s\ndata: %s\n\n" % (message.event.encode(), msgspec.json.encode(message))
+            if subscription.missed:
+                yield b"event: resync\ndata: {}\n\n"
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over ``parts``, such as a row id and its ``updated_at`` or an encoded body."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else msgspec.json.encode(part))
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+
+class ConditionalRequest:
+    """
+    ``If-None-Match`` handling for GET routes, used as a dependency.
+
+    Handlers that can compute the ETag cheaply check ``matches`` before loading anything,
+    others pass the rendered response to ``respond`` and let it hash the body.
+    """
+
+    def __init__(self, request: Request):
+        header = request.headers.get("if-none-match")
+        self.if_none_match = [tag.strip().removeprefix("W/") for tag in header.split(",")] if header else []
+
+    @property
+    def requested(self) -> bool:
+        return bool(self.if_none_match)
+
+    def matches(self, etag: str) -> bool:
+        return "*" in self.if_none_match or etag in self.if_none_match
+
+    @staticmethod
+    def not_modified(etag: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> Response:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+    def respond(self, response: Response, etag: str | None = None, cache_control: str = DEFAULT_CACHE_CONTROL) -> Response:
+        """Tag ``response``, or replace it with a 304 when the client already has it."""
+        etag = etag or make_etag(response.body)
+        if self.matches(etag):
+            return self.not_modified(etag, cache_control)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+        return response